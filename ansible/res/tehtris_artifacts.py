@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Manifests for the content-addressed artifact cache on the Windows hosts.
+
+The playbook keeps the binaries and scripts it ships (the EDR MSI,
+LGPO.exe, PowerRun.exe, the PowerShell and Python scripts) in a cache
+directory on each host, one file per content hash:
+
+    <cache dir>\\<sha256>\\<file name>
+
+with a manifest.json there mapping each hash to its file name and size.
+tasks/artifact-cache.yml hashes the controller's files once per run,
+compares them with each host's manifest, copies only the files the host
+does not have yet, and hands the other tasks the cached path of every
+artifact (the `artifacts` fact), so that a file used by several tasks is
+copied at most once, and not at all on later runs.
+
+    python tehtris_artifacts.py manifest res/PowerRun.exe res/policies/LGPO.exe --output controller.json
+    python tehtris_artifacts.py compare controller.json host.json --cache-dir 'C:\\ProgramData\\AnsibleArtifacts'
+
+`compare` prints what to copy, the cached path of every artifact, the
+host's manifest once the copies are done, and the bytes copied and
+saved. Either manifest can be read from stdin by passing `-`.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+from pathlib import Path, PureWindowsPath
+from typing import Dict
+
+
+class ArtifactError(Exception):
+    """Raised for unreadable artifacts or manifests."""
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_manifest(paths) -> Dict[str, dict]:
+    """Return the controller manifest of `paths`: name -> sha256, size and source path.
+
+    Artifacts are looked up by file name, so two files with the same name
+    are an error.
+    """
+    manifest: Dict[str, dict] = {}
+    for path in map(Path, paths):
+        if path.name in manifest:
+            raise ArtifactError(f"{path} has the same name as {manifest[path.name]['src']}")
+        try:
+            manifest[path.name] = {'sha256': sha256_file(path), 'size': path.stat().st_size, 'src': str(path)}
+        except OSError as e:
+            raise ArtifactError(f"Cannot read {path}: {e}") from e
+    return manifest
+
+
+def compare_manifests(controller: Dict[str, dict], host: Dict[str, dict], cache_dir: str) -> dict:
+    """Plan the copies that bring a host's cache up to date with the controller.
+
+    `host` is the host's manifest (sha256 -> name and size). Returns the
+    cached path of every artifact (`paths`), the artifacts to `copy` with
+    their destination, the names already `cached`, the bytes copied and
+    saved, and the host's `manifest` once the copies are done.
+    """
+    plan = {'paths': {}, 'copy': [], 'cached': [], 'bytes_copied': 0, 'bytes_saved': 0, 'manifest': dict(host)}
+    for name, artifact in sorted(controller.items()):
+        dest = str(PureWindowsPath(cache_dir, artifact['sha256'], name))
+        plan['paths'][name] = dest
+        cached = host.get(artifact['sha256'])
+        if cached and cached.get('name') == name and cached.get('size') == artifact['size']:
+            plan['cached'].append(name)
+            plan['bytes_saved'] += artifact['size']
+        else:
+            plan['copy'].append({'name': name, 'src': artifact['src'], 'dest': dest, 'size': artifact['size']})
+            plan['bytes_copied'] += artifact['size']
+            plan['manifest'][artifact['sha256']] = {'name': name, 'size': artifact['size']}
+    return plan
+
+
+def read_json(path: str) -> dict:
+    try:
+        text = sys.stdin.read() if path == '-' else Path(path).read_text(encoding='utf-8')
+    except OSError as e:
+        raise ArtifactError(f"Cannot read {path}: {e}") from e
+    # An empty manifest comes out of PowerShell as an empty string
+    if not text.strip():
+        return {}
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ArtifactError(f"{path} is not a JSON manifest: {e}") from e
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Artifact cache manifests")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    manifest = subparsers.add_parser('manifest', help='Hash artifacts on the controller')
+    manifest.add_argument('paths', nargs='+', help='Artifact files')
+    manifest.add_argument('--output', help='Write the manifest to this file instead of stdout')
+
+    compare = subparsers.add_parser('compare', help="Plan the copies to a host's cache")
+    compare.add_argument('controller', help="Controller manifest ('-' for stdin)")
+    compare.add_argument('host', help="Host manifest ('-' for stdin)")
+    compare.add_argument('--cache-dir', required=True, help='Cache directory on the host')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'manifest':
+            output = json.dumps(build_manifest(args.paths), indent=2)
+            if args.output:
+                Path(args.output).write_text(output, encoding='utf-8')
+            else:
+                print(output)
+        elif args.command == 'compare':
+            print(json.dumps(compare_manifests(read_json(args.controller), read_json(args.host), args.cache_dir),
+                             indent=2))
+    except ArtifactError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Step-level benchmark suite for the TEHTRIS EDR installer automation.
+
+Runs tehtris_edr_installer.py ("full") and tehtris_edr_installer_minimal.py
+("minimal") end to end against the simulated wizard (tehtris_sim) and
+reports, per variant and scenario:
+
+- p50/p95 latency of every run_installation step and of the whole run
+- OCR calls, full control-tree enumerations and EnumWindows calls per run
+- peak Python memory of a run, from one extra run under tracemalloc
+  (tracing slows everything down, so it is kept out of the timed runs)
+- which locating strategy won for each element (full variant)
+
+Scenarios:
+- default: the wizard exposes its controls to win32gui
+- owner-drawn: button captions are hidden from win32gui, so the full
+  variant has to fall back to templates, OCR and hotkeys. The minimal
+  variant has no screen strategies and is not run in this scenario.
+- silent: both variants install with msiexec /qn, using the properties
+  read from an MSI fixture matching the simulated wizard
+- reinstall: the fixture package is already installed and recorded in the
+  install state file, so both variants should stop after check_installed
+
+The runs of a variant and scenario share the installers' strategy table,
+so later runs try the strategies that won earlier first, as successive
+installs on one host would; --static-order keeps the built-in order.
+
+--startup measures startup instead: each variant is imported in fresh
+interpreters under `python -X importtime`, and the report lists the wall
+time, the import time and the packages that account for it:
+
+    python tehtris_bench.py --startup --runs 5
+
+Results can be saved as JSON and later runs compared against them; the
+exit status is 1 when a metric exceeds the baseline by more than the
+threshold:
+
+    python tehtris_bench.py --runs 5 --output baseline.json
+    python tehtris_bench.py --runs 5 --baseline baseline.json --threshold 0.2
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Dict, List, Optional
+
+from tehtris_sim import FIXTURE_PRODUCT_CODE, FIXTURE_PRODUCT_VERSION, SimulatedBackend, write_fixture_msi
+from tehtris_ui import StrategyTable, percentile
+
+
+VARIANTS = ('full', 'minimal')
+
+# Module of each variant, as imported by --startup
+VARIANT_MODULES = {'full': 'tehtris_edr_installer', 'minimal': 'tehtris_edr_installer_minimal'}
+
+# Simulated wizard options per scenario
+SCENARIOS = {
+    'default': {},
+    'owner-drawn': {'expose_captions': False},
+    'silent': {},
+    'reinstall': {'installed_products': {FIXTURE_PRODUCT_CODE: FIXTURE_PRODUCT_VERSION}},
+}
+
+# Scenarios a variant cannot complete by design
+UNSUPPORTED = {('minimal', 'owner-drawn')}
+
+
+def measure_startup(variant: str, runs: int) -> dict:
+    """Import `variant` in `runs` fresh interpreters under -X importtime.
+
+    Returns the p50 wall time of the whole process (interpreter start
+    included), the p50 cumulative import time of the module, and the p50
+    self time per top-level package, largest first, so that nested imports
+    are not counted twice.
+    """
+    module = VARIANT_MODULES[variant]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    walls: List[float] = []
+    imports: List[float] = []
+    packages: Dict[str, List[float]] = {}
+    for run in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                 cwd=directory, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            raise RuntimeError(f"importing {module} failed: {process.stderr.strip().splitlines()[-1]}")
+
+        self_us: Counter = Counter()
+        for line in process.stderr.splitlines():
+            # "import time: <self us> | <cumulative us> | <indented module name>"
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            self_us[name.split('.')[0]] += int(own)
+            if name == module:
+                imports.append(int(cumulative) / 1e6)
+        for package, us in self_us.items():
+            # Packages missing from a run were already imported by the interpreter
+            packages.setdefault(package, [0.0] * run).append(us / 1e6)
+        for values in packages.values():
+            values.extend([0.0] * (run + 1 - len(values)))
+
+    breakdown = {package: percentile(values, 50) * 1000 for package, values in packages.items()}
+    return {
+        'runs': runs,
+        'wall_ms': percentile(walls, 50) * 1000,
+        'import_ms': percentile(imports, 50) * 1000,
+        'packages_ms': dict(sorted(breakdown.items(), key=lambda item: item[1], reverse=True)),
+    }
+
+
+def print_startup(results: dict, top: int = 10):
+    for variant, startup in results.items():
+        print(f"\n{variant} startup (p50 of {startup['runs']} runs): {startup['wall_ms']:.1f} ms wall, "
+              f"{startup['import_ms']:.1f} ms importing {VARIANT_MODULES[variant]}")
+        for package, ms in list(startup['packages_ms'].items())[:top]:
+            print(f"  {package:<32}  {ms:7.1f} ms")
+
+
+def load_variant(variant: str):
+    """Return the TehtrisEDRInstaller class of `variant`."""
+    if variant == 'full':
+        import tehtris_edr_installer as module
+    else:
+        import tehtris_edr_installer_minimal as module
+    return module.TehtrisEDRInstaller
+
+
+def run_once(variant: str, scenario: str, options: argparse.Namespace, traced: bool = False,
+             strategy_table: Optional[str] = None) -> dict:
+    """Run one installation of `variant` against a fresh simulated wizard.
+
+    `strategy_table` is the installer's learned strategy order file, kept
+    across the runs of a variant and scenario.
+    """
+    installer_class = load_variant(variant)
+    backend = SimulatedBackend(
+        ocr_latency=options.ocr_latency,
+        launch_latency=options.launch_latency,
+        page_latency=options.page_latency,
+        install_seconds=options.install_seconds,
+        agent_latency=options.agent_latency,
+        **SCENARIOS[scenario],
+    )
+
+    # Installers write their log, screenshots and templates to the working directory
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='tehtris-bench-')
+    os.chdir(workdir)
+    try:
+        with open(os.devnull, 'w') as sink, redirect_stdout(sink), redirect_stderr(sink):
+            if traced:
+                tracemalloc.start()
+            installer = installer_class('TEHTRIS_EDR.msi', backend=backend)
+            installer.static_order = options.static_order
+            if strategy_table:
+                installer.strategy_table = StrategyTable(strategy_table)
+            if scenario == 'owner-drawn':
+                installer.page_timeout = options.page_timeout
+            if scenario == 'silent':
+                write_fixture_msi('TEHTRIS_EDR.msi')
+                installer.silent = True
+            if scenario == 'reinstall':
+                write_fixture_msi('TEHTRIS_EDR.msi')
+                installer.record_installed()
+
+            start = time.perf_counter()
+            ok = installer.run_installation()
+            elapsed = time.perf_counter() - start
+
+            peak = tracemalloc.get_traced_memory()[1] if traced else None
+            if traced:
+                tracemalloc.stop()
+    finally:
+        logger = logging.getLogger('TehtrisEDRInstaller')
+        for handler in list(logger.handlers):
+            handler.close()
+            logger.removeHandler(handler)
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    wins = getattr(installer, 'strategy_wins', {})
+    return {
+        'ok': bool(ok) and (scenario != 'reinstall' or installer.already_installed),
+        'total': elapsed,
+        'steps': {name: seconds for name, seconds, _ in installer.timer.steps},
+        'ocr_calls': backend.wizard.calls['ocr_data'],
+        'enumerations': installer.controls.enumerations,
+        'enum_windows': backend.wizard.calls['EnumWindows'],
+        'peak_bytes': peak,
+        'wins': {f"{element} -> {strategy}": count for (element, strategy), count in wins.items()},
+    }
+
+
+def summarize(runs: List[dict], peak_bytes: Optional[int]) -> dict:
+    """Aggregate the runs of one variant and scenario."""
+    steps: Dict[str, List[float]] = {}
+    for run in runs:
+        for name, seconds in run['steps'].items():
+            steps.setdefault(name, []).append(seconds)
+
+    def latency(values: List[float]) -> dict:
+        return {'p50_ms': percentile(values, 50) * 1000, 'p95_ms': percentile(values, 95) * 1000}
+
+    wins: Counter = Counter()
+    for run in runs:
+        wins.update(run['wins'])
+
+    return {
+        'runs': len(runs),
+        'failures': sum(1 for run in runs if not run['ok']),
+        'total': latency([run['total'] for run in runs]),
+        'steps': {name: latency(values) for name, values in steps.items()},
+        'ocr_calls': sum(run['ocr_calls'] for run in runs) / len(runs),
+        'enumerations': sum(run['enumerations'] for run in runs) / len(runs),
+        'enum_windows': sum(run['enum_windows'] for run in runs) / len(runs),
+        'peak_mb': peak_bytes / 2 ** 20 if peak_bytes is not None else None,
+        'wins': dict(wins.most_common()),
+    }
+
+
+def run_suite(options: argparse.Namespace) -> dict:
+    """Benchmark every requested variant and scenario; returns {"variant/scenario": summary}."""
+    results = {}
+    tables = tempfile.mkdtemp(prefix='tehtris-bench-tables-')
+    try:
+        for variant in options.variants:
+            for scenario in options.scenarios:
+                if (variant, scenario) in UNSUPPORTED:
+                    continue
+                # Runs of a variant and scenario share a strategy table, as
+                # successive installs on one host do; the traced run goes first
+                # so that the timed runs are not the ones learning it
+                table = os.path.join(tables, f"{variant}-{scenario}.json")
+                peak = run_once(variant, scenario, options, True, table)['peak_bytes'] if options.memory else None
+                runs = [run_once(variant, scenario, options, strategy_table=table) for _ in range(options.runs)]
+                results[f"{variant}/{scenario}"] = summarize(runs, peak)
+    finally:
+        shutil.rmtree(tables, ignore_errors=True)
+    return results
+
+
+def flatten(summary: dict) -> Dict[str, float]:
+    """Return the metrics of a summary that are checked for regressions."""
+    metrics = {
+        'failures': summary['failures'],
+        'total.p95_ms': summary['total']['p95_ms'],
+        'ocr_calls': summary['ocr_calls'],
+        'enumerations': summary['enumerations'],
+        'enum_windows': summary['enum_windows'],
+    }
+    for name, latency in summary['steps'].items():
+        metrics[f"steps.{name}.p95_ms"] = latency['p95_ms']
+    if summary['peak_mb'] is not None:
+        metrics['peak_mb'] = summary['peak_mb']
+    return metrics
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float, min_delta_ms: float,
+                     min_delta_mb: float = 0.5) -> List[str]:
+    """Compare results with a baseline; returns one line per metric that regressed.
+
+    A metric regresses when it exceeds the baseline by more than `threshold`
+    (a fraction) and, for latencies and memory, by more than an absolute
+    minimum so that millisecond-sized steps do not trip on noise.
+    """
+    regressions = []
+    for key, summary in results.items():
+        if key not in baseline:
+            continue
+        previous = flatten(baseline[key])
+        for metric, value in flatten(summary).items():
+            if metric not in previous:
+                continue
+            base = previous[metric]
+            if metric.endswith('_ms'):
+                slack = min_delta_ms
+            elif metric == 'peak_mb':
+                slack = min_delta_mb
+            else:
+                slack = 0
+            if value > base * (1 + threshold) + slack:
+                regressions.append(f"{key} {metric}: {value:.1f} (baseline {base:.1f})")
+    return regressions
+
+
+def print_report(results: dict):
+    for key, summary in results.items():
+        print(f"\n{key} ({summary['runs']} runs, {summary['failures']} failed)")
+        width = max([len(name) for name in summary['steps']] + [5])
+        print(f"  {'step':<{width}}  {'p50 ms':>9}  {'p95 ms':>9}")
+        for name, latency in list(summary['steps'].items()) + [('total', summary['total'])]:
+            print(f"  {name:<{width}}  {latency['p50_ms']:9.1f}  {latency['p95_ms']:9.1f}")
+        peak = f"{summary['peak_mb']:.1f} MB" if summary['peak_mb'] is not None else "not measured"
+        print(f"  per run: {summary['ocr_calls']:.1f} OCR calls, {summary['enumerations']:.1f} enumerations, "
+              f"{summary['enum_windows']:.1f} EnumWindows calls; peak memory {peak}")
+        if summary['wins']:
+            print("  strategy wins:")
+            for name, count in summary['wins'].items():
+                print(f"    {name}: {count}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the TEHTRIS installer automation against the simulated wizard")
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per variant and scenario (default: 3)')
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('--launch-latency', type=float, default=0.2, help='Seconds until the wizard appears (default: 0.2)')
+    parser.add_argument('--page-latency', type=float, default=0.05, help='Seconds per page transition (default: 0.05)')
+    parser.add_argument('--install-seconds', type=float, default=1.0, help='Duration of the install (default: 1.0)')
+    parser.add_argument('--agent-latency', type=float, default=0.5,
+                        help='Seconds from install completion until the agent process runs (default: 0.5)')
+    parser.add_argument('--ocr-latency', type=float, default=0.05, help='Seconds per simulated OCR pass (default: 0.05)')
+    parser.add_argument('--page-timeout', type=float, default=1.0,
+                        help='Installer page wait timeout in the owner-drawn scenario (default: 1.0)')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='Skip the traced memory run')
+    parser.add_argument('--static-order', action='store_true',
+                        help='Installers try strategies in their built-in order instead of the learned one')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--baseline', help='Compare against results saved with --output')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed relative increase over the baseline (default: 0.2)')
+    parser.add_argument('--min-delta-ms', type=float, default=50.0,
+                        help='Latency increases below this many ms never count as regressions (default: 50)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure the import time of each variant instead of running the scenarios')
+    args = parser.parse_args()
+
+    if args.startup:
+        print_startup({variant: measure_startup(variant, args.runs) for variant in args.variants})
+        return
+
+    results = run_suite(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,30 @@ TEHTRIS EDR MSI Installer Automation Script
 This script automates the installation of TEHTRIS EDR using pywinauto.
 It handles the complete installation flow from launch to completion.
 
+All window, input and screen access goes through a UI backend (tehtris_ui);
+`--backend sim` runs the whole flow against the simulated wizard in
+tehtris_sim, without Windows.
+
+`--silent` skips the wizard: the MSI is read (tehtris_msi) to find the
+properties behind the activation fields, and msiexec /qn sets them directly.
+
+Before installing, the package fingerprint (ProductCode, ProductVersion,
+content hash) is compared with the one recorded by the last successful run
+in tehtris_install_state.json; when they match and that product is still
+installed, the script exits with status 3 without touching the installer.
+`--force` reinstalls anyway.
+
+Every step and every attempt at locating a control (template, OCR,
+win32gui, fallback position, hotkey) is appended as a JSON span to
+tehtris_installation_spans.jsonl; `python tehtris_ui.py report` aggregates
+span files from many hosts. The attempts also feed
+tehtris_strategy_table.json, from which later runs on the host order the
+strategies by expected time to success; `--static-order` disables that.
+
+pywinauto, pyautogui, OpenCV and pytesseract are only probed at startup and
+imported by the strategy that first needs them; `python tehtris_bench.py
+--startup` shows the import-time breakdown of this script and the minimal one.
+
 Requirements:
 - pywinauto
 - pyautogui (fallback)
@@ -19,42 +43,51 @@ import sys
 import time
 import logging
 import argparse
-import subprocess
+import importlib.util
+from collections import Counter
 from pathlib import Path
-from typing import Optional, Tuple
-
-try:
-    from pywinauto import Application, Desktop
-    from pywinauto.controls.uiawrapper import UIAWrapper
-    from pywinauto.findwindows import ElementNotFoundError
-    from pywinauto.timings import TimeoutError
-    PYWINAUTO_AVAILABLE = True
-except ImportError:
-    PYWINAUTO_AVAILABLE = False
+from typing import Callable, Dict, Optional, Tuple
+
+# Probed, not imported: pywinauto, pyautogui, OpenCV and pytesseract are
+# loaded on first use of the strategy that needs them, so a run that
+# succeeds through win32gui never pays for their import
+PYWINAUTO_AVAILABLE = importlib.util.find_spec('pywinauto') is not None
+if not PYWINAUTO_AVAILABLE:
     print("Warning: pywinauto not available. Please install with: pip install pywinauto")
 
-try:
-    import pyautogui
-    import cv2
-    import numpy as np
-    import pytesseract
-    from PIL import Image, ImageEnhance
-    PYAUTOGUI_AVAILABLE = True
-    # Configure pyautogui
-    pyautogui.FAILSAFE = True
-    pyautogui.PAUSE = 0.5
-except ImportError:
-    PYAUTOGUI_AVAILABLE = False
+PYAUTOGUI_AVAILABLE = all(importlib.util.find_spec(name) is not None
+                          for name in ('pyautogui', 'cv2', 'numpy', 'pytesseract', 'PIL'))
+if not PYAUTOGUI_AVAILABLE:
     print("Warning: pyautogui/opencv/pytesseract not available. Install with: pip install pyautogui opencv-python pytesseract pillow")
 
+from tehtris_msi import MSI_SUCCESS_CODES, InstallState, MsiError, activation_property_values, msiexec_command
+from tehtris_ui import (
+    AgentWatcher, ControlTreeSnapshot, SpanLog, StepTimer, StrategyTable, UIBackend, create_backend, desktop_has_focus,
+    wait_until,
+)
+from tehtris_vision import (
+    OCR_VARIANTS, OPENCV_AVAILABLE, FlightRecorder, FrameChangeDetector, MultiVariantOcr, OcrFrame, ScreenshotWriter,
+    TemplateLocator, area_region, capture_screen, find_color_elements,
+)
+
+
+# Window classes of the wizard's input fields
+EDIT_CLASSES = ('Edit', 'TextBox', 'RichEdit', 'RichEdit20A', 'RichEdit20W')
+
+# Alt shortcut of each wizard element, by a word of its name
+ELEMENT_HOTKEYS = (('next', 'n'), ('accept', 'a'), ('install', 'i'), ('finish', 'f'))
+
+# Exit status when the package is already installed and nothing was done
+EXIT_ALREADY_INSTALLED = 3
+
 
 class TehtrisEDRInstaller:
     """Automates TEHTRIS EDR MSI installation process."""
     
-    def __init__(self, msi_path: str, dry_run: bool = False):
+    def __init__(self, msi_path: str, dry_run: bool = False, backend: Optional[UIBackend] = None):
         self.msi_path = Path(msi_path)
         self.dry_run = dry_run
-        self.app: Optional[Application] = None
+        self.app = None  # pywinauto Application, once connected
         self.logger = self._setup_logging()
         
         # Installation configuration
@@ -69,11 +102,88 @@ class TehtrisEDRInstaller:
         self.control_timeout = 10
         self.max_retries = 3
         self.retry_delay = 2
+        self.page_timeout = 5
+        self.silent_timeout = 900
+
+        # Install with msiexec /qn, passing the activation values as the MSI
+        # properties behind the wizard's fields (falls back to the wizard
+        # when the package does not expose them)
+        self.silent = False
+
+        # Fingerprint of the package installed by the last successful run;
+        # a run for the same package stops early unless `force` is set
+        self.state_file = Path("tehtris_install_state.json")
+        self.force = False
+        self.already_installed = False
+
+        # Per-step wall clock of the last run. Steps and locator attempts
+        # are also appended as structured spans to spans.path, next to the
+        # log (aggregate files from many hosts with `tehtris_ui.py report`)
+        self.spans = SpanLog(Path("tehtris_installation_spans.jsonl"), ocr_calls=self._ocr_calls,
+                             enumerations=lambda: self.controls.enumerations)
+        self.timer = StepTimer(spans=self.spans)
+
+        # How often each locating strategy succeeded, by (element, strategy)
+        self.strategy_wins: Counter = Counter()
+
+        # Locating strategies are tried in the order learned from earlier
+        # runs on this host (fastest expected success first, repeated
+        # failures last); static_order keeps the built-in order
+        self.strategy_table = StrategyTable(Path("tehtris_strategy_table.json"))
+        self.static_order = False
+
+        # Window, input and screen access: the Windows desktop, or the
+        # simulated wizard (create_backend('sim'))
+        self.backend = backend or create_backend('win32')
+        self.screen_available = self.backend.screen_available and self.backend.ocr_available and OPENCV_AVAILABLE
+
+        # Indexed controls of the setup window, re-enumerated only when the
+        # control tree changes
+        self.controls = ControlTreeSnapshot(api=self.backend.win32)
+
+        # Looks for the TEHTRIS Agent process; starts polling while the
+        # install finishes, and verification waits at most agent_timeout
+        # seconds after that for it to appear
+        self.agent_watcher = AgentWatcher(self.backend)
+        self.agent_timeout = 60
 
         # Screen capture settings
         self.use_screen_capture = True
         self.screenshot_dir = Path("screenshots")
-        self.screenshot_dir.mkdir(exist_ok=True)
+
+        # Debug screenshots and control-tree dumps stay in memory and are
+        # archived to diagnostics/ only when a step fails (or on request)
+        self.flight_recorder = FlightRecorder(max_bytes=32 * 2 ** 20)
+        self.diagnostics_dir = Path("diagnostics")
+        self.dump_diagnostics_always = False
+
+        # With save_screenshots, every screenshot is also written to
+        # screenshot_dir on a background thread; at most 8 wait in the
+        # queue, older ones are dropped first
+        self.save_screenshots = False
+        self.screenshot_writer = ScreenshotWriter(self.screenshot_dir, max_queue=8)
+
+        # Screen area searched by OCR and color detection: 'window' (the
+        # installer window), 'buttons' (its bottom button strip) or 'screen'
+        self.capture_area = 'window'
+
+        # OCR result for the current UI state, shared by all text lookups
+        self._ocr_frame: Optional[OcrFrame] = None
+        self._ocr_frame_area: Optional[str] = None
+
+        # Skips OCR on recaptures whose pixels have not changed
+        self.frame_detector = FrameChangeDetector()
+
+        # With enable_variant_ocr(), a label missing from the OCR frame is
+        # looked for again in other preprocessing variants of the same
+        # capture, run in parallel; each label is retried once per capture
+        self.variant_ocr: Optional[MultiVariantOcr] = None
+        self._variant_misses: Tuple[Optional[OcrFrame], set] = (None, set())
+
+        # Reference crops of the wizard buttons (next.png, install.png, ...).
+        # Missing templates are learned from the first successful OCR match.
+        self.template_locator = TemplateLocator(Path("templates"))
+        self.learn_templates = True
     
     def _setup_logging(self) -> logging.Logger:
         """Setup logging configuration."""
@@ -104,11 +214,13 @@ class TehtrisEDRInstaller:
         """Validate prerequisites before starting installation."""
         self.logger.info("Validating prerequisites...")
         
-        if not PYWINAUTO_AVAILABLE:
+        if not PYWINAUTO_AVAILABLE and not self.backend.simulated:
             self.logger.error("pywinauto is not available. Please install it.")
             return False
         
-        if not self.msi_path.exists():
+        if self.backend.simulated:
+            self.logger.info(f"Using the simulated installer UI ({self.backend.name} backend)")
+        elif not self.msi_path.exists():
             self.logger.error(f"MSI file not found: {self.msi_path}")
             return False
         
@@ -128,12 +240,108 @@ class TehtrisEDRInstaller:
     
     def _is_admin(self) -> bool:
         """Check if script is running with admin privileges."""
+        return self.backend.is_admin()
+
+    def wait_for(self, description: str, predicate, timeout: Optional[float] = None,
+                 fallback_delay: float = 0.5, **kwargs) -> bool:
+        """Wait until `predicate` holds, polling with backoff until `timeout`.
+
+        Conditions are observed through the backend's window API; where it is
+        unavailable the wait degrades to a fixed `fallback_delay` sleep.
+        """
+        if self.backend.win32 is None:
+            time.sleep(fallback_delay)
+            return True
+
+        timeout = self.control_timeout if timeout is None else timeout
+        start = time.monotonic()
+        result = wait_until(predicate, timeout, **kwargs)
+        elapsed = time.monotonic() - start
+        if result:
+            self.logger.debug(f"{description} after {elapsed:.2f}s")
+        else:
+            self.logger.debug(f"Timed out after {elapsed:.2f}s waiting for {description}")
+        return bool(result)
+
+    def _page_signature(self) -> Optional[tuple]:
+        """Return the current wizard page signature, or None if it cannot be read."""
         try:
-            import ctypes
-            return ctypes.windll.shell32.IsUserAnAdmin()
-        except:
+            return self.controls.signature()
+        except Exception:
+            return None
+
+    def wait_for_page_change(self, before: Optional[tuple], timeout: float = 0.5) -> bool:
+        """Wait until the wizard page differs from the signature `before`."""
+        if before is None:
+            time.sleep(timeout)
+            return True
+        return self.wait_for("page change", lambda: self._page_signature() != before, timeout)
+
+    def wait_for_setup_foreground(self, timeout: float = 0.3) -> bool:
+        """Wait until the setup window has keyboard focus before typing into it."""
+        return self.wait_for("setup window focus", self.controls.has_focus,
+                             timeout=timeout, fallback_delay=timeout)
+
+    def wait_for_button(self, text: str, timeout: Optional[float] = None, enabled: bool = True) -> bool:
+        """Wait until a button whose caption contains `text` exists (and is enabled)."""
+        state = "enabled" if enabled else "present"
+        return self.wait_for(f"'{text}' button {state}", lambda: self.controls.find_button(text, enabled=enabled),
+                             timeout=self.page_timeout if timeout is None else timeout)
+
+    def discover_activation_properties(self) -> Optional[Dict[str, str]]:
+        """Return {MSI property: value} for the activation fields, or None if unavailable."""
+        try:
+            properties = activation_property_values(self.msi_path, self.config)
+        except MsiError as e:
+            self.logger.warning(f"Silent install not possible: {e}")
+            return None
+        for name in properties:
+            self.logger.info(f"Activation field backed by MSI property {name}")
+        return properties
+
+    def check_installed(self) -> bool:
+        """Check whether this package is already installed with the current configuration."""
+        if self.force or not self.msi_path.exists():
+            return False
+        try:
+            installed, reason = InstallState(self.state_file, self.config).check(
+                self.msi_path, self.backend.installed_product_version)
+        except (OSError, MsiError) as e:
+            self.logger.warning(f"Could not fingerprint {self.msi_path}: {e}")
+            return False
+        self.logger.info(f"Install state: {reason}")
+        return installed
+
+    def record_installed(self):
+        """Record the installed package so that the next run for it can stop early."""
+        if self.dry_run or not self.msi_path.exists():
+            return
+        try:
+            InstallState(self.state_file, self.config).record(self.msi_path)
+        except (OSError, MsiError) as e:
+            self.logger.warning(f"Could not record the install state: {e}")
+
+    def silent_install(self, properties: Dict[str, str]) -> bool:
+        """Install without the wizard: msiexec /qn with the activation properties."""
+        self.logger.info("Installing silently with msiexec /qn...")
+        log_path = Path("tehtris_msiexec.log").resolve()
+
+        if self.dry_run:
+            self.logger.info(f"DRY RUN: Would run {msiexec_command(self.msi_path, properties, log_path)}")
+            return True
+
+        try:
+            exit_code = self.backend.install_silently(self.msi_path, properties, log_path, timeout=self.silent_timeout)
+        except Exception as e:
+            self.logger.error(f"Silent install failed: {e}")
             return False
 
+        if exit_code not in MSI_SUCCESS_CODES:
+            self.logger.error(f"msiexec exited with code {exit_code}, see {log_path}")
+            return False
+        self.logger.info(f"msiexec exited with code {exit_code} ({MSI_SUCCESS_CODES[exit_code]})")
+        return True
+
     def minimize_all_windows(self):
         """Minimize all windows using Win+D shortcut."""
         self.logger.info("Minimizing all windows (Win+D)...")
@@ -141,10 +349,11 @@ class TehtrisEDRInstaller:
             self.logger.info("DRY RUN: Would minimize all windows")
             return
 
-        if PYAUTOGUI_AVAILABLE:
+        if self.screen_available:
             try:
-                pyautogui.hotkey('win', 'd')
-                time.sleep(1)  # Allow time for windows to minimize
+                self.backend.hotkey('win', 'd')
+                self.wait_for("desktop focus", lambda: desktop_has_focus(self.backend.win32),
+                              timeout=1, fallback_delay=1)
                 self.logger.info("Successfully minimized all windows")
             except Exception as e:
                 self.logger.warning(f"Failed to minimize windows: {e}")
@@ -152,49 +361,121 @@ class TehtrisEDRInstaller:
             self.logger.warning("pyautogui not available for window minimization")
 
     def take_screenshot(self, step_name: str) -> Optional[str]:
-        """Take a screenshot for debugging purposes."""
-        if not PYAUTOGUI_AVAILABLE or self.dry_run:
+        """Capture the screen and control tree into the flight recorder.
+
+        Returns the file the screenshot is written to when save_screenshots
+        is set, None otherwise.
+        """
+        if not self.screen_available or self.dry_run:
             return None
 
         try:
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"{step_name}_{timestamp}.png"
-            filepath = self.screenshot_dir / filename
+            screenshot = self.backend.screenshot()
+            self.flight_recorder.record_frame(screenshot, step_name)
+            self.flight_recorder.record_text('controls', step_name, self.describe_controls())
+            if not self.save_screenshots:
+                return None
 
-            screenshot = pyautogui.screenshot()
-            screenshot.save(str(filepath))
-            self.logger.debug(f"Screenshot saved: {filepath}")
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            filepath = self.screenshot_writer.submit(screenshot, f"{step_name}_{timestamp}")
+            if filepath is None:
+                self.logger.debug(f"Screenshot '{step_name}' dropped, writer queue full")
+                return None
+            self.logger.debug(f"Screenshot queued: {filepath}")
             return str(filepath)
         except Exception as e:
             self.logger.warning(f"Failed to take screenshot: {e}")
             return None
 
-    def find_text_on_screen(self, text: str, confidence: float = 0.8) -> Optional[Tuple[int, int]]:
-        """Find text on screen using OCR and return center coordinates."""
-        if not PYAUTOGUI_AVAILABLE or self.dry_run:
+    def describe_controls(self) -> str:
+        """Return the last enumerated control tree of the setup window as text."""
+        lines = [f"window {hwnd:#x}" for hwnd in self.controls.windows]
+        for control in self.controls.controls:
+            lines.append(f"  {control.hwnd:#x} {control.class_name} {control.text!r} tab={control.tab_index}")
+        return '\n'.join(lines) + '\n'
+
+    def dump_diagnostics(self, reason: str) -> Optional[Path]:
+        """Archive the flight recorder to diagnostics/<reason>_<timestamp>.zip."""
+        if not len(self.flight_recorder):
+            return None
+        try:
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            path = self.flight_recorder.dump(self.diagnostics_dir / f"{reason}_{timestamp}.zip", reason)
+            self.logger.info(f"Diagnostics written to {path}")
+            return path
+        except Exception as e:
+            self.logger.warning(f"Failed to write diagnostics: {e}")
             return None
 
+    def find_installer_window_rect(self) -> Optional[Tuple[int, int, int, int]]:
+        """Return the (left, top, right, bottom) rectangle of the installer window."""
         try:
-            # Take screenshot
-            screenshot = pyautogui.screenshot()
-            screenshot_np = np.array(screenshot)
+            return self.controls.window_rect()
+        except Exception as e:
+            self.logger.debug(f"Could not get installer window rectangle: {e}")
+        return None
+
+    def get_capture_region(self, area: Optional[str] = None) -> Optional[Tuple[int, int, int, int]]:
+        """Return the screen region to capture for `area`, or None for the full screen.
+
+        Falls back to the full screen when the installer window cannot be found.
+        """
+        area = area or self.capture_area
+        if area == 'screen':
+            return None
 
-            # Convert to grayscale for better OCR
-            gray = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2GRAY)
+        rect = self.find_installer_window_rect()
+        if not rect:
+            self.logger.debug("Installer window not found, capturing full screen")
+            return None
+
+        return area_region(rect, area, screen_size=self.backend.screen_size())
+
+    def get_ocr_frame(self, refresh: bool = False, area: Optional[str] = None) -> Optional[OcrFrame]:
+        """Return the OCR frame for the current UI state, capturing it if needed."""
+        if not self.screen_available or self.dry_run:
+            return None
+
+        area = area or self.capture_area
+        cached = self._ocr_frame if self._ocr_frame_area == area else None
+        if cached is not None and not refresh:
+            return cached
 
-            # Enhance image for better text recognition
-            enhanced = cv2.convertScaleAbs(gray, alpha=1.5, beta=30)
+        region = self.get_capture_region(area)
+        image, origin = capture_screen(region, self.backend.screenshot)
 
-            # Use pytesseract to find text
-            data = pytesseract.image_to_data(enhanced, output_type=pytesseract.Output.DICT)
+        # Only run OCR again if the captured pixels actually changed
+        changed = self.frame_detector.has_changed(image, key=area)
+        if cached is not None and cached.region == region and not changed:
+            self.frame_detector.record_skip()
+            return cached
 
-            # Search for the text
-            for i, detected_text in enumerate(data['text']):
-                if text.lower() in detected_text.lower() and int(data['conf'][i]) > confidence * 100:
-                    x = data['left'][i] + data['width'][i] // 2
-                    y = data['top'][i] + data['height'][i] // 2
-                    self.logger.info(f"Found text '{text}' at ({x}, {y})")
-                    return (x, y)
+        self._ocr_frame = OcrFrame.from_image(image, origin, region, self.backend.ocr_data)
+        self._ocr_frame_area = area
+        self.frame_detector.record_ocr()
+        self.logger.debug(f"Captured OCR frame of {region or 'full screen'} ({self.frame_detector.ocr_calls} OCR passes so far)")
+        return self._ocr_frame
+
+    def invalidate_ocr_frame(self):
+        """Drop the cached OCR frame after an action that changes the screen."""
+        self._ocr_frame = None
+
+    def find_text_on_screen(self, text: str, confidence: float = 0.8, refresh: bool = False,
+                            area: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """Find text on screen using OCR and return center coordinates."""
+        if not self.screen_available or self.dry_run:
+            return None
+
+        try:
+            frame = self.get_ocr_frame(refresh=refresh, area=area)
+            position = frame.find_text(text, confidence)
+            if position:
+                self.logger.info(f"Found text '{text}' at {position}")
+                return position
+
+            position = self.find_text_with_variants(frame, text, confidence)
+            if position:
+                return position
 
             self.logger.debug(f"Text '{text}' not found on screen")
             return None
@@ -203,124 +484,249 @@ class TehtrisEDRInstaller:
             self.logger.warning(f"Error finding text '{text}': {e}")
             return None
 
-    def find_button_by_text(self, button_text: str, timeout: int = 10) -> Optional[Tuple[int, int]]:
-        """Find button by text with timeout."""
-        if not PYAUTOGUI_AVAILABLE or self.dry_run:
+    def enable_variant_ocr(self):
+        """Retry missed OCR lookups over several preprocessing variants in parallel."""
+        # tesseract runs in worker processes; a simulated backend's OCR in threads
+        image_to_data = None if self.backend.name == 'win32' else self.backend.ocr_data
+        self.variant_ocr = MultiVariantOcr(image_to_data, variants=[v for v in OCR_VARIANTS if v != 'contrast'])
+
+    def find_text_with_variants(self, frame: OcrFrame, text: str, confidence: float = 0.8) -> Optional[Tuple[int, int]]:
+        """Look for `text` in the other OCR preprocessing variants of the frame's capture."""
+        if self.variant_ocr is None or frame.image is None:
             return None
 
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            position = self.find_text_on_screen(button_text)
-            if position:
-                return position
-            time.sleep(1)
+        searched_frame, misses = self._variant_misses
+        if searched_frame is not frame:
+            misses = set()
+            self._variant_misses = (frame, misses)
+        if text in misses:
+            return None
 
-        return None
+        match = self.variant_ocr.find(frame.image, [text], frame.origin, confidence)
+        if match is None:
+            misses.add(text)
+            return None
+        self.logger.info(f"Found text '{text}' at {match.position} in the {match.variant} OCR variant "
+                         f"({match.seconds * 1000:.0f} ms)")
+        return match.position
 
-    def find_ui_element_by_color(self, color_range: dict, min_area: int = 100) -> Optional[Tuple[int, int]]:
-        """Find UI element by color pattern (for buttons, checkboxes, etc.)."""
-        if not PYAUTOGUI_AVAILABLE or self.dry_run:
+    def find_button_by_text(self, button_text: str, timeout: int = 10, area: str = 'buttons') -> Optional[Tuple[int, int]]:
+        """Find button by text with timeout."""
+        if not self.screen_available or self.dry_run:
             return None
 
+        # The screen may change on its own between polls, so always recapture
+        return wait_until(lambda: self.find_text_on_screen(button_text, refresh=True, area=area),
+                          timeout, interval=0.25, max_interval=1)
+
+    def click_coordinates(self, x: int, y: int, description: str = "", changes_screen: bool = True) -> bool:
+        """Click at screen coordinates.
+
+        Pass changes_screen=False when the click only moves focus (e.g. into an
+        input field) so the current OCR frame stays valid for further lookups.
+        """
+        if not self.screen_available:
+            return False
+
         try:
-            # Take screenshot
-            screenshot = pyautogui.screenshot()
-            screenshot_np = np.array(screenshot)
-            screenshot_bgr = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2BGR)
-
-            # Convert to HSV for better color detection
-            hsv = cv2.cvtColor(screenshot_bgr, cv2.COLOR_BGR2HSV)
-
-            # Create mask for the color range
-            lower = np.array(color_range['lower'])
-            upper = np.array(color_range['upper'])
-            mask = cv2.inRange(hsv, lower, upper)
-
-            # Find contours
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            # Find the largest contour that meets minimum area
-            for contour in sorted(contours, key=cv2.contourArea, reverse=True):
-                area = cv2.contourArea(contour)
-                if area > min_area:
-                    # Get center of contour
-                    M = cv2.moments(contour)
-                    if M["m00"] != 0:
-                        cx = int(M["m10"] / M["m00"])
-                        cy = int(M["m01"] / M["m00"])
-                        return (cx, cy)
+            self.backend.click(x, y)
+            self.controls.expire()
+            if changes_screen:
+                self.invalidate_ocr_frame()
+            self.logger.info(f"Clicked at ({x}, {y}): {description}")
+            return True
+        except Exception as e:
+            self.logger.warning(f"Failed to click at ({x}, {y}): {e}")
+            return False
 
+    def press_hotkey(self, *keys: str):
+        """Send a keyboard shortcut to the focused window."""
+        self.backend.hotkey(*keys)
+        self.controls.expire()
+        self.invalidate_ocr_frame()
+
+    def _template_names(self, element_type: str) -> list:
+        """Return the template names relevant to an element description."""
+        element = element_type.lower()
+        return [name for name in ('next', 'install', 'finish', 'accept') if name in element]
+
+    def find_by_template(self, element_type: str) -> Optional[Tuple[int, int]]:
+        """Find an element by template matching and return its center coordinates."""
+        names = self._template_names(element_type)
+        if not names or not self.screen_available or self.dry_run:
             return None
 
+        try:
+            # The current OCR frame already holds a capture of this UI state
+            frame = self._ocr_frame
+            if frame is not None and frame.image is not None:
+                image, origin = frame.image, frame.origin
+            else:
+                image, origin = capture_screen(self.get_capture_region(), self.backend.screenshot)
+
+            match = self.template_locator.locate(image, names, origin)
+            if match:
+                self.logger.info(f"Found {element_type} by template '{match.name}' at {match.center} "
+                                 f"(confidence {match.confidence:.2f}, scale {match.scale})")
+                return match.center
         except Exception as e:
-            self.logger.warning(f"Error finding UI element by color: {e}")
-            return None
+            self.logger.warning(f"Error matching templates for {element_type}: {e}")
+        return None
 
-    def smart_find_and_click(self, element_type: str, text_options: list, fallback_positions: list = None) -> bool:
-        """Smart method to find and click UI elements using multiple strategies."""
+    def _learn_template(self, element_type: str, text: str):
+        """Store the OCR match of `text` as the template for `element_type` if none exists yet."""
+        names = self._template_names(element_type)
+        frame = self._ocr_frame
+        if not self.learn_templates or not names or frame is None or frame.image is None:
+            return
+
+        box = frame.find_box(text)
+        if box:
+            local_box = (box[0] - frame.origin[0], box[1] - frame.origin[1], box[2], box[3])
+            try:
+                if self.template_locator.learn(names[0], frame.image, local_box):
+                    self.logger.info(f"Saved template '{names[0]}' from OCR match '{text}'")
+            except Exception as e:
+                self.logger.debug(f"Could not save template '{names[0]}': {e}")
+
+    def find_ui_elements_by_color(self, color_ranges: dict, min_area: int = 100, area: Optional[str] = None,
+                                  downscale: float = 1.0) -> dict:
+        """Find UI elements for several color ranges with a single capture and HSV conversion.
+
+        Returns {name: [ColorElement, ...]} sorted by decreasing area, in
+        screen coordinates.
+        """
+        if not self.screen_available or self.dry_run:
+            return {}
+
+        try:
+            # Take screenshot of the installer window (or full screen)
+            screenshot_np, origin = capture_screen(self.get_capture_region(area), self.backend.screenshot)
+            return find_color_elements(screenshot_np, color_ranges, min_area, downscale, origin)
+        except Exception as e:
+            self.logger.warning(f"Error finding UI elements by color: {e}")
+            return {}
+
+    def find_ui_element_by_color(self, color_range: dict, min_area: int = 100,
+                                 area: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """Find UI element by color pattern (for buttons, checkboxes, etc.)."""
+        elements = self.find_ui_elements_by_color({'element': color_range}, min_area, area).get('element')
+        return elements[0].center if elements else None
+
+    def _ocr_calls(self) -> int:
+        """OCR passes so far: frame captures plus multi-variant retries."""
+        retries = self.variant_ocr.stats['ocr_calls'] if self.variant_ocr is not None else 0
+        return self.frame_detector.ocr_calls + retries
+
+    def _strategy_won(self, span: dict):
+        """Mark a locator attempt span as successful and count the win."""
+        span['outcome'] = 'hit'
+        self.strategy_wins[(span['element'], span['strategy'])] += 1
+
+    def try_strategies(self, element: str, strategies: Dict[str, Callable[[], bool]]) -> Optional[str]:
+        """Try the locating `strategies` for `element` until one returns True; returns its name.
+
+        Strategies run in the order learned from earlier runs on this host
+        (strategy_table), or as given with static_order. Each attempt is a
+        span, which is what the table learns from.
+        """
+        order = list(strategies)
+        if not self.static_order:
+            order = self.strategy_table.order(self.spans.current_step, element, order)
+            if order != list(strategies):
+                self.logger.debug(f"Strategy order for {element}: {', '.join(order)}")
+        for name in order:
+            with self.spans.attempt(element, name) as span:
+                if strategies[name]():
+                    self._strategy_won(span)
+                    return name
+        return None
+
+    def learn_strategy_order(self):
+        """Fold this run's locator attempts into the strategy table and save it."""
+        if self.dry_run or not any(span['element'] for span in self.spans.spans):
+            return
+        self.strategy_table.observe(self.spans.spans)
+        try:
+            self.strategy_table.save()
+        except OSError as e:
+            self.logger.warning(f"Could not save the strategy table: {e}")
+
+    def _click_template(self, element_type: str) -> bool:
+        position = self.find_by_template(element_type)
+        return bool(position) and self.click_coordinates(*position, f"{element_type} found by template")
+
+    def _click_text(self, element_type: str, text_options: list) -> bool:
+        # All text options are looked up in the same OCR frame; it is only
+        # recaptured once a click has changed the screen.
+        for text in text_options:
+            # Try both with and without ampersand for Windows controls
+            search_texts = [text]
+            if '&' in text:
+                search_texts.append(text.replace('&', ''))
+            else:
+                search_texts.append('&' + text)
+
+            for search_text in search_texts:
+                position = self.find_text_on_screen(search_text)
+                if position:
+                    x, y = position
+                    self._learn_template(element_type, search_text)
+                    if self.click_coordinates(x, y, f"{element_type} found by text '{search_text}'"):
+                        return True
+        return False
+
+    def _click_fallback(self, element_type: str, fallback_positions: list, page_before: Optional[tuple]) -> bool:
+        self.logger.info(f"Using fallback positions for {element_type}")
+        for x, y in fallback_positions:
+            if self.click_coordinates(x, y, f"{element_type} fallback position"):
+                self.wait_for_page_change(page_before)  # Give UI time to respond
+                return True
+        return False
+
+    def _press_element_hotkey(self, element_type: str, key: str, page_before: Optional[tuple]) -> bool:
+        self.logger.info(f"Trying Alt+{key.upper()} for {element_type}")
+        self.press_hotkey('alt', key)
+        # Only a page change confirms the shortcut worked
+        return self.wait_for_page_change(page_before)
+
+    def smart_find_and_click(self, element_type: str, text_options: list, fallback_positions: list = None,
+                             button_text: Optional[str] = None) -> bool:
+        """Smart method to find and click UI elements using multiple strategies.
+
+        Strategies: win32gui (when `button_text` is given), template
+        matching, OCR text, fallback coordinates and the element's Alt
+        shortcut, in the order try_strategies picks.
+        """
         if self.dry_run:
             self.logger.info(f"DRY RUN: Would smart click {element_type}")
             return True
 
         self.logger.info(f"Smart finding {element_type}...")
-
-        # Strategy 1: Find by text using OCR (if available)
-        if PYAUTOGUI_AVAILABLE:
-            for text in text_options:
-                # Try both with and without ampersand for Windows controls
-                search_texts = [text]
-                if '&' in text:
-                    search_texts.append(text.replace('&', ''))
-                else:
-                    search_texts.append('&' + text)
-
-                for search_text in search_texts:
-                    position = self.find_text_on_screen(search_text)
-                    if position:
-                        x, y = position
-                        if self.click_coordinates(x, y, f"{element_type} found by text '{search_text}'"):
-                            return True
+        page_before = self._page_signature()
+
+        strategies: Dict[str, Callable[[], bool]] = {}
+        if button_text:
+            strategies['win32'] = lambda: self.click_with_win32gui(button_text)
+        # Template matching against reference crops (fast path)
+        strategies['template'] = lambda: self._click_template(element_type)
+        if self.screen_available:
+            strategies['ocr'] = lambda: self._click_text(element_type, text_options)
         else:
             self.logger.warning("PyAutoGUI not available, skipping OCR text search")
+        if fallback_positions:
+            strategies['fallback'] = lambda: self._click_fallback(element_type, fallback_positions, page_before)
+        hotkey = next((key for word, key in ELEMENT_HOTKEYS if word in element_type.lower()), None)
+        if self.screen_available and hotkey:
+            strategies['hotkey'] = lambda: self._press_element_hotkey(element_type, hotkey, page_before)
 
-        # Strategy 2: Try pyautogui's built-in image recognition if we have reference images
-        # (This would require pre-captured button images)
-
-        # Strategy 3: Use fallback coordinates if provided and not empty
-        if fallback_positions and len(fallback_positions) > 0:
-            self.logger.info(f"Using fallback positions for {element_type}")
-            for x, y in fallback_positions:
-                if self.click_coordinates(x, y, f"{element_type} fallback position"):
-                    time.sleep(0.5)  # Give UI time to respond
-                    return True
-
-        # Strategy 2: Try keyboard shortcuts for common buttons
-        if PYAUTOGUI_AVAILABLE:
-            self.logger.info(f"Trying keyboard shortcuts for {element_type}")
-            if "next" in element_type.lower():
-                # Try Alt+N for Next button
-                pyautogui.hotkey('alt', 'n')
-                time.sleep(0.5)
-                self.logger.info("Tried Alt+N for Next button")
-                return True
-            elif "accept" in element_type.lower():
-                # Try Alt+A for Accept
-                pyautogui.hotkey('alt', 'a')
-                time.sleep(0.5)
-                self.logger.info("Tried Alt+A for Accept")
-                return True
-            elif "install" in element_type.lower():
-                # Try Alt+I for Install
-                pyautogui.hotkey('alt', 'i')
-                time.sleep(0.5)
-                self.logger.info("Tried Alt+I for Install")
-                return True
-            elif "finish" in element_type.lower():
-                # Try Alt+F for Finish
-                pyautogui.hotkey('alt', 'f')
-                time.sleep(0.5)
-                self.logger.info("Tried Alt+F for Finish")
-                return True
+        if self.try_strategies(element_type, strategies):
+            return True
+        if 'hotkey' in strategies:
+            # Not every shortcut changes the page (a radio button does not);
+            # as a last resort the shortcut is assumed to have worked
+            self.logger.info(f"Assuming the Alt+{hotkey.upper()} shortcut worked for {element_type}")
+            return True
 
         self.logger.error(f"Failed to find {element_type} using all strategies")
         return False
@@ -354,19 +760,15 @@ class TehtrisEDRInstaller:
 
         # Method 2: Try OCR if available
         try:
-            if PYAUTOGUI_AVAILABLE:
+            if self.screen_available:
                 print("\n--- OCR Text Recognition ---")
-                screenshot = pyautogui.screenshot()
-                screenshot_np = np.array(screenshot)
-                gray = cv2.cvtColor(screenshot_np, cv2.COLOR_RGB2GRAY)
-
-                # Use pytesseract to extract text
-                text = pytesseract.image_to_string(gray)
-                if text.strip():
+                # Reuse the frame the locators will query for this step
+                frame = self.get_ocr_frame()
+                lines = frame.text_lines() if frame else []
+                if lines:
                     print("OCR detected text:")
-                    for line in text.split('\n'):
-                        if line.strip():
-                            print(f"  {line}")
+                    for line in lines:
+                        print(f"  {line}")
                 else:
                     print("No text detected by OCR")
         except Exception as e:
@@ -375,141 +777,45 @@ class TehtrisEDRInstaller:
         # Method 3: Try Windows API
         try:
             print("\n--- Windows API Method ---")
-            import win32gui
-
-
-            def enum_windows_callback(hwnd, windows):
-                if win32gui.IsWindowVisible(hwnd):
-                    window_text = win32gui.GetWindowText(hwnd)
-                    if "TEHTRIS" in window_text or "Setup" in window_text:
-                        windows.append((hwnd, window_text))
-                return True
-
-            windows = []
-            win32gui.EnumWindows(enum_windows_callback, windows)
-
-            for hwnd, title in windows:
-                print(f"Found window: {title}")
-
-                # Try to get child windows
-                def enum_child_callback(child_hwnd, texts):
-                    try:
-                        child_text = win32gui.GetWindowText(child_hwnd)
-                        class_name = win32gui.GetClassName(child_hwnd)
-                        if child_text.strip():
-                            texts.append(f"  {class_name}: '{child_text}'")
-                    except:
-                        pass
-                    return True
-
-                child_texts = []
-                win32gui.EnumChildWindows(hwnd, enum_child_callback, child_texts)
-                for text in child_texts:
-                    print(text)
+            self.controls.ensure_fresh()
+            for hwnd in self.controls.windows:
+                print(f"Found window: {self.controls.api.GetWindowText(hwnd)} ({hwnd})")
+                for control in self.controls.controls:
+                    if control.window == hwnd and control.text.strip():
+                        print(f"  [{control.tab_index}] {control.class_name}: '{control.text}'")
 
         except Exception as e:
             print(f"Windows API method failed: {e}")
 
         print(f"=== END DEBUG ===\n")
 
-    def click_with_win32gui(self, button_text: str) -> bool:
-        """Click button using win32gui API with improved error handling."""
-        try:
-            import win32gui
-            import win32con
+    def click_with_win32gui(self, button_text: str, missing_level: int = logging.ERROR) -> bool:
+        """Click button using win32gui API with improved error handling.
 
+        A missing button is logged at `missing_level`; pollers that expect
+        misses pass logging.DEBUG.
+        """
+        try:
             self.logger.info(f"Looking for button with text: {button_text}")
 
-            # Find all TEHTRIS windows with safer enumeration
-            tehtris_windows = []
-            try:
-                def find_tehtris_windows(hwnd, windows):
-                    try:
-                        if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindow(hwnd):
-                            window_text = win32gui.GetWindowText(hwnd)
-                            if window_text and "TEHTRIS EDR Setup" in window_text:
-                                windows.append(hwnd)
-                                self.logger.debug(f"Found TEHTRIS window: {window_text}")
-                    except Exception as e:
-                        self.logger.debug(f"Error checking window {hwnd}: {e}")
-                    return True
-
-                win32gui.EnumWindows(find_tehtris_windows, tehtris_windows)
-
-            except Exception as enum_error:
-                self.logger.error(f"EnumWindows failed: {enum_error}")
-                # Try alternative approach - find window by class
-                try:
-                    hwnd = win32gui.FindWindow(None, "TEHTRIS EDR Setup")
-                    if hwnd:
-                        tehtris_windows = [hwnd]
-                        self.logger.info("Found TEHTRIS window using FindWindow")
-                except:
-                    pass
-
-            if not tehtris_windows:
-                self.logger.error("No TEHTRIS windows found")
+            if not self.controls.ensure_fresh():
+                self.logger.log(missing_level, "No TEHTRIS windows found")
                 return False
 
-            self.logger.info(f"Found {len(tehtris_windows)} TEHTRIS windows")
-
-            # Search for button in all TEHTRIS windows
-            all_buttons_found = []
-            for window_index, tehtris_hwnd in enumerate(tehtris_windows):
-                try:
-                    self.logger.info(f"Searching in window {window_index+1}: {tehtris_hwnd}")
-
-                    def find_button_callback(hwnd, button_info):
-                        try:
-                            if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindow(hwnd):
-                                window_text = win32gui.GetWindowText(hwnd)
-                                class_name = win32gui.GetClassName(hwnd)
-
-                                # Log all buttons for debugging
-                                if class_name == 'Button' and window_text:
-                                    all_buttons_found.append(f"Window {window_index+1} - {class_name}: '{window_text}'")
-
-                                if window_text:  # Only process controls with text
-                                    # Handle Windows ampersand characters and case variations
-                                    clean_window_text = window_text.replace('&', '').lower()
-                                    clean_button_text = button_text.replace('&', '').lower()
-
-                                    self.logger.debug(f"Checking {class_name}: '{window_text}' vs '{button_text}'")
-
-                                    if (clean_button_text in clean_window_text and
-                                        class_name == 'Button' and
-                                        'not' not in clean_window_text):
-                                        button_info['hwnd'] = hwnd
-                                        button_info['text'] = window_text
-                                        return False  # Stop enumeration
-                        except Exception as e:
-                            self.logger.debug(f"Error checking control {hwnd}: {e}")
-                        return True
-
-                    # Find the button in child windows
-                    button_info = {}
-                    try:
-                        win32gui.EnumChildWindows(tehtris_hwnd, find_button_callback, button_info)
-                    except Exception as child_enum_error:
-                        self.logger.debug(f"EnumChildWindows failed for {tehtris_hwnd}: {child_enum_error}")
-                        continue
+            # "I do not accept" also contains "accept"
+            button = self.controls.find_button(button_text, exclude='not')
+            if not button:
+                buttons = [f"'{c.text}'" for c in self.controls.by_class.get('Button', []) if c.text]
+                self.logger.debug(f"Buttons on this page: {', '.join(buttons)}")
+                self.logger.log(missing_level, f"Button with text '{button_text}' not found in any TEHTRIS window")
+                return False
 
-                    if 'hwnd' in button_info:
-                        # Click the button using PostMessage
-                        try:
-                            win32gui.PostMessage(button_info['hwnd'], win32con.BM_CLICK, 0, 0)
-                            self.logger.info(f"Clicked button via win32gui: {button_info['text']}")
-                            return True
-                        except Exception as click_error:
-                            self.logger.error(f"Failed to click button: {click_error}")
-                            continue
-
-                except Exception as window_error:
-                    self.logger.debug(f"Error searching window {tehtris_hwnd}: {window_error}")
-                    continue
-
-            self.logger.error(f"Button with text '{button_text}' not found in any TEHTRIS window")
-            return False
+            # Click the button using PostMessage
+            self.backend.click_control(button.hwnd)
+            self.controls.expire()
+            self.invalidate_ocr_frame()
+            self.logger.info(f"Clicked button via win32gui: {button.text}")
+            return True
 
         except Exception as e:
             self.logger.error(f"win32gui click failed: {e}")
@@ -518,100 +824,49 @@ class TehtrisEDRInstaller:
     def fill_field_with_win32gui(self, field_label: str, value: str) -> bool:
         """Fill input field using win32gui API with improved error handling."""
         try:
-            import win32gui
-            import win32con
-
             self.logger.info(f"Looking for field: {field_label}")
 
-            # Find all TEHTRIS windows with safer enumeration
-            tehtris_windows = []
-            try:
-                def find_tehtris_windows(hwnd, windows):
-                    try:
-                        if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindow(hwnd):
-                            window_text = win32gui.GetWindowText(hwnd)
-                            if window_text and "TEHTRIS EDR Setup" in window_text:
-                                windows.append(hwnd)
-                    except:
-                        pass
-                    return True
+            if not self.controls.ensure_fresh():
+                self.logger.error("No TEHTRIS windows found for field filling")
+                return False
 
-                win32gui.EnumWindows(find_tehtris_windows, tehtris_windows)
+            # Input fields in tab order: Server, Tag, License
+            edit_controls = self.controls.of_class(EDIT_CLASSES)
+            if "server" in field_label.lower():
+                field_index = 0
+            elif "tag" in field_label.lower():
+                field_index = 1
+            elif "license" in field_label.lower():
+                field_index = 2
+            else:
+                field_index = 0
 
-            except Exception as enum_error:
-                self.logger.error(f"EnumWindows failed: {enum_error}")
-                # Try alternative approach
-                try:
-                    hwnd = win32gui.FindWindow(None, "TEHTRIS EDR Setup")
-                    if hwnd:
-                        tehtris_windows = [hwnd]
-                        self.logger.info("Found TEHTRIS window using FindWindow")
-                except:
-                    pass
-
-            if not tehtris_windows:
-                self.logger.error("No TEHTRIS windows found for field filling")
+            if field_index >= len(edit_controls):
+                self.logger.error(f"Edit field for {field_label} not found")
                 return False
 
-            # Search for edit controls in all TEHTRIS windows
-            for tehtris_hwnd in tehtris_windows:
-                try:
-                    edit_controls = []
-                    def find_edit_callback(hwnd, controls):
-                        try:
-                            if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindow(hwnd):
-                                class_name = win32gui.GetClassName(hwnd)
-                                # Look for various input field types
-                                if class_name in ['Edit', 'TextBox', 'RichEdit', 'RichEdit20A', 'RichEdit20W']:
-                                    controls.append(hwnd)
-                                    self.logger.debug(f"Found input control: {class_name}")
-                        except:
-                            pass
-                        return True
+            edit_hwnd = edit_controls[field_index].hwnd
+            self.logger.debug(f"Found input control: {edit_controls[field_index].class_name}")
 
-                    win32gui.EnumChildWindows(tehtris_hwnd, find_edit_callback, edit_controls)
-
-                    if edit_controls:
-                        # For simplicity, fill fields in order: Server, Tag, License
-                        if "server" in field_label.lower():
-                            field_index = 0
-                        elif "tag" in field_label.lower():
-                            field_index = 1
-                        elif "license" in field_label.lower():
-                            field_index = 2
-                        else:
-                            field_index = 0
-
-                        if field_index < len(edit_controls):
-                            edit_hwnd = edit_controls[field_index]
-
-                            # Click on field to set focus
-                            rect = win32gui.GetWindowRect(edit_hwnd)
-                            center_x = (rect[0] + rect[2]) // 2
-                            center_y = (rect[1] + rect[3]) // 2
-
-                            if PYAUTOGUI_AVAILABLE:
-                                pyautogui.click(center_x, center_y)
-                                time.sleep(0.2)
-                            win32gui.SendMessage(edit_hwnd, win32con.WM_SETTEXT, 0, "")
-                            time.sleep(0.1)
-
-                            win32gui.SendMessage(edit_hwnd, win32con.WM_SETTEXT, 0, value)
-                            time.sleep(0.1)
-
-                            # Send Tab to move focus forward and trigger validation
-                            win32gui.SendMessage(edit_hwnd, win32con.WM_KEYDOWN, win32con.VK_TAB, 0)
-                            win32gui.SendMessage(edit_hwnd, win32con.WM_KEYUP, win32con.VK_TAB, 0)
-                            
-                            self.logger.info(f"Filled {field_label} with '{value}' using win32gui")
-                            return True
-
-                except Exception as window_error:
-                    self.logger.debug(f"Error searching window {tehtris_hwnd}: {window_error}")
-                    continue
-
-            self.logger.error(f"Edit field for {field_label} not found")
-            return False
+            # Click on field to set focus
+            rect = self.backend.control_rect(edit_hwnd)
+            center_x = (rect[0] + rect[2]) // 2
+            center_y = (rect[1] + rect[3]) // 2
+
+            if self.screen_available:
+                self.backend.click(center_x, center_y)
+
+            # WM_SETTEXT is synchronous, so the field holds the value once it returns
+            self.backend.set_text(edit_hwnd, value)
+            self.wait_for(f"{field_label} field to hold the value",
+                          lambda: self.backend.get_text(edit_hwnd) == value, timeout=1)
+
+            # Send Tab to move focus forward and trigger validation
+            self.backend.send_tab(edit_hwnd)
+            self.controls.expire()
+
+            self.logger.info(f"Filled {field_label} with '{value}' using win32gui")
+            return True
 
         except Exception as e:
             self.logger.error(f"win32gui fill field failed: {e}")
@@ -619,7 +874,7 @@ class TehtrisEDRInstaller:
         
     def find_input_field_by_label(self, label_text: str, offset_x: int = 0, offset_y: int = 25) -> Optional[Tuple[int, int]]:
         """Find input field by looking for its label and calculating field position."""
-        if not PYAUTOGUI_AVAILABLE or self.dry_run:
+        if not self.screen_available or self.dry_run:
             return None
 
         try:
@@ -639,42 +894,60 @@ class TehtrisEDRInstaller:
             self.logger.warning(f"Error finding input field for '{label_text}': {e}")
             return None
 
-    def smart_fill_field(self, field_name: str, value: str, label_options: list, fallback_positions: list = None) -> bool:
-        """Smart method to find and fill input fields."""
-        if self.dry_run:
-            self.logger.info(f"DRY RUN: Would fill {field_name} with '{value}'")
-            return True
-
-        self.logger.info(f"Smart filling {field_name}...")
-
-        # Strategy 1: Find field by label
+    def _fill_by_label(self, field_name: str, value: str, label_options: list) -> bool:
         for label in label_options:
             field_position = self.find_input_field_by_label(label)
             if field_position:
                 x, y = field_position
-                if self.click_coordinates(x, y, f"{field_name} field found by label '{label}'"):
-                    time.sleep(0.3)
-                    if PYAUTOGUI_AVAILABLE:
-                        pyautogui.hotkey('ctrl', 'a')  # Select all existing text
-                        pyautogui.write(value)
+                # Typing into a field leaves the labels in place, so keep the frame
+                if self.click_coordinates(x, y, f"{field_name} field found by label '{label}'", changes_screen=False):
+                    self.wait_for_setup_foreground()
+                    if self.screen_available:
+                        self.backend.hotkey('ctrl', 'a')  # Select all existing text
+                        self.backend.write(value)
                         self.logger.info(f"Filled {field_name} with '{value}'")
                         return True
+        return False
+
+    def _fill_at_fallback(self, field_name: str, value: str, fallback_positions: list) -> bool:
+        self.logger.info(f"Using fallback positions for {field_name}")
+        for x, y in fallback_positions:
+            if self.click_coordinates(x, y, f"{field_name} fallback position", changes_screen=False):
+                self.wait_for_setup_foreground()
+                if self.screen_available:
+                    self.backend.hotkey('ctrl', 'a')  # Select all existing text
+                    self.backend.write(value)
+                    self.logger.info(f"Filled {field_name} with '{value}' using fallback")
+                    return True
+        return False
 
-        # Strategy 2: Use fallback positions
+    def smart_fill_field(self, field_name: str, value: str, label_options: list, fallback_positions: list = None,
+                         field_label: Optional[str] = None) -> bool:
+        """Smart method to find and fill input fields.
+
+        Strategies: win32gui (when `field_label` is given), the field below
+        its OCR'd label and fallback coordinates, in the order
+        try_strategies picks.
+        """
+        if self.dry_run:
+            self.logger.info(f"DRY RUN: Would fill {field_name} with '{value}'")
+            return True
+
+        self.logger.info(f"Smart filling {field_name}...")
+
+        strategies: Dict[str, Callable[[], bool]] = {}
+        if field_label:
+            strategies['win32'] = lambda: self.fill_field_with_win32gui(field_label, value)
+        strategies['label'] = lambda: self._fill_by_label(field_name, value, label_options)
         if fallback_positions:
-            self.logger.info(f"Using fallback positions for {field_name}")
-            for x, y in fallback_positions:
-                if self.click_coordinates(x, y, f"{field_name} fallback position"):
-                    time.sleep(0.3)
-                    if PYAUTOGUI_AVAILABLE:
-                        pyautogui.hotkey('ctrl', 'a')  # Select all existing text
-                        pyautogui.write(value)
-                        self.logger.info(f"Filled {field_name} with '{value}' using fallback")
-                        return True
+            strategies['fallback'] = lambda: self._fill_at_fallback(field_name, value, fallback_positions)
+
+        if self.try_strategies(field_name, strategies):
+            return True
 
         self.logger.error(f"Failed to fill {field_name} using all strategies")
         return False
-    
+
     def launch_installer(self) -> bool:
         """Launch the MSI installer."""
         self.logger.info("Step 1: Launching installer...")
@@ -692,18 +965,31 @@ class TehtrisEDRInstaller:
 
             # Launch MSI - open the installer GUI for manual interaction
             # No /qr flag - this opens the full installer interface
-            cmd = f'msiexec /i "{self.msi_path}"'
-            self.logger.debug(f"Executing command: {cmd}")
             self.logger.info("Opening installer GUI - you can interact with it manually")
 
-            subprocess.Popen(cmd, shell=True)
-            time.sleep(5)  # Give installer more time to start
+            self.backend.launch(self.msi_path)
+            if self.screen_available:
+                # Load the OCR engine while the installer starts up
+                self.backend.warm_up_ocr()
+            if self.variant_ocr is not None:
+                # Start the OCR workers while the installer loads
+                self.variant_ocr.warm_up()
+            # Wait for the setup window instead of a fixed delay
+            if not self.wait_for("installer window", self.controls.has_window, timeout=self.window_timeout,
+                                 fallback_delay=5):
+                self.logger.warning("Installer window did not appear within timeout")
 
             # Take screenshot after launching
             self.take_screenshot("after_launch")
 
+            # pywinauto only attaches to real windows
+            if self.backend.simulated:
+                self.print_window_text()
+                return True
+
             # Try to connect to the installer window
             try:
+                from pywinauto import Application
                 self.app = Application().connect(title_re=".*TEHTRIS EDR Setup.*", timeout=self.window_timeout)
                 self.logger.info("Successfully connected to installer window")
 
@@ -713,9 +999,6 @@ class TehtrisEDRInstaller:
                 return True
             except Exception as connect_error:
                 self.logger.warning(f"Could not connect via pywinauto: {connect_error}")
-
-
-
                 self.logger.info("Falling back to screen capture method")
                 # Continue with screen capture fallback
                 return True
@@ -743,25 +1026,22 @@ class TehtrisEDRInstaller:
             self.logger.info("DRY RUN: Would click Next on welcome screen")
             return True
 
+        # Wait for the welcome page to be ready
+        self.wait_for_button("Next")
+
         # Take screenshot for debugging
         self.take_screenshot("welcome_screen")
 
         # Print window text for debugging
         self.print_window_text()
 
-        # Try win32gui method first
-        self.logger.info("Trying win32gui method for welcome screen...")
-        if self.click_with_win32gui("Next"):
-            return True
-
-        # Fallback to smart finding method
-        self.logger.info("win32gui failed, trying smart finding...")
         next_text_options = ["&Next >", "Next >", "Next", "Suivant >", "Suivant"]
 
         return self.smart_find_and_click(
             "Next button (welcome screen)",
             next_text_options,
-            []  # No fallback positions
+            [],  # No fallback positions
+            button_text="Next"
         )
 
     def handle_license_agreement(self) -> bool:
@@ -772,34 +1052,26 @@ class TehtrisEDRInstaller:
             self.logger.info("DRY RUN: Would accept license agreement")
             return True
 
+        # Wait for the license page
+        self.wait_for_button("accept", enabled=False)
+
         # Take screenshot for debugging
         self.take_screenshot("license_agreement")
 
         # Print window text for debugging
         self.print_window_text()
 
-        # Try win32gui method first
-        self.logger.info("Trying win32gui method for license agreement...")
-
-        # Click "I accept" button using win32gui
-        if self.click_with_win32gui("accept"):
-            time.sleep(0.5)
-
-            # Click Next button using win32gui
-            if self.click_with_win32gui("Next"):
-                return True
-
-        # Fallback to smart finding method
-        self.logger.info("win32gui failed, trying smart finding...")
         accept_text_options = ["I accept", "J'accepte", "accept", "accepte"]
 
-        # First, try to find and click "I accept"
+        # First, find and click "I accept"
         if self.smart_find_and_click(
             "I accept radio button",
             accept_text_options,
-            []  # No fallback positions
+            [],  # No fallback positions
+            button_text="accept"
         ):
-            time.sleep(0.5)
+            # Next stays disabled until the license is accepted
+            self.wait_for_button("Next")
 
         # Then find and click Next button
         next_text_options = ["&Next >", "Next >", "Next", "Suivant >", "Suivant"]
@@ -807,7 +1079,8 @@ class TehtrisEDRInstaller:
         return self.smart_find_and_click(
             "Next button (license screen)",
             next_text_options,
-            []  # No fallback positions
+            [],  # No fallback positions
+            button_text="Next"
         )
 
     def handle_activation_information(self) -> bool:
@@ -818,65 +1091,56 @@ class TehtrisEDRInstaller:
             self.logger.info("DRY RUN: Would fill activation information")
             return True
 
+        # Wait for the server, tag and license fields
+        self.wait_for("activation fields", lambda: len(self.controls.of_class(EDIT_CLASSES)) >= 3, timeout=self.page_timeout)
+
         # Take screenshot for debugging
         self.take_screenshot("activation_information")
 
         # Print window text for debugging
         self.print_window_text()
 
-        # Try win32gui method first
-        self.logger.info("Trying win32gui method for activation information...")
-
-        # Fill fields using win32gui
-        success = True
-        success &= self.fill_field_with_win32gui("server", self.config['server_address'])
-        success &= self.fill_field_with_win32gui("tag", self.config['tag'])
-        success &= self.fill_field_with_win32gui("license", self.config['license_key'])
-
-        if success:
-            time.sleep(0.5)
-            # Click Next button using win32gui
-            if self.click_with_win32gui("Next"):
-                return True
-
-        # Fallback to smart field filling methods
-        self.logger.info("win32gui failed, using smart field filling...")
+        filled = True
 
         # Fill server address
         server_labels = ["Server address", "Adresse serveur", "Server", "Serveur"]
-        self.smart_fill_field(
+        filled &= self.smart_fill_field(
             "Server address",
             self.config['server_address'],
             server_labels,
-            []  # No fallback positions
+            [],  # No fallback positions
+            field_label="server"
         )
 
         # Fill tag
         tag_labels = ["Tag", "Étiquette"]
-        self.smart_fill_field(
+        filled &= self.smart_fill_field(
             "Tag",
             self.config['tag'],
             tag_labels,
-            []  # No fallback positions
+            [],  # No fallback positions
+            field_label="tag"
         )
 
         # Fill license key
         license_labels = ["License key", "Clé de licence", "License", "Licence"]
-        self.smart_fill_field(
+        filled &= self.smart_fill_field(
             "License key",
             self.config['license_key'],
             license_labels,
-            []  # No fallback positions
+            [],  # No fallback positions
+            field_label="license"
         )
 
-        # Click Next button
-        time.sleep(1)  # Allow fields to update
+        # Next is enabled once the fields pass validation
+        self.wait_for_button("Next", timeout=None if filled else 1)
         next_text_options = ["&Next >", "Next >", "Next", "Suivant >", "Suivant"]
 
         return self.smart_find_and_click(
             "Next button (activation screen)",
             next_text_options,
-            []  # No fallback positions
+            [],  # No fallback positions
+            button_text="Next"
         )
 
     def handle_installation(self) -> bool:
@@ -887,22 +1151,19 @@ class TehtrisEDRInstaller:
             self.logger.info("DRY RUN: Would start installation")
             return True
 
+        # Wait for the ready-to-install page
+        self.wait_for_button("Install")
+
         # Take screenshot for debugging
         self.take_screenshot("installation_screen")
 
-        # Try win32gui method first
-        self.logger.info("Trying win32gui method for Install button...")
-        if self.click_with_win32gui("Install"):
-            return True
-
-        # Fallback to smart finding for Install button
-        self.logger.info("win32gui failed, trying smart finding...")
         install_text_options = ["Install", "Installer", "Install >"]
 
         return self.smart_find_and_click(
             "Install button",
             install_text_options,
-            []  # No fallback positions
+            [],  # No fallback positions
+            button_text="Install"
         )
 
     def wait_for_completion(self) -> bool:
@@ -918,7 +1179,7 @@ class TehtrisEDRInstaller:
             completion_timeout = 180  # 3 minutes for installation
             start_time = time.time()
 
-            while time.time() - start_time < completion_timeout:
+            def check_completion() -> bool:
                 try:
                     # Take screenshot to check for completion
                     self.take_screenshot("completion_check")
@@ -926,34 +1187,45 @@ class TehtrisEDRInstaller:
                     elapsed = int(time.time() - start_time)
                     self.logger.info(f"Checking for completion... ({elapsed}s elapsed)")
 
-                    # Try clicking Finish button using win32gui (primary method)
-                    self.logger.info("Trying win32gui method for Finish button...")
-                    if self.click_with_win32gui("Finish"):
-                        self.logger.info("Clicked Finish button via win32gui")
-                        return True
-
-                    # Try clicking Close button using win32gui
-                    self.logger.info("Trying win32gui method for Close button...")
-                    if self.click_with_win32gui("Close"):
-                        self.logger.info("Clicked Close button via win32gui")
-                        return True
-
-                    # No button found, wait before next attempt
-                    self.logger.info("No completion button found, waiting 2 seconds before retry...")
-                    time.sleep(2)  # Check every 2 seconds
+                    # Try clicking Finish, then Close, using win32gui (primary method)
+                    for button_text in ("Finish", "Close"):
+                        self.logger.info(f"Trying win32gui method for {button_text} button...")
+                        with self.spans.attempt(button_text, 'win32') as span:
+                            # Misses are expected until the install finishes
+                            if self.click_with_win32gui(button_text, missing_level=logging.DEBUG):
+                                self._strategy_won(span)
+                                self.logger.info(f"Clicked {button_text} button via win32gui")
+                                return True
+
+                    # OCR the button strip; while the progress page is unchanged
+                    # the previous frame answers without another tesseract run
+                    if self.screen_available:
+                        self.get_ocr_frame(refresh=True, area='buttons')
+                        for button_text in ("Finish", "Close"):
+                            with self.spans.attempt(button_text, 'ocr') as span:
+                                position = self.find_text_on_screen(button_text, area='buttons')
+                                if position and self.click_coordinates(*position, f"{button_text} button found by text"):
+                                    self._strategy_won(span)
+                                    return True
+
+                    self.logger.info("No completion button found yet")
 
                 except Exception as e:
                     self.logger.debug(f"Waiting for completion: {e}")
-                    time.sleep(2)
+                return False
+
+            # Poll quickly at first (short installs), backing off to every 2 seconds
+            if wait_until(check_completion, completion_timeout, interval=0.5, max_interval=2):
+                return True
 
             # Final attempt if timeout reached
             self.logger.warning("Timeout reached, trying final attempt...")
 
             # Try keyboard shortcut as last resort
-            if PYAUTOGUI_AVAILABLE:
+            if self.screen_available:
                 self.logger.info("Trying Alt+F for Finish button as final attempt")
-                pyautogui.hotkey('alt', 'f')
-                time.sleep(1)
+                self.press_hotkey('alt', 'f')
+                self.wait_for("installer window to close", lambda: not self.controls.has_window(), timeout=1, fallback_delay=1)
                 return True  # Assume success if we got this far
 
             self.logger.error("Installation did not complete within timeout")
@@ -964,81 +1236,74 @@ class TehtrisEDRInstaller:
             return False
 
     def verify_installation(self) -> bool:
-        """Verify that the installation was successful."""
+        """Verify that the installation was successful.
+
+        Waits for a TEHTRIS Agent process; the watcher usually started during
+        the install, so this returns as soon as the agent is up.
+        """
         self.logger.info("Step 7: Verifying installation...")
 
         if self.dry_run:
             self.logger.info("DRY RUN: Would verify installation")
             return True
 
-        try:
-            import psutil
-
-            self.logger.info("Checking for Agent processes with TEHTRIS description...")
-            tehtris_agents = []
-
-            try:
-                for proc in psutil.process_iter(['pid', 'name', 'exe']):
-                    try:
-                        proc_info = proc.info
-                        proc_name = proc_info['name'].lower()
-
-                        # Look for processes named "Agent"
-                        if 'agent' in proc_name:
-                            try:
-                                # Get process executable path for description check
-                                exe_path = proc_info.get('exe', '')
-                                if exe_path:
-                                    # Get file description using Windows API
-                                    import win32api
-                                    try:
-                                        file_info = win32api.GetFileVersionInfo(exe_path, '\\StringFileInfo\\040904b0\\FileDescription')
-                                        if file_info and 'tehtris' in file_info.lower():
-                                            tehtris_agents.append({
-                                                'pid': proc_info['pid'],
-                                                'name': proc_info['name'],
-                                                'exe': exe_path,
-                                                'description': file_info
-                                            })
-                                            self.logger.info(f"[FOUND] TEHTRIS Agent process: PID {proc_info['pid']} - {proc_info['name']} - {file_info}")
-                                    except Exception:
-                                        # Fallback: check if exe path contains tehtris
-                                        if 'tehtris' in exe_path.lower():
-                                            tehtris_agents.append({
-                                                'pid': proc_info['pid'],
-                                                'name': proc_info['name'],
-                                                'exe': exe_path,
-                                                'description': 'Path contains TEHTRIS'
-                                            })
-                                            self.logger.info(f"[FOUND] TEHTRIS Agent process: PID {proc_info['pid']} - {proc_info['name']} - Path: {exe_path}")
-                            except Exception as e:
-                                self.logger.debug(f"Error checking process {proc_info['name']}: {e}")
-                                continue
-
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        continue
-
-            except Exception as e:
-                self.logger.error(f"Error checking processes: {e}")
-                return True  # Don't fail on process check error
-
-            if tehtris_agents:
-                self.logger.info(f"[SUCCESS] TEHTRIS EDR installation verified - Found {len(tehtris_agents)} Agent process(es)")
-                return True
-            else:
-                self.logger.warning("[NOT FOUND] No TEHTRIS Agent processes found")
-                self.logger.warning("Installation may have completed but processes haven't started yet")
-                return True  # Don't fail verification as process might start later
+        self.logger.info("Waiting for Agent processes with TEHTRIS description...")
+        start = time.monotonic()
+        agents = self.agent_watcher.result(self.agent_timeout)
+        waited = time.monotonic() - start
 
-        except ImportError:
-            self.logger.warning("psutil not available for process verification")
+        if self.agent_watcher.error:
+            self.logger.warning(f"Cannot list processes for verification: {self.agent_watcher.error}")
             return True
-        except Exception as e:
-            self.logger.warning(f"Verification failed: {e}")
-            return True  # Don't fail the entire installation for verification issues
+
+        stats = self.agent_watcher.stats
+        self.logger.debug(
+            f"Agent watcher: {stats['scans']} scans, {stats['candidates']} candidate processes, "
+            f"{stats['version_lookups']} version-info lookups, {stats['cache_hits']} cached"
+        )
+        if agents:
+            for agent in agents:
+                self.logger.info(f"[FOUND] TEHTRIS Agent process: PID {agent.pid} - {agent.name} - {agent.description}")
+            self.logger.info(
+                f"[SUCCESS] TEHTRIS EDR installation verified - Found {len(agents)} Agent process(es), "
+                f"{self.agent_watcher.found_after:.2f}s after the install step started ({waited:.2f}s spent verifying)"
+            )
+        else:
+            self.logger.warning(f"[NOT FOUND] No TEHTRIS Agent process appeared within {self.agent_timeout}s")
+            self.logger.warning("Installation may have completed but processes haven't started yet")
+        return True  # Don't fail verification as process might start later
 
     def cleanup(self):
         """Cleanup resources."""
+        self.agent_watcher.stop()
+        self.spans.close()
+        self.learn_strategy_order()
+        stats = self.flight_recorder.stats
+        self.logger.info(
+            f"Flight recorder: {stats['entries']} entries ({stats['bytes'] / 2 ** 20:.1f} MB), "
+            f"{stats['deduplicated']} repeats deduplicated, {stats['evicted']} evicted"
+        )
+        self.screenshot_writer.close()
+        stats = self.screenshot_writer.stats
+        if stats['submitted']:
+            self.logger.info(
+                f"Screenshots: {stats['written']} written, {stats['dropped']} dropped, {stats['failed']} failed; "
+                f"max queue depth {stats['max_queue_depth']}, encode {stats['mean_encode_ms']:.1f} ms mean / "
+                f"{stats['max_encode_ms']:.1f} ms max, submit {stats['max_submit_ms']:.2f} ms max"
+            )
+        if self.variant_ocr is not None:
+            self.variant_ocr.close()
+            self.logger.info(f"Multi-variant OCR: {dict(self.variant_ocr.stats)}")
+        stats = self.frame_detector.stats
+        self.logger.info(
+            f"Screen capture stats: {stats['frames_seen']} frames seen, "
+            f"{stats['frames_skipped']} skipped as unchanged, {stats['ocr_calls']} OCR calls"
+        )
+        stats = self.controls.stats
+        self.logger.info(
+            f"Control lookups: {stats['lookups']} lookups, {stats['enumerations']} enumerations, "
+            f"{stats['validations']} validations"
+        )
         if self.app:
             try:
                 self.app = None
@@ -1050,53 +1315,60 @@ class TehtrisEDRInstaller:
         self.logger.info("Starting TEHTRIS EDR installation automation")
 
         try:
+            with self.timer.step("check_installed"):
+                self.already_installed = self.check_installed()
+            if self.already_installed:
+                self.logger.info("TEHTRIS EDR is already installed from this package, nothing to do")
+                return True
+
             # Validate prerequisites
             if not self.validate_prerequisites():
                 return False
 
-            # Step 1: Launch installer
-            if not self.launch_installer():
-                return False
-
-            time.sleep(0.5)  # Allow installer to fully load
-
-            # Step 2: Handle welcome screen
-            if not self.handle_welcome_screen():
-                return False
-
-            time.sleep(0.5)
-
-            # Step 3: Handle license agreement
-            if not self.handle_license_agreement():
-                return False
-
-            time.sleep(0.5)
-
-            # Step 4: Handle activation information
-            if not self.handle_activation_information():
-                return False
-
-            time.sleep(0.5)
-
-            # Step 5: Handle installation
-            if not self.handle_installation():
-                return False
-
-            # Step 6: Wait for completion
-            if not self.wait_for_completion():
-                return False
+            # Each step waits for its own page instead of fixed delays in between
+            steps = [
+                ("launch_installer", self.launch_installer),
+                ("handle_welcome_screen", self.handle_welcome_screen),
+                ("handle_license_agreement", self.handle_license_agreement),
+                ("handle_activation_information", self.handle_activation_information),
+                ("handle_installation", self.handle_installation),
+                ("wait_for_completion", self.wait_for_completion),
+            ]
+            if self.silent:
+                properties = self.discover_activation_properties()
+                if properties is not None:
+                    steps = [("silent_install", lambda: self.silent_install(properties))]
+                else:
+                    self.logger.warning("Falling back to the setup wizard")
+            for name, step in steps:
+                if name in ("wait_for_completion", "silent_install") and not self.dry_run:
+                    # Look for the agent while the install finishes
+                    self.agent_watcher.start()
+                if not self.timer.run(name, step):
+                    self.take_screenshot(f"failed_{name}")
+                    self.dump_diagnostics(f"failed_{name}")
+                    return False
+            self.record_installed()
 
             # Step 7: Verify installation
-            if not self.verify_installation():
+            if not self.timer.run("verify_installation", self.verify_installation):
                 self.logger.warning("Installation verification failed, but installation may still be successful")
 
             self.logger.info("TEHTRIS EDR installation completed successfully!")
+            if self.dump_diagnostics_always:
+                self.dump_diagnostics("requested")
             return True
 
         except Exception as e:
             self.logger.error(f"Installation failed with error: {e}")
+            self.take_screenshot("error")
+            self.dump_diagnostics("error")
             return False
         finally:
+            if self.timer.steps:
+                self.logger.info("Step timings:")
+                for line in self.timer.report():
+                    self.logger.info(f"  {line}")
             self.cleanup()
 
 
@@ -1108,6 +1380,9 @@ def main():
         epilog="""
 Examples:
   python tehtris_edr_installer.py                    # Full automated installation
+  python tehtris_edr_installer.py --backend sim      # Run against the simulated wizard
+  python tehtris_edr_installer.py --silent           # msiexec /qn, no wizard
+  python tehtris_edr_installer.py --force            # Reinstall even if this package is installed
   python tehtris_edr_installer.py --open-only        # Just open installer GUI
   python tehtris_edr_installer.py --dry-run          # Test without installation
   python tehtris_edr_installer.py --debug            # Enable debug logging
@@ -1127,12 +1402,80 @@ Examples:
         help='Run in dry-run mode (no actual installation)'
     )
 
+    parser.add_argument(
+        '--silent',
+        action='store_true',
+        help='Install with msiexec /qn, setting the activation fields through MSI properties read from the package'
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Install even when this package is already installed (exit status 3 otherwise)'
+    )
+
+    parser.add_argument(
+        '--ocr-variants',
+        action='store_true',
+        help='When OCR misses a label, retry it over several preprocessing variants in parallel'
+    )
+
+    parser.add_argument(
+        '--save-screenshots',
+        action='store_true',
+        help='Also write every debug screenshot to screenshots/ (default: keep them in memory)'
+    )
+
+    parser.add_argument(
+        '--dump-diagnostics',
+        action='store_true',
+        help='Archive recent screenshots and control trees to diagnostics/ even when the install succeeds'
+    )
+
+    parser.add_argument(
+        '--flight-recorder-mb',
+        type=float,
+        default=32,
+        help='Memory budget for recent screenshots and control trees (default: 32)'
+    )
+
+    parser.add_argument(
+        '--screenshot-format',
+        choices=sorted(ScreenshotWriter.FORMATS),
+        default='png',
+        help='Format of screenshots written with --save-screenshots: png, jpeg or npy (raw NumPy array) (default: png)'
+    )
+
+    parser.add_argument(
+        '--screenshot-scale',
+        type=float,
+        default=1.0,
+        help='Downscale factor applied to screenshots written with --save-screenshots (default: 1.0)'
+    )
 
+    parser.add_argument(
+        '--static-order',
+        action='store_true',
+        help='Try locating strategies in the built-in order instead of the order learned from earlier runs'
+    )
+
+    parser.add_argument(
+        '--spans-file',
+        default='tehtris_installation_spans.jsonl',
+        help='Append a JSON span per step and locator attempt to this file (default: tehtris_installation_spans.jsonl)'
+    )
+
+    parser.add_argument(
+        '--backend',
+        choices=['win32', 'sim'],
+        default='win32',
+        help='UI backend: the Windows desktop or the simulated wizard (default: win32)'
+    )
 
     args = parser.parse_args()
 
     # Note about administrator privileges
-    if not args.dry_run:
+    if not args.dry_run and args.backend == 'win32':
         try:
             import ctypes
             if not ctypes.windll.shell32.IsUserAnAdmin():
@@ -1146,9 +1489,22 @@ Examples:
             print()
 
     # Create installer instance and run
-    installer = TehtrisEDRInstaller(args.msi_path, args.dry_run)
+    installer = TehtrisEDRInstaller(args.msi_path, args.dry_run, create_backend(args.backend))
+    installer.silent = args.silent
+    installer.force = args.force
+    if args.ocr_variants:
+        installer.enable_variant_ocr()
+    installer.save_screenshots = args.save_screenshots
+    installer.dump_diagnostics_always = args.dump_diagnostics
+    installer.flight_recorder.max_bytes = int(args.flight_recorder_mb * 2 ** 20)
+    installer.screenshot_writer.image_format = args.screenshot_format
+    installer.screenshot_writer.scale = args.screenshot_scale
+    installer.spans.path = Path(args.spans_file)
+    installer.static_order = args.static_order
     success = installer.run_installation()
 
+    if installer.already_installed:
+        sys.exit(EXIT_ALREADY_INSTALLED)
     sys.exit(0 if success else 1)
 
 
@@ -1,34 +1,78 @@
 #!/usr/bin/env python3
 """
 TEHTRIS EDR MSI Installer Automation Script - Minimal Version
+
+Pass --backend sim to run against the simulated wizard (tehtris_sim).
+Pass --silent to install with msiexec /qn, setting the activation fields
+through the MSI properties found by tehtris_msi.
+Exits with status 3 when the same package is already installed (see
+tehtris_msi.InstallState); pass --force to reinstall.
+Steps and button/field lookups are appended as JSON spans to
+tehtris_installation_spans.jsonl (see tehtris_ui.SpanLog); they also
+order the Install button strategies of later runs (--static-order keeps
+win32gui first).
 """
 
+import argparse
 import os
 import sys
 import time
 import logging
-import subprocess
 from pathlib import Path
 
-try:
-    import pyautogui
-    PYAUTOGUI_AVAILABLE = True
-    pyautogui.FAILSAFE = True
-    pyautogui.PAUSE = 0.5
-except ImportError:
-    PYAUTOGUI_AVAILABLE = False
+from tehtris_msi import MSI_SUCCESS_CODES, InstallState, MsiError, activation_property_values
+from tehtris_ui import (
+    AgentWatcher, ControlTreeSnapshot, SpanLog, StepTimer, StrategyTable, create_backend, desktop_has_focus,
+    wait_until,
+)
+
+EXIT_ALREADY_INSTALLED = 3
 
 class TehtrisEDRInstaller:
     """Minimal TEHTRIS EDR installer automation."""
     
-    def __init__(self, msi_path: str):
+    def __init__(self, msi_path: str, backend=None, silent: bool = False, force: bool = False,
+                 static_order: bool = False):
         self.msi_path = Path(msi_path)
         self.logger = self._setup_logging()
+        self.backend = backend or create_backend('win32')
         
         # Configuration
         self.server_address = "xpgapp16.tehtris.net"
         self.tag = "XPG_QAT"
         self.license_key = "MH83-2CDX-9DXQ-LG89-92FF"
+
+        # Condition wait timeouts (seconds)
+        self.window_timeout = 30
+        self.page_timeout = 5
+        self.silent_timeout = 900
+
+        # msiexec /qn instead of driving the wizard
+        self.silent = silent
+
+        # Skip the install when the state file shows this package installed
+        self.state_file = Path("tehtris_install_state.json")
+        self.force = force
+        self.already_installed = False
+
+        # Per-step wall clock of the last run; steps and button/field
+        # lookups are also appended as JSON spans next to the log
+        self.spans = SpanLog(Path("tehtris_installation_spans.jsonl"),
+                             enumerations=lambda: self.controls.enumerations)
+        self.timer = StepTimer(spans=self.spans)
+
+        # Install button strategies (win32gui, Alt+I) in the order learned
+        # from earlier runs, unless static_order
+        self.strategy_table = StrategyTable(Path("tehtris_strategy_table.json"))
+        self.static_order = static_order
+
+        # Setup window controls, enumerated once per page
+        self.controls = ControlTreeSnapshot(api=self.backend.win32)
+
+        # Agent processes are matched by path; polling starts with the
+        # install's last step
+        self.agent_watcher = AgentWatcher(self.backend, check_description=False)
+        self.agent_timeout = 60
     
     def _setup_logging(self) -> logging.Logger:
         """Setup logging."""
@@ -56,7 +100,7 @@ class TehtrisEDRInstaller:
         """Validate prerequisites."""
         self.logger.info("Validating prerequisites...")
         
-        if not self.msi_path.exists():
+        if not self.backend.simulated and not self.msi_path.exists():
             self.logger.error(f"MSI file not found: {self.msi_path}")
             return False
         
@@ -69,158 +113,94 @@ class TehtrisEDRInstaller:
     
     def _is_admin(self) -> bool:
         """Check admin privileges."""
-        try:
-            import ctypes
-            return ctypes.windll.shell32.IsUserAnAdmin()
-        except:
-            return False
+        return self.backend.is_admin()
 
-    def click_with_win32gui(self, button_text: str) -> bool:
-        """Click button using win32gui."""
-        try:
-            import win32gui
-            import win32con
-            
-            self.logger.info(f"Looking for button: {button_text}")
-            
-            # Find TEHTRIS windows
-            tehtris_windows = []
-            def find_windows(hwnd, windows):
-                try:
-                    if win32gui.IsWindowVisible(hwnd):
-                        window_text = win32gui.GetWindowText(hwnd)
-                        if "TEHTRIS EDR Setup" in window_text:
-                            windows.append(hwnd)
-                except:
-                    pass
+    def wait_for(self, description: str, predicate, timeout: float) -> bool:
+        """Wait until predicate holds, polling with backoff."""
+        start = time.monotonic()
+        if wait_until(predicate, timeout):
+            self.logger.debug(f"{description} after {time.monotonic() - start:.2f}s")
+            return True
+        self.logger.debug(f"Timed out waiting for {description}")
+        return False
+
+    def wait_for_button(self, text: str, timeout: float = None, enabled: bool = True) -> bool:
+        """Wait until a button containing text exists (and is enabled)."""
+        return self.wait_for(f"'{text}' button", lambda: self.controls.find_button(text, enabled=enabled),
+                             self.page_timeout if timeout is None else timeout)
+
+    def click_with_win32gui(self, button_text: str, missing_level: int = logging.ERROR) -> bool:
+        """Click button using win32gui.
+
+        A missing button is logged at `missing_level`; pollers that expect
+        misses pass logging.DEBUG, which also quiets the lookup message.
+        """
+        with self.spans.attempt(button_text, 'win32') as span:
+            try:
+                self.logger.log(min(missing_level, logging.INFO), f"Looking for button: {button_text}")
+
+                button = self.controls.find_button(button_text)
+                if not button:
+                    self.logger.log(missing_level, f"Button '{button_text}' not found")
+                    return False
+
+                self.backend.click_control(button.hwnd, synchronous=True)
+                self.controls.expire()
+                self.logger.info(f"Clicked button: {button.text}")
+                span['outcome'] = 'hit'
                 return True
-            
-            win32gui.EnumWindows(find_windows, tehtris_windows)
-            self.logger.info(f"Found {len(tehtris_windows)} TEHTRIS windows")
-            
-            # Search for button
-            for tehtris_hwnd in tehtris_windows:
-                try:
-                    def find_button(hwnd, button_info):
-                        try:
-                            if win32gui.IsWindowVisible(hwnd):
-                                window_text = win32gui.GetWindowText(hwnd)
-                                class_name = win32gui.GetClassName(hwnd)
-                                
-                                if window_text and class_name == 'Button':
-                                    clean_text = window_text.replace('&', '').lower()
-                                    clean_button = button_text.replace('&', '').lower()
-                                    
-                                    if clean_button in clean_text:
-                                        button_info['hwnd'] = hwnd
-                                        button_info['text'] = window_text
-                                        return False
-                        except:
-                            pass
-                        return True
-                    
-                    button_info = {}
-                    win32gui.EnumChildWindows(tehtris_hwnd, find_button, button_info)
-                    
-                    if button_info.get('hwnd'):
-                        win32gui.SendMessage(button_info['hwnd'], win32con.WM_LBUTTONDOWN, 0, 0)
-                        win32gui.SendMessage(button_info['hwnd'], win32con.WM_LBUTTONUP, 0, 0)
-                        self.logger.info(f"Clicked button: {button_info['text']}")
-                        return True
-                        
-                except Exception as e:
-                    self.logger.debug(f"Error in window {tehtris_hwnd}: {e}")
-                    continue
-            
-            self.logger.error(f"Button '{button_text}' not found")
-            return False
-            
-        except Exception as e:
-            self.logger.error(f"win32gui click failed: {e}")
-            return False
+
+            except Exception as e:
+                self.logger.error(f"win32gui click failed: {e}")
+                return False
 
     def fill_field_with_win32gui(self, field_label: str, value: str) -> bool:
         """Fill field using win32gui."""
-        try:
-            import win32gui
-            import win32con
-            
-            self.logger.info(f"Looking for field: {field_label}")
-            
-            # Find TEHTRIS windows
-            tehtris_windows = []
-            def find_windows(hwnd, windows):
-                try:
-                    if win32gui.IsWindowVisible(hwnd):
-                        window_text = win32gui.GetWindowText(hwnd)
-                        if "TEHTRIS EDR Setup" in window_text:
-                            windows.append(hwnd)
-                except:
-                    pass
+        with self.spans.attempt(field_label, 'win32') as span:
+            try:
+                self.logger.info(f"Looking for field: {field_label}")
+
+                # Field mapping
+                field_mapping = {
+                    'server': 0,
+                    'tag': 1,
+                    'license': 2
+                }
+
+                field_index = field_mapping.get(field_label.lower())
+                if field_index is None:
+                    self.logger.error(f"Unknown field: {field_label}")
+                    return False
+
+                # Edit controls in tab order
+                edit_controls = self.controls.of_class(['Edit', 'RichEdit20W'])
+                if field_index >= len(edit_controls):
+                    self.logger.error(f"Field '{field_label}' not found")
+                    return False
+
+                edit_hwnd = edit_controls[field_index].hwnd
+                # Click on field to set focus
+                rect = self.backend.control_rect(edit_hwnd)
+                center_x = (rect[0] + rect[2]) // 2
+                center_y = (rect[1] + rect[3]) // 2
+
+                if self.backend.screen_available:
+                    self.backend.click(center_x, center_y)
+                # WM_SETTEXT is synchronous, no delay needed between messages
+                self.backend.set_text(edit_hwnd, value)
+                self.wait_for(f"{field_label} value", lambda: self.backend.get_text(edit_hwnd) == value, 1)
+
+                # Send Tab to trigger validation
+                self.backend.send_tab(edit_hwnd)
+                self.controls.expire()
+
+                self.logger.info(f"Filled {field_label} with '{value}'")
+                span['outcome'] = 'hit'
                 return True
-            
-            win32gui.EnumWindows(find_windows, tehtris_windows)
-            
-            # Field mapping
-            field_mapping = {
-                'server': 0,
-                'tag': 1, 
-                'license': 2
-            }
-            
-            field_index = field_mapping.get(field_label.lower())
-            if field_index is None:
-                self.logger.error(f"Unknown field: {field_label}")
+
+            except Exception as e:
+                self.logger.error(f"Fill field failed: {e}")
                 return False
-            
-            # Find edit controls
-            for tehtris_hwnd in tehtris_windows:
-                try:
-                    edit_controls = []
-                    def find_edits(hwnd, controls):
-                        try:
-                            if win32gui.IsWindowVisible(hwnd):
-                                class_name = win32gui.GetClassName(hwnd)
-                                if class_name in ['Edit', 'RichEdit20W']:
-                                    controls.append(hwnd)
-                        except:
-                            pass
-                        return True
-                    
-                    win32gui.EnumChildWindows(tehtris_hwnd, find_edits, edit_controls)
-                    
-                    if field_index < len(edit_controls):
-                        edit_hwnd = edit_controls[field_index]
-                        # Click on field to set focus
-                        rect = win32gui.GetWindowRect(edit_hwnd)
-                        center_x = (rect[0] + rect[2]) // 2
-                        center_y = (rect[1] + rect[3]) // 2
-
-                        if PYAUTOGUI_AVAILABLE:
-                            pyautogui.click(center_x, center_y)
-                            time.sleep(0.2)
-                        win32gui.SendMessage(edit_hwnd, win32con.WM_SETTEXT, 0, "")
-                        time.sleep(0.1)
-                        win32gui.SendMessage(edit_hwnd, win32con.WM_SETTEXT, 0, value)
-                        time.sleep(0.2)
-                        
-                        # Send Tab to trigger validation
-                        win32gui.SendMessage(edit_hwnd, win32con.WM_KEYDOWN, win32con.VK_TAB, 0)
-                        win32gui.SendMessage(edit_hwnd, win32con.WM_KEYUP, win32con.VK_TAB, 0)
-                        
-                        self.logger.info(f"Filled {field_label} with '{value}'")
-                        return True
-                        
-                except Exception as e:
-                    self.logger.debug(f"Error in window {tehtris_hwnd}: {e}")
-                    continue
-            
-            self.logger.error(f"Field '{field_label}' not found")
-            return False
-            
-        except Exception as e:
-            self.logger.error(f"Fill field failed: {e}")
-            return False
 
     def launch_installer(self) -> bool:
         """Launch MSI installer."""
@@ -228,13 +208,14 @@ class TehtrisEDRInstaller:
         
         try:
             # Minimize windows
-            if PYAUTOGUI_AVAILABLE:
-                pyautogui.hotkey('win', 'd')
-                time.sleep(1.5)
+            if self.backend.screen_available:
+                self.backend.hotkey('win', 'd')
+                self.wait_for("desktop focus", lambda: desktop_has_focus(self.backend.win32), 1.5)
             
-            # Launch installer
-            subprocess.Popen(['msiexec', '/i', str(self.msi_path)], shell=True)
-            time.sleep(5)
+            # Launch installer and wait for its window
+            self.backend.launch(self.msi_path)
+            if not self.wait_for("installer window", self.controls.has_window, self.window_timeout):
+                self.logger.warning("Installer window did not appear within timeout")
             
             self.logger.info("Installer launched successfully")
             return True
@@ -243,26 +224,69 @@ class TehtrisEDRInstaller:
             self.logger.error(f"Failed to launch installer: {e}")
             return False
 
+    def _settings(self) -> dict:
+        return {'server_address': self.server_address, 'tag': self.tag, 'license_key': self.license_key}
+
+    def check_installed(self) -> bool:
+        """Check whether this package is already installed with the same settings."""
+        if self.force or not self.msi_path.exists():
+            return False
+        try:
+            installed, reason = InstallState(self.state_file, self._settings()).check(
+                self.msi_path, self.backend.installed_product_version)
+        except (OSError, MsiError) as e:
+            self.logger.warning(f"Could not fingerprint {self.msi_path}: {e}")
+            return False
+        self.logger.info(f"Install state: {reason}")
+        return installed
+
+    def record_installed(self):
+        """Record the installed package for the next run."""
+        if not self.msi_path.exists():
+            return
+        try:
+            InstallState(self.state_file, self._settings()).record(self.msi_path)
+        except (OSError, MsiError) as e:
+            self.logger.warning(f"Could not record the install state: {e}")
+
+    def silent_install(self) -> bool:
+        """Install with msiexec /qn, passing the activation values as MSI properties."""
+        self.logger.info("Installing silently with msiexec /qn...")
+        try:
+            properties = activation_property_values(self.msi_path, self._settings())
+        except MsiError as e:
+            self.logger.error(f"Silent install not possible: {e}")
+            return False
+
+        log_path = Path("tehtris_msiexec.log").resolve()
+        exit_code = self.backend.install_silently(self.msi_path, properties, log_path, timeout=self.silent_timeout)
+        if exit_code not in MSI_SUCCESS_CODES:
+            self.logger.error(f"msiexec exited with code {exit_code}, see {log_path}")
+            return False
+        self.logger.info(f"msiexec exited with code {exit_code} ({MSI_SUCCESS_CODES[exit_code]})")
+        return True
+
     def handle_welcome_screen(self) -> bool:
         """Handle welcome screen."""
         self.logger.info("Step 2: Handling welcome screen...")
-        time.sleep(0.5)
+        self.wait_for_button("Next")
         return self.click_with_win32gui("Next")
 
     def handle_license_agreement(self) -> bool:
         """Handle license agreement."""
         self.logger.info("Step 3: Handling license agreement...")
-        time.sleep(0.5)
+        self.wait_for_button("accept", enabled=False)
         
         if not self.click_with_win32gui("accept"):
             return False
-        time.sleep(0.5)
+        # Next stays disabled until the license is accepted
+        self.wait_for_button("Next")
         return self.click_with_win32gui("Next")
 
     def handle_activation_information(self) -> bool:
         """Handle activation information."""
         self.logger.info("Step 4: Handling activation information...")
-        time.sleep(0.5)
+        self.wait_for("activation fields", lambda: len(self.controls.of_class(['Edit', 'RichEdit20W'])) >= 3, self.page_timeout)
         
         # Fill fields
         if not self.fill_field_with_win32gui("server", self.server_address):
@@ -272,120 +296,129 @@ class TehtrisEDRInstaller:
         if not self.fill_field_with_win32gui("license", self.license_key):
             return False
         
-        time.sleep(1)
+        # Next is enabled once the fields pass validation
+        self.wait_for_button("Next")
         return self.click_with_win32gui("Next")
 
     def handle_installation(self) -> bool:
         """Handle installation."""
         self.logger.info("Step 5: Handling installation...")
-        time.sleep(0.3)
+        self.wait_for_button("Install")
         
-        # Try clicking Install button or use Alt+I
-        if not self.click_with_win32gui("Install"):
-            if PYAUTOGUI_AVAILABLE:
-                pyautogui.hotkey('alt', 'i')
-                time.sleep(1)
-        
-        return True
+        # Click the Install button or use Alt+I
+        strategies = ['win32', 'hotkey'] if self.backend.screen_available else ['win32']
+        if not self.static_order:
+            strategies = self.strategy_table.order(self.spans.current_step, "Install", strategies)
+        for strategy in strategies:
+            if self.click_with_win32gui("Install") if strategy == 'win32' else self.press_install_hotkey():
+                return True
+
+        self.logger.error("Could not start the installation: no strategy clicked Install")
+        return False
+
+    def press_install_hotkey(self) -> bool:
+        """Press Alt+I and wait for the Install button to go away."""
+        with self.spans.attempt("Install", 'hotkey') as span:
+            self.backend.hotkey('alt', 'i')
+            self.controls.expire()
+            if self.wait_for("Install button to go away", lambda: not self.controls.find_button("Install"), 1):
+                span['outcome'] = 'hit'
+                return True
+        return False
 
     def wait_for_completion(self) -> bool:
         """Wait for completion."""
         self.logger.info("Step 6: Waiting for installation completion...")
         
         completion_timeout = 180  # 3 minutes
+        report_interval = 15  # seconds between progress messages
         start_time = time.time()
+        next_report = report_interval
         
-        while time.time() - start_time < completion_timeout:
+        def check_completion() -> bool:
+            nonlocal next_report
             elapsed = int(time.time() - start_time)
-            self.logger.info(f"Checking for completion... ({elapsed}s elapsed)")
+            if elapsed >= next_report:
+                self.logger.info(f"Still waiting for completion... ({elapsed}s elapsed)")
+                next_report = elapsed + report_interval
             
-            if self.click_with_win32gui("Finish"):
+            # Misses are expected until the install finishes
+            if self.click_with_win32gui("Finish", missing_level=logging.DEBUG):
                 self.logger.info("Clicked Finish button")
                 return True
-            elif self.click_with_win32gui("Close"):
+            elif self.click_with_win32gui("Close", missing_level=logging.DEBUG):
                 self.logger.info("Clicked Close button")
                 return True
-            
-            time.sleep(2)
+            return False
+        
+        # Poll quickly at first, backing off to every 2 seconds
+        if wait_until(check_completion, completion_timeout, interval=0.5, max_interval=2):
+            return True
         
         # Final attempt with Alt+F
-        if PYAUTOGUI_AVAILABLE:
+        if self.backend.screen_available:
             self.logger.info("Trying Alt+F as final attempt")
-            pyautogui.hotkey('alt', 'f')
-            time.sleep(1)
+            self.backend.hotkey('alt', 'f')
+            self.controls.expire()
+            self.wait_for("installer window to close", lambda: not self.controls.has_window(), 1)
             return True
         
         self.logger.error("Installation did not complete within timeout")
         return False
 
     def verify_installation(self) -> bool:
-        """Verify installation by checking for TEHTRIS Agent processes."""
+        """Verify installation by waiting for a TEHTRIS Agent process."""
         self.logger.info("Step 7: Verifying installation...")
         
-        try:
-            import psutil
-            
-            self.logger.info("Checking for Agent processes with TEHTRIS description...")
-            tehtris_agents = []
-            
-            for proc in psutil.process_iter(['pid', 'name', 'exe']):
-                try:
-                    proc_info = proc.info
-                    proc_name = proc_info['name'].lower()
-                    
-                    if 'agent' in proc_name:
-                        exe_path = proc_info.get('exe', '')
-                        if exe_path and 'tehtris' in exe_path.lower():
-                            tehtris_agents.append({
-                                'pid': proc_info['pid'],
-                                'name': proc_info['name'],
-                                'exe': exe_path
-                            })
-                            self.logger.info(f"[FOUND] TEHTRIS Agent: PID {proc_info['pid']} - {proc_info['name']} - {exe_path}")
-                            
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    continue
-            
-            if tehtris_agents:
-                self.logger.info(f"[SUCCESS] TEHTRIS EDR verified - Found {len(tehtris_agents)} Agent process(es)")
-            else:
-                self.logger.warning("[NOT FOUND] No TEHTRIS Agent processes found")
-                self.logger.warning("Installation may have completed but processes haven't started yet")
-            
-            return True
-            
-        except Exception as e:
-            self.logger.warning(f"Verification failed: {e}")
+        self.logger.info("Waiting for Agent processes in a TEHTRIS directory...")
+        agents = self.agent_watcher.result(self.agent_timeout)
+        if self.agent_watcher.error:
+            self.logger.warning(f"Verification failed: {self.agent_watcher.error}")
             return True
+        
+        for agent in agents:
+            self.logger.info(f"[FOUND] TEHTRIS Agent: PID {agent.pid} - {agent.name} - {agent.exe}")
+        if agents:
+            self.logger.info(f"[SUCCESS] TEHTRIS EDR verified - Found {len(agents)} Agent process(es) "
+                             f"{self.agent_watcher.found_after:.2f}s after the install step started")
+        else:
+            self.logger.warning(f"[NOT FOUND] No TEHTRIS Agent process appeared within {self.agent_timeout}s")
+            self.logger.warning("Installation may have completed but processes haven't started yet")
+        
+        return True
 
     def run_installation(self) -> bool:
         """Run complete installation."""
         self.logger.info("Starting TEHTRIS EDR installation automation")
         
         try:
+            with self.timer.step("check_installed"):
+                self.already_installed = self.check_installed()
+            if self.already_installed:
+                self.logger.info("TEHTRIS EDR is already installed from this package, nothing to do")
+                return True
+
             if not self.validate_prerequisites():
                 return False
             
-            if not self.launch_installer():
-                return False
-            
-            if not self.handle_welcome_screen():
-                return False
-            
-            if not self.handle_license_agreement():
-                return False
-            
-            if not self.handle_activation_information():
-                return False
-            
-            if not self.handle_installation():
-                return False
-            
-            if not self.wait_for_completion():
-                return False
-            
-            if not self.verify_installation():
-                return False
+            steps = [
+                ("launch_installer", self.launch_installer),
+                ("handle_welcome_screen", self.handle_welcome_screen),
+                ("handle_license_agreement", self.handle_license_agreement),
+                ("handle_activation_information", self.handle_activation_information),
+                ("handle_installation", self.handle_installation),
+                ("wait_for_completion", self.wait_for_completion),
+                ("verify_installation", self.verify_installation),
+            ]
+            if self.silent:
+                steps = [("silent_install", self.silent_install), ("verify_installation", self.verify_installation)]
+            for name, step in steps:
+                if name in ("wait_for_completion", "silent_install"):
+                    self.agent_watcher.start()
+                if not self.timer.run(name, step):
+                    return False
+                if name in ("wait_for_completion", "silent_install"):
+                    self.record_installed()
             
             self.logger.info("TEHTRIS EDR installation completed successfully!")
             return True
@@ -393,17 +426,40 @@ class TehtrisEDRInstaller:
         except Exception as e:
             self.logger.error(f"Installation failed: {e}")
             return False
+        finally:
+            self.agent_watcher.stop()
+            self.spans.close()
+            if any(span['element'] for span in self.spans.spans):
+                self.strategy_table.observe(self.spans.spans)
+                try:
+                    self.strategy_table.save()
+                except OSError as e:
+                    self.logger.warning(f"Could not save the strategy table: {e}")
+            if self.timer.steps:
+                self.logger.info("Step timings:")
+                for line in self.timer.report():
+                    self.logger.info(f"  {line}")
 
 def main():
     """Main entry point."""
-    if len(sys.argv) != 2:
-        print("Usage: python tehtris_edr_installer_minimal.py <path_to_msi>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Automate TEHTRIS EDR MSI installation (minimal version)")
+    parser.add_argument('msi_path', help='Path to the TEHTRIS EDR MSI file')
+    parser.add_argument('--backend', choices=['win32', 'sim'], default='win32',
+                        help='UI backend: the Windows desktop or the simulated wizard (default: win32)')
+    parser.add_argument('--silent', action='store_true',
+                        help='Install with msiexec /qn, setting the activation fields through MSI properties')
+    parser.add_argument('--force', action='store_true',
+                        help='Install even when this package is already installed (exit status 3 otherwise)')
+    parser.add_argument('--static-order', action='store_true',
+                        help='Try the Install button strategies in the built-in order')
+    args = parser.parse_args()
     
-    msi_path = sys.argv[1]
-    installer = TehtrisEDRInstaller(msi_path)
+    installer = TehtrisEDRInstaller(args.msi_path, create_backend(args.backend), args.silent, args.force,
+                                    args.static_order)
     
     success = installer.run_installation()
+    if installer.already_installed:
+        sys.exit(EXIT_ALREADY_INSTALLED)
     sys.exit(0 if success else 1)
 
 if __name__ == "__main__":
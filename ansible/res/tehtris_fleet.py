@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Fleet driver for the TEHTRIS EDR installer automation.
+
+Runs tehtris_edr_installer_minimal.py on every host of an inventory group
+(by default [windows_client] of the inventory generated by terraform,
+ansible/inventory/hosts), at most --concurrency hosts at a time. Each
+host's output is streamed as it arrives, prefixed with the host name, and
+saved to <log-dir>/<host>.log; a host still running after --deadline
+seconds is stopped and reported as timed out. The span file of each host
+is collected to <log-dir>/<host>.jsonl, so that
+
+    python tehtris_ui.py report fleet-logs/
+
+aggregates the step timings and strategy wins of the whole fleet.
+
+Transports:
+- ansible: runs the script through `ansible <host> -m win_command` with the
+  inventory's WinRM settings. WinRM sessions have no desktop, so, as in
+  tasks/util/exec-interactive.yml, the script is started as a scheduled
+  task in the interactive session of the connecting user and polled until
+  it exits. install-tehtris.yml must have staged C:\\Temp first. The
+  output of a host arrives when its run ends.
+- local: runs the script against the simulated wizard (--backend sim) in a
+  subprocess per host, each in its own directory under --log-dir. With
+  --hosts N it needs no inventory, which makes it a load test of the
+  driver on a single machine:
+
+    python tehtris_fleet.py --transport local --hosts 50 --concurrency 10
+
+Exit status is 0 when every host installed the EDR or already had it
+(installer exit status 3), 1 otherwise.
+
+Requirements:
+- ansible (ansible.windows collection) for the ansible transport
+"""
+
+import argparse
+import base64
+import json
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+RES_DIR = Path(__file__).resolve().parent
+DEFAULT_INVENTORY = RES_DIR.parent / 'inventory' / 'hosts'
+INSTALLER_SCRIPT = 'tehtris_edr_installer_minimal.py'
+REMOTE_DIR = 'C:\\Temp'
+DEFAULT_MSI = REMOTE_DIR + '\\TEHTRIS_EDR_2.0.0_Windows_x86_64_MS-28.msi'
+SPANS_FILE = 'tehtris_installation_spans.jsonl'
+
+# Installer exit statuses (see tehtris_edr_installer_minimal.main)
+EXIT_SUCCESS = 0
+EXIT_ALREADY_INSTALLED = 3
+# Exit status of the remote script when it stopped the installer at the deadline
+EXIT_DEADLINE = 124
+
+# Lines of output kept per host for the summary
+LOG_TAIL_LINES = 20
+
+
+class Host(NamedTuple):
+    name: str
+    vars: Dict[str, str]
+
+
+def read_inventory(path: Path, group: str = 'windows_client') -> List[Host]:
+    """Return the hosts of `group` in an INI inventory, with their variables.
+
+    The group's [<group>:vars] apply to every host and host variables
+    override them. Hosts terraform has no address for yet (ansible_host=
+    pending) are left out.
+    """
+    hosts: List[Host] = []
+    group_vars: Dict[str, str] = {}
+    section = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(('#', ';')):
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                section = line[1:-1]
+                continue
+            if section == f'{group}:vars':
+                key, _, value = line.partition('=')
+                group_vars[key.strip()] = shlex.split(value)[0] if value.strip() else ''
+            elif section == group:
+                name, *assignments = shlex.split(line)
+                host_vars = dict(assignment.partition('=')[::2] for assignment in assignments)
+                hosts.append(Host(name, host_vars))
+    hosts = [Host(host.name, {**group_vars, **host.vars}) for host in hosts]
+    return [host for host in hosts if host.vars.get('ansible_host') != 'pending']
+
+
+# -- Transports -------------------------------------------------------------------
+
+class Transport:
+    """Runs the installer on one host as a local process.
+
+    `command` returns the process to start; its output becomes the host's
+    log. `exit_code` maps the process's exit status and first lines of
+    output to the installer's exit status, and `collect` copies the host's
+    span file to `dest`.
+    """
+
+    name = ''
+    # Seconds the controller waits past the deadline before killing the
+    # process, for transports that enforce the deadline on the host
+    grace = 0.0
+
+    def command(self, host: Host, workdir: Path, deadline: float) -> List[str]:
+        raise NotImplementedError
+
+    def exit_code(self, returncode: int, head: List[str]) -> int:
+        return returncode
+
+    def collect(self, host: Host, workdir: Path, dest: Path):
+        pass
+
+
+class LocalTransport(Transport):
+    """Runs the installer against the simulated wizard in a local subprocess."""
+
+    name = 'local'
+
+    def __init__(self, msi_path: str, options: List[str]):
+        self.msi_path = msi_path
+        self.options = options
+
+    def command(self, host: Host, workdir: Path, deadline: float) -> List[str]:
+        return [sys.executable, '-u', str(RES_DIR / INSTALLER_SCRIPT), self.msi_path, '--backend', 'sim',
+                *self.options]
+
+    def collect(self, host: Host, workdir: Path, dest: Path):
+        if (workdir / SPANS_FILE).exists():
+            shutil.copyfile(workdir / SPANS_FILE, dest)
+
+
+# Starts the installer as a scheduled task in the user's interactive session,
+# waits for it (stopping it at the deadline), prints the lines it added to
+# the log and exits with its exit status
+REMOTE_SCRIPT = r"""
+$ErrorActionPreference = 'Stop'
+$name = 'tehtris-edr-install'
+$log = Join-Path '{dir}' 'tehtris_installation.log'
+$before = 0
+if (Test-Path $log) {{ $before = @(Get-Content $log).Count }}
+$action = New-ScheduledTaskAction -Execute 'python.exe' -Argument '{arguments}' -WorkingDirectory '{dir}'
+$principal = New-ScheduledTaskPrincipal -UserId $env:USERNAME -LogonType Interactive -RunLevel Highest
+Register-ScheduledTask -TaskName $name -Action $action -Principal $principal -Force | Out-Null
+Start-ScheduledTask -TaskName $name
+$deadline = (Get-Date).AddSeconds({deadline})
+do {{ Start-Sleep -Seconds 5 }} while ((Get-ScheduledTask -TaskName $name).State -eq 'Running' -and (Get-Date) -lt $deadline)
+$timedOut = (Get-ScheduledTask -TaskName $name).State -eq 'Running'
+if ($timedOut) {{ Stop-ScheduledTask -TaskName $name }}
+$result = (Get-ScheduledTaskInfo -TaskName $name).LastTaskResult
+Unregister-ScheduledTask -TaskName $name -Confirm:$false
+if (Test-Path $log) {{ Get-Content $log | Select-Object -Skip $before }}
+if ($timedOut) {{ Write-Output 'Deadline reached, installer stopped'; exit {exit_deadline} }}
+exit $result
+"""
+
+# First line of `ansible` ad hoc output for a command that ran
+ANSIBLE_RC_LINE = re.compile(r'^\S+ \| [A-Z]+!? \| rc=(-?\d+) >>')
+
+
+class AnsibleTransport(Transport):
+    """Runs the installer on a Windows host through `ansible` and WinRM."""
+
+    name = 'ansible'
+    grace = 120.0
+
+    def __init__(self, inventory: Path, msi_path: str, options: List[str], ansible: str = 'ansible'):
+        self.inventory = inventory
+        self.msi_path = msi_path
+        self.options = options
+        self.ansible = ansible
+
+    def _ad_hoc(self, host: Host, module: str, args: str) -> List[str]:
+        return [self.ansible, host.name, '-i', str(self.inventory), '-m', module, '-a', args]
+
+    def command(self, host: Host, workdir: Path, deadline: float) -> List[str]:
+        arguments = subprocess.list2cmdline([f'{REMOTE_DIR}\\{INSTALLER_SCRIPT}', self.msi_path, *self.options])
+        script = REMOTE_SCRIPT.format(dir=REMOTE_DIR, arguments=arguments.replace("'", "''"), deadline=int(deadline),
+                                      exit_deadline=EXIT_DEADLINE)
+        # -EncodedCommand keeps the script clear of ansible's and cmd's quoting
+        encoded = base64.b64encode(script.encode('utf-16-le')).decode('ascii')
+        return self._ad_hoc(host, 'ansible.windows.win_command',
+                            f'powershell.exe -NoProfile -NonInteractive -EncodedCommand {encoded}')
+
+    def exit_code(self, returncode: int, head: List[str]) -> int:
+        # ansible exits with 2 for any failed command; the installer's own
+        # status is on the first line. Without one the host was unreachable
+        # and ansible's status is kept.
+        for line in head[:1]:
+            match = ANSIBLE_RC_LINE.match(line)
+            if match:
+                return int(match.group(1))
+        return returncode
+
+    def collect(self, host: Host, workdir: Path, dest: Path):
+        subprocess.run(self._ad_hoc(host, 'fetch', f'src={REMOTE_DIR}\\{SPANS_FILE} dest={dest} '
+                                                   'flat=yes fail_on_missing=no'),
+                       capture_output=True, timeout=120)
+
+
+# -- Fleet runs ---------------------------------------------------------------------
+
+def host_status(exit_code: Optional[int], timed_out: bool) -> str:
+    if timed_out:
+        return 'timeout'
+    if exit_code == EXIT_SUCCESS:
+        return 'ok'
+    if exit_code == EXIT_ALREADY_INSTALLED:
+        return 'installed'
+    return 'failed'
+
+
+class FleetRun:
+    """Runs a transport over hosts with a concurrency cap and a per-host deadline.
+
+    `progress(host, line)` is called from the worker threads for every line
+    of output and for the start and end of each host.
+    """
+
+    def __init__(self, transport: Transport, log_dir: Path, concurrency: int = 10, deadline: float = 1800.0,
+                 progress: Optional[Callable[[str, str], None]] = None):
+        self.transport = transport
+        self.log_dir = log_dir
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.progress = progress or (lambda host, line: None)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.peak_running = 0
+
+    def run(self, hosts: List[Host]) -> dict:
+        """Run every host and return the fleet summary."""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(self.run_host, hosts))
+        statuses: Dict[str, int] = {}
+        for result in results:
+            statuses[result['status']] = statuses.get(result['status'], 0) + 1
+        return {
+            'transport': self.transport.name,
+            'hosts': len(results),
+            'concurrency': self.concurrency,
+            'peak_running': self.peak_running,
+            'deadline_s': self.deadline,
+            'wall_s': round(time.monotonic() - start, 2),
+            'statuses': statuses,
+            'results': results,
+        }
+
+    def run_host(self, host: Host) -> dict:
+        workdir = self.log_dir / host.name
+        workdir.mkdir(parents=True, exist_ok=True)
+        log_path = self.log_dir / f'{host.name}.log'
+        head: List[str] = []
+        tail: deque = deque(maxlen=LOG_TAIL_LINES)
+        with self._lock:
+            self.running += 1
+            self.peak_running = max(self.peak_running, self.running)
+        self.progress(host.name, 'started')
+        start = time.monotonic()
+        timed_out = threading.Event()
+        exit_code: Optional[int] = None
+        try:
+            with open(log_path, 'w', encoding='utf-8') as log:
+                process = subprocess.Popen(self.transport.command(host, workdir, self.deadline), cwd=workdir,
+                                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                           text=True, errors='replace')
+
+                def expire():
+                    timed_out.set()
+                    process.kill()
+
+                timer = threading.Timer(self.deadline + self.transport.grace, expire)
+                timer.start()
+                try:
+                    for line in process.stdout:
+                        line = line.rstrip('\n')
+                        log.write(line + '\n')
+                        log.flush()
+                        if len(head) < LOG_TAIL_LINES:
+                            head.append(line)
+                        tail.append(line)
+                        self.progress(host.name, line)
+                    returncode = process.wait()
+                finally:
+                    timer.cancel()
+            if not timed_out.is_set():
+                exit_code = self.transport.exit_code(returncode, head)
+                if exit_code == EXIT_DEADLINE:
+                    # Stopped on the host at the deadline
+                    timed_out.set()
+            try:
+                self.transport.collect(host, workdir, self.log_dir / f'{host.name}.jsonl')
+            except (OSError, subprocess.SubprocessError) as e:
+                tail.append(f"Could not collect spans: {e}")
+        except OSError as e:
+            tail.append(f"Could not start: {e}")
+        duration = time.monotonic() - start
+        with self._lock:
+            self.running -= 1
+        status = host_status(exit_code, timed_out.is_set())
+        self.progress(host.name, f"finished: {status}"
+                                 + (f" (exit {exit_code})" if exit_code is not None else "")
+                                 + f" in {duration:.1f}s")
+        return {
+            'host': host.name,
+            'address': host.vars.get('ansible_host', host.name),
+            'status': status,
+            'exit_code': exit_code,
+            'duration_s': round(duration, 2),
+            'log': str(log_path),
+            'log_tail': list(tail),
+        }
+
+
+def print_summary(summary: dict):
+    results = summary['results']
+    width = max([len(result['host']) for result in results] + [len('host')])
+    print(f"\n  {'host':<{width}}  {'status':<9}  {'exit':>4}  {'seconds':>8}")
+    for result in results:
+        exit_code = '' if result['exit_code'] is None else result['exit_code']
+        print(f"  {result['host']:<{width}}  {result['status']:<9}  {exit_code:>4}  {result['duration_s']:8.1f}")
+    counts = ', '.join(f"{count} {status}" for status, count in sorted(summary['statuses'].items()))
+    print(f"\n{summary['hosts']} hosts in {summary['wall_s']:.1f}s ({counts}); "
+          f"at most {summary['peak_running']} of {summary['concurrency']} running at once")
+    for result in results:
+        if result['status'] in ('failed', 'timeout'):
+            print(f"\n{result['host']} ({result['status']}), last lines of {result['log']}:")
+            for line in result['log_tail'][-5:]:
+                print(f"  {line}")
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Run the TEHTRIS EDR installer across a fleet")
+    parser.add_argument('--inventory', type=Path, default=DEFAULT_INVENTORY,
+                        help=f'Ansible INI inventory (default: {DEFAULT_INVENTORY})')
+    parser.add_argument('--group', default='windows_client', help='Inventory group (default: windows_client)')
+    parser.add_argument('--limit', help='Comma-separated host names to run, out of the group')
+    parser.add_argument('--transport', choices=('ansible', 'local'), default='ansible',
+                        help='How to reach the hosts (default: ansible)')
+    parser.add_argument('--hosts', type=int,
+                        help='Local transport only: run this many simulated hosts instead of the inventory')
+    parser.add_argument('--concurrency', type=int, default=10, help='Hosts running at once (default: 10)')
+    parser.add_argument('--deadline', type=float, default=1800.0,
+                        help='Seconds after which a host is stopped and reported as timed out (default: 1800)')
+    parser.add_argument('--msi', default=DEFAULT_MSI, help=f'MSI path on the hosts (default: {DEFAULT_MSI})')
+    parser.add_argument('--silent', action='store_true', help='Install with msiexec /qn')
+    parser.add_argument('--force', action='store_true', help='Reinstall hosts that already have the package')
+    parser.add_argument('--log-dir', type=Path, default=Path('fleet-logs'),
+                        help='Where host logs and span files are written (default: fleet-logs)')
+    parser.add_argument('--output', type=Path, help='Also write the summary as JSON to this file')
+    parser.add_argument('--quiet', action='store_true', help='Only print when hosts start and finish')
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    if args.hosts is not None:
+        if args.transport != 'local':
+            parser.error('--hosts needs --transport local')
+        hosts = [Host(f'sim-{index:03d}', {}) for index in range(1, args.hosts + 1)]
+    else:
+        try:
+            hosts = read_inventory(args.inventory, args.group)
+        except OSError as e:
+            parser.error(f'cannot read the inventory: {e}')
+    if args.limit:
+        names = set(args.limit.split(','))
+        hosts = [host for host in hosts if host.name in names]
+    if not hosts:
+        parser.error(f'no hosts to run in [{args.group}]')
+
+    options = [flag for flag, enabled in (('--silent', args.silent), ('--force', args.force)) if enabled]
+    if args.transport == 'local':
+        transport: Transport = LocalTransport(args.msi, options)
+    else:
+        transport = AnsibleTransport(args.inventory.resolve(), args.msi, options)
+
+    width = max(len(host.name) for host in hosts)
+    print_lock = threading.Lock()
+
+    def progress(host: str, line: str):
+        if args.quiet and not line.startswith(('started', 'finished: ')):
+            return
+        with print_lock:
+            print(f"[{host:<{width}}] {line}", flush=True)
+
+    print(f"Running {INSTALLER_SCRIPT} on {len(hosts)} hosts over {transport.name}, "
+          f"{args.concurrency} at a time")
+    summary = FleetRun(transport, args.log_dir, args.concurrency, args.deadline, progress).run(hosts)
+    print_summary(summary)
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2), encoding='utf-8')
+    sys.exit(0 if all(result['status'] in ('ok', 'installed') for result in summary['results']) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,864 @@
+#!/usr/bin/env python3
+"""
+Pure-Python reader for Windows Installer (.msi) packages.
+
+An MSI database is an OLE compound file. Every table is a stream whose name
+is compressed with the MSI stream-name encoding; table layouts come from the
+_Columns table, and all strings live in a shared pool (_StringPool holds
+lengths, _StringData the bytes). This module reads those structures
+directly -- no msi.dll, no Windows APIs -- so a package can be inspected on
+any OS:
+
+    python tehtris_msi.py properties TEHTRIS_EDR.msi
+    python tehtris_msi.py dialogs TEHTRIS_EDR.msi --dialog ActivationDlg
+    python tehtris_msi.py activation TEHTRIS_EDR.msi
+    python tehtris_msi.py fingerprint TEHTRIS_EDR.msi
+
+find_activation_properties() maps the wizard's Activation Information fields
+(server address, tag, license key) to the public properties bound to their
+Edit controls. Those properties are what a silent install passes on the
+command line instead of typing into the wizard:
+
+    msiexec /i TEHTRIS_EDR.msi /qn PROPERTY="value" ...
+
+InstallState remembers the fingerprint (ProductCode, ProductVersion, content
+hash) of the package last installed, so that an installer run for the same
+build can stop early when that product is still installed.
+
+write_msi() builds a small MSI from table definitions, for crafting fixtures
+(see tehtris_sim.write_fixture_msi).
+"""
+
+import argparse
+import codecs
+import hashlib
+import json
+import re
+import struct
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class MsiError(Exception):
+    """The file is not a readable MSI database."""
+
+
+# msiexec exit codes that mean the product was installed
+MSI_SUCCESS_CODES = {
+    0: "success",
+    1641: "success, reboot initiated",
+    3010: "success, reboot required",
+}
+
+
+# --- OLE compound file ---------------------------------------------------
+
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+MAXREGSECT = 0xFFFFFFFA
+FATSECT = 0xFFFFFFFD
+ENDOFCHAIN = 0xFFFFFFFE
+FREESECT = 0xFFFFFFFF
+NOSTREAM = 0xFFFFFFFF
+
+# Directory entry types
+STORAGE = 1
+STREAM = 2
+ROOT = 5
+
+
+class DirectoryEntry(NamedTuple):
+    name: str
+    kind: int
+    left: int
+    right: int
+    child: int
+    start: int
+    size: int
+
+
+class CompoundFile:
+    """Read-only view of the streams of an OLE compound file (version 3 or 4)."""
+
+    def __init__(self, data: bytes):
+        if len(data) < 512 or data[:8] != CFB_SIGNATURE:
+            raise MsiError("Not an OLE compound file")
+        self.data = data
+
+        sector_shift, mini_sector_shift = struct.unpack_from('<HH', data, 0x1E)
+        (num_fat, first_dir, _, self.mini_cutoff, first_minifat, num_minifat,
+         first_difat, num_difat) = struct.unpack_from('<8I', data, 0x2C)
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+
+        # The FAT sectors are listed in the header, then in a chain of DIFAT sectors
+        difat = list(struct.unpack_from('<109I', data, 0x4C))
+        per_sector = self.sector_size // 4 - 1
+        sector = first_difat
+        for _ in range(num_difat):
+            entries = self._unpack_sector(sector)
+            difat.extend(entries[:per_sector])
+            sector = entries[per_sector]
+        fat_sectors = [s for s in difat if s < MAXREGSECT][:num_fat]
+        self.fat = [entry for s in fat_sectors for entry in self._unpack_sector(s)]
+
+        self.entries = self._read_directory(first_dir)
+        root = self.entries[0]
+        self.mini_stream = self._read_chain(root.start, root.size)
+        minifat = self._read_chain(first_minifat, num_minifat * self.sector_size) if num_minifat else b''
+        self.minifat = list(struct.unpack(f'<{len(minifat) // 4}I', minifat))
+
+        self.streams = {entry.name: entry for entry in self._children(root) if entry.kind == STREAM}
+
+    def _sector(self, sector: int) -> bytes:
+        offset = (sector + 1) * self.sector_size
+        if offset + self.sector_size > len(self.data):
+            raise MsiError(f"Sector {sector} is past the end of the file")
+        return self.data[offset:offset + self.sector_size]
+
+    def _unpack_sector(self, sector: int) -> Tuple[int, ...]:
+        return struct.unpack(f'<{self.sector_size // 4}I', self._sector(sector))
+
+    @staticmethod
+    def _chain(start: int, table: List[int]) -> Iterator[int]:
+        seen = set()
+        sector = start
+        while sector < MAXREGSECT:
+            if sector in seen or sector >= len(table):
+                raise MsiError("Corrupt sector chain")
+            seen.add(sector)
+            yield sector
+            sector = table[sector]
+
+    def _read_chain(self, start: int, size: int) -> bytes:
+        return b''.join(self._sector(s) for s in self._chain(start, self.fat))[:size]
+
+    def _read_directory(self, first_dir: int) -> List[DirectoryEntry]:
+        data = b''.join(self._sector(s) for s in self._chain(first_dir, self.fat))
+        entries = []
+        for offset in range(0, len(data) - 127, 128):
+            raw = data[offset:offset + 128]
+            name_length = struct.unpack_from('<H', raw, 64)[0]
+            name = raw[:max(0, name_length - 2)].decode('utf-16-le', errors='replace')
+            left, right, child = struct.unpack_from('<3I', raw, 68)
+            start, size = struct.unpack_from('<IQ', raw, 116)
+            if self.sector_size == 512:
+                size &= 0xFFFFFFFF  # version 3 files may leave garbage in the high half
+            entries.append(DirectoryEntry(name, raw[66], left, right, child, start, size))
+        if not entries or entries[0].kind != ROOT:
+            raise MsiError("Compound file has no root entry")
+        return entries
+
+    def _children(self, storage: DirectoryEntry) -> Iterator[DirectoryEntry]:
+        """Entries directly inside `storage` (its child's binary tree of siblings)."""
+        stack = [storage.child]
+        seen = set()
+        while stack:
+            index = stack.pop()
+            if index == NOSTREAM or index in seen or index >= len(self.entries):
+                continue
+            seen.add(index)
+            entry = self.entries[index]
+            stack.extend((entry.left, entry.right))
+            yield entry
+
+    def read_stream(self, name: str) -> bytes:
+        """Return the content of the stream called `name` in the root storage."""
+        entry = self.streams[name]
+        if entry.size < self.mini_cutoff:
+            size = self.mini_sector_size
+            return b''.join(self.mini_stream[s * size:(s + 1) * size]
+                            for s in self._chain(entry.start, self.minifat))[:entry.size]
+        return self._read_chain(entry.start, entry.size)
+
+
+# --- MSI stream names ----------------------------------------------------
+
+# Alphabet of the MSI stream-name encoding: two of these characters are
+# packed into one UTF-16 code unit in 0x3800-0x47FF, one into 0x4800-0x483F
+STREAM_NAME_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz._'
+TABLE_PREFIX = '䡀'
+
+
+def decode_stream_name(name: str) -> str:
+    """Decode an MSI stream name; table streams keep their leading TABLE_PREFIX."""
+    out = []
+    for ch in name:
+        code = ord(ch)
+        if 0x3800 <= code < 0x4800:
+            code -= 0x3800
+            out.append(STREAM_NAME_CHARS[code & 0x3F])
+            out.append(STREAM_NAME_CHARS[(code >> 6) & 0x3F])
+        elif 0x4800 <= code < 0x4840:
+            out.append(STREAM_NAME_CHARS[code - 0x4800])
+        else:
+            out.append(ch)
+    return ''.join(out)
+
+
+def encode_stream_name(name: str, table: bool = False) -> str:
+    """Encode `name` as an MSI stream name (the inverse of decode_stream_name)."""
+    out = [TABLE_PREFIX] if table else []
+    i = 0
+    while i < len(name):
+        first = STREAM_NAME_CHARS.find(name[i])
+        if first < 0:
+            out.append(name[i])
+            i += 1
+            continue
+        second = STREAM_NAME_CHARS.find(name[i + 1]) if i + 1 < len(name) else -1
+        if second < 0:
+            out.append(chr(0x4800 + first))
+            i += 1
+        else:
+            out.append(chr(0x3800 + first + (second << 6)))
+            i += 2
+    return ''.join(out)
+
+
+# --- MSI database --------------------------------------------------------
+
+# Column type bits (the Type column of _Columns)
+MSITYPE_VALID = 0x0100
+MSITYPE_LOCALIZABLE = 0x0200
+MSITYPE_CHAR = 0x0400  # set with MSITYPE_STRING on character columns, not on binary ones
+MSITYPE_STRING = 0x0800
+MSITYPE_NULLABLE = 0x1000
+MSITYPE_KEY = 0x2000
+
+# Common column types, as real packages declare them: s72 (string key,
+# 0x0D48), L0 (localizable text, 0x1F00), i2, i4
+COLUMN_STRING = MSITYPE_VALID | MSITYPE_CHAR | MSITYPE_STRING | 72
+COLUMN_TEXT = MSITYPE_VALID | MSITYPE_CHAR | MSITYPE_STRING | MSITYPE_LOCALIZABLE | MSITYPE_NULLABLE
+COLUMN_I2 = MSITYPE_VALID | 2
+COLUMN_I4 = MSITYPE_VALID | 4
+
+# Layout of the _Columns table itself: Table, Number, Name, Type
+COLUMNS_SCHEMA = [('Table', COLUMN_STRING | MSITYPE_KEY), ('Number', COLUMN_I2 | MSITYPE_KEY),
+                  ('Name', COLUMN_STRING), ('Type', COLUMN_I2)]
+
+
+class Column(NamedTuple):
+    name: str
+    type: int
+
+    @property
+    def is_string(self) -> bool:
+        return bool(self.type & MSITYPE_STRING)
+
+    @property
+    def is_binary(self) -> bool:
+        """Binary (stream) columns only store a placeholder in the table."""
+        return self.type & ~MSITYPE_NULLABLE & 0xFFFF == MSITYPE_VALID | MSITYPE_STRING
+
+
+def _codec(codepage: int) -> str:
+    if codepage == 65001:
+        return 'utf-8'
+    try:
+        return codecs.lookup(f'cp{codepage}').name if codepage else 'latin-1'
+    except LookupError:
+        return 'latin-1'
+
+
+class MsiDatabase:
+    """Tables of an MSI package, read with CompoundFile."""
+
+    def __init__(self, path, data: Optional[bytes] = None):
+        self.path = Path(path)
+        self.cfb = CompoundFile(data if data is not None else self.path.read_bytes())
+        self._streams = {decode_stream_name(name): name for name in self.cfb.streams}
+        if TABLE_PREFIX + '_StringPool' not in self._streams:
+            raise MsiError(f"{self.path} is a compound file but not an MSI database (no string pool)")
+        self.strings, self.codepage, self.string_ref_size = self._read_string_pool()
+        self.columns = self._read_columns()
+        self._tables: Dict[str, List[dict]] = {}
+
+    def _stream(self, name: str) -> bytes:
+        encoded = self._streams.get(name)
+        return self.cfb.read_stream(encoded) if encoded is not None else b''
+
+    def _read_string_pool(self) -> Tuple[List[Optional[str]], int, int]:
+        pool = self._stream(TABLE_PREFIX + '_StringPool')
+        data = self._stream(TABLE_PREFIX + '_StringData')
+        if len(pool) < 4:
+            return [None], 0, 2
+
+        words = struct.unpack(f'<{len(pool) // 2}H', pool[:len(pool) // 2 * 2])
+        codepage = words[0] | ((words[1] & 0x7FFF) << 16)
+        ref_size = 3 if words[1] & 0x8000 else 2
+        encoding = _codec(codepage)
+
+        # String ids start at 1; each entry is (length, reference count). A
+        # string of 64 KiB or more has a zero length and its real length in
+        # the following entry.
+        strings: List[Optional[str]] = [None]
+        offset = 0
+        i = 1
+        count = len(words) // 2
+        while i < count:
+            length, refs = words[2 * i], words[2 * i + 1]
+            if length == 0 and refs == 0:
+                strings.append(None)
+                i += 1
+                continue
+            if length == 0 and i + 1 < count:
+                length = (words[2 * i + 3] << 16) | words[2 * i + 2]
+                i += 2
+            else:
+                i += 1
+            strings.append(data[offset:offset + length].decode(encoding, errors='replace'))
+            offset += length
+        return strings, codepage, ref_size
+
+    def _column_size(self, column: Column) -> int:
+        if column.is_binary:
+            return 2
+        if column.is_string:
+            return self.string_ref_size
+        return 2 if column.type & 0xFF <= 2 else 4
+
+    def _read_rows(self, stream: str, columns: Sequence[Column]) -> List[tuple]:
+        """Decode a table stream; values are stored column by column."""
+        data = self._stream(stream)
+        sizes = [self._column_size(column) for column in columns]
+        row_size = sum(sizes)
+        rows = len(data) // row_size if row_size else 0
+
+        values = []
+        offset = 0
+        for column, size in zip(columns, sizes):
+            decoded = []
+            for row in range(rows):
+                raw = int.from_bytes(data[offset + row * size:offset + (row + 1) * size], 'little')
+                decoded.append(self._decode(column, size, raw))
+            values.append(decoded)
+            offset += rows * size
+        return list(zip(*values))
+
+    def _decode(self, column: Column, size: int, raw: int):
+        if column.is_binary:
+            return None
+        if column.is_string:
+            return self.strings[raw] if 0 < raw < len(self.strings) else None
+        if raw == 0:
+            return None  # NULL
+        # Integers are stored with the sign bit flipped
+        return raw - (0x8000 if size == 2 else 0x80000000)
+
+    def _read_columns(self) -> Dict[str, List[Column]]:
+        schema = [Column(name, type_) for name, type_ in COLUMNS_SCHEMA]
+        numbered: Dict[str, List[Tuple[int, Column]]] = {}
+        for table, number, name, type_ in self._read_rows(TABLE_PREFIX + '_Columns', schema):
+            if table and name and type_ is not None:
+                numbered.setdefault(table, []).append((number or 0, Column(name, type_)))
+        return {table: [column for _, column in sorted(columns)] for table, columns in numbered.items()}
+
+    def table_names(self) -> List[str]:
+        return sorted(self.columns)
+
+    def table(self, name: str) -> List[dict]:
+        """Return the rows of table `name` as dictionaries keyed by column name."""
+        if name not in self._tables:
+            columns = self.columns.get(name, [])
+            names = [column.name for column in columns]
+            self._tables[name] = [dict(zip(names, row)) for row in self._read_rows(TABLE_PREFIX + name, columns)]
+        return self._tables[name]
+
+    def properties(self) -> Dict[str, str]:
+        """The Property table: default values of the package's properties."""
+        return {row['Property']: row['Value'] for row in self.table('Property') if row.get('Property')}
+
+    def public_properties(self) -> Dict[str, Optional[str]]:
+        """Public properties (settable from the msiexec command line) and their defaults.
+
+        Includes properties that only appear as control bindings and have no
+        default in the Property table.
+        """
+        names = dict(self.properties())
+        for control in self.table('Control'):
+            if control.get('Property'):
+                names.setdefault(control['Property'], None)
+        return {name: value for name, value in sorted(names.items()) if is_public_property(name)}
+
+    def dialogs(self) -> Dict[str, List[dict]]:
+        """Controls of each dialog, in Control table order."""
+        dialogs: Dict[str, List[dict]] = {row['Dialog']: [] for row in self.table('Dialog') if row.get('Dialog')}
+        for control in self.table('Control'):
+            dialogs.setdefault(control.get('Dialog_'), []).append(control)
+        return dialogs
+
+
+def is_public_property(name: str) -> bool:
+    """Public property names have no lowercase letters."""
+    return bool(name) and name == name.upper()
+
+
+# --- Activation field discovery ------------------------------------------
+
+# Words that identify each activation field in a label or property name
+ACTIVATION_FIELDS = {
+    'server_address': ('server', 'address', 'host', 'hostname', 'url', 'manager'),
+    'tag': ('tag', 'tags'),
+    'license_key': ('license', 'licence', 'key', 'serial', 'activation'),
+}
+
+EDIT_CONTROL_TYPES = ('Edit', 'MaskedEdit')
+
+
+class FieldBinding(NamedTuple):
+    """An activation field and the MSI property behind its Edit control."""
+    field: str
+    property: str
+    dialog: str
+    control: str
+    label: str
+
+    @property
+    def public(self) -> bool:
+        return is_public_property(self.property)
+
+
+def clean_label(text: Optional[str]) -> str:
+    """Strip text styles ({\\Font}), accelerators (&) and trailing colons from a control caption."""
+    text = re.sub(r'\{[^}]*\}', '', text or '')
+    return text.replace('&', '').strip().rstrip(':').strip()
+
+
+def _label_for(edit: dict, texts: List[dict]) -> Optional[dict]:
+    """Return the Text control labelling `edit`: closest above it or to its left."""
+    def box(control):
+        return (control.get('X') or 0, control.get('Y') or 0, control.get('Width') or 0, control.get('Height') or 0)
+
+    ex, ey, ew, eh = box(edit)
+    best, best_distance = None, None
+    for text in texts:
+        tx, ty, tw, th = box(text)
+        if tx < ex + ew and ex < tx + tw and ty + th <= ey + 2:
+            distance = ey - (ty + th)  # above, overlapping horizontally
+        elif ty < ey + eh and ey < ty + th and tx + tw <= ex + 2:
+            distance = ex - (tx + tw)  # on the same row, to the left
+        else:
+            continue
+        if best_distance is None or distance < best_distance:
+            best, best_distance = text, distance
+    return best
+
+
+def _match_field(text: str) -> Optional[str]:
+    words = set(re.findall(r'[a-z]+', text.lower().replace('_', ' ')))
+    for field, keywords in ACTIVATION_FIELDS.items():
+        if words.intersection(keywords):
+            return field
+    return None
+
+
+def find_activation_properties(database: MsiDatabase) -> Dict[str, FieldBinding]:
+    """Map activation fields ('server_address', 'tag', 'license_key') to their bindings.
+
+    Every Edit control bound to a property is matched by the caption of its
+    label (the Text control right above or left of it), or by the property
+    name when the label says nothing. The dialog that binds the most fields
+    wins.
+    """
+    candidates: Dict[str, Dict[str, FieldBinding]] = {}
+    for dialog, controls in database.dialogs().items():
+        texts = [c for c in controls if c.get('Type') == 'Text']
+        for edit in controls:
+            if edit.get('Type') not in EDIT_CONTROL_TYPES or not edit.get('Property'):
+                continue
+            label_control = _label_for(edit, texts)
+            label = clean_label(label_control['Text']) if label_control else ''
+            field = _match_field(label) or _match_field(edit['Property'])
+            if field and field not in candidates.setdefault(dialog, {}):
+                candidates[dialog][field] = FieldBinding(field, edit['Property'], dialog, edit['Control'], label)
+
+    if not candidates:
+        return {}
+    return max(candidates.values(), key=len)
+
+
+def activation_property_values(msi_path, values: Dict[str, str]) -> Dict[str, str]:
+    """Return {PROPERTY: value} for a silent install from {field: value}.
+
+    Raises MsiError when the package cannot be read or a field has no
+    public property behind it.
+    """
+    try:
+        bindings = find_activation_properties(MsiDatabase(msi_path))
+    except OSError as e:
+        raise MsiError(f"Cannot read {msi_path}: {e}") from e
+
+    missing = [field for field in values if field not in bindings or not bindings[field].public]
+    if missing:
+        raise MsiError(f"No public MSI property found for: {', '.join(missing)}")
+    return {bindings[field].property: value for field, value in values.items()}
+
+
+def msiexec_command(msi_path, properties: Dict[str, str], log_path=None) -> str:
+    """Build a silent `msiexec /i` command line setting `properties`."""
+    command = f'msiexec /i "{msi_path}" /qn /norestart'
+    if log_path:
+        command += f' /l*v "{log_path}"'
+    for name, value in properties.items():
+        command += ' {}="{}"'.format(name, str(value).replace('"', '""'))
+    return command
+
+
+# --- Install state -------------------------------------------------------
+
+class PackageFingerprint(NamedTuple):
+    """Identity of an MSI package: its product, version and content."""
+    product_code: str
+    product_version: str
+    sha256: str
+    size: int
+    mtime_ns: int
+
+
+def package_fingerprint(msi_path, known: Optional[PackageFingerprint] = None) -> PackageFingerprint:
+    """Return the fingerprint of `msi_path`.
+
+    When the file still has the size and modification time of `known`, the
+    package is not read again and `known` is returned.
+    """
+    path = Path(msi_path)
+    stat = path.stat()
+    if known is not None and (known.size, known.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+        return known
+
+    data = path.read_bytes()
+    properties = MsiDatabase(path, data).properties()
+    if not properties.get('ProductCode'):
+        raise MsiError(f"{path} has no ProductCode property")
+    return PackageFingerprint(properties['ProductCode'], properties.get('ProductVersion') or '',
+                              hashlib.sha256(data).hexdigest(), stat.st_size, stat.st_mtime_ns)
+
+
+class InstallState:
+    """Fingerprint of the package last installed on this host, kept in a JSON file.
+
+    `settings` (the activation values) are stored as a digest: installing the
+    same package with another server, tag or key is a different install.
+    """
+
+    def __init__(self, path, settings: Optional[Dict[str, str]] = None):
+        self.path = Path(path)
+        encoded = json.dumps(settings or {}, sort_keys=True).encode('utf-8')
+        self.settings_digest = hashlib.sha256(encoded).hexdigest()
+
+    def load(self) -> Optional[dict]:
+        try:
+            state = json.loads(self.path.read_text(encoding='utf-8'))
+            state['package'] = PackageFingerprint(**state['package'])
+            return state
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def check(self, msi_path, installed_version: Callable[[str], Optional[str]]) -> Tuple[bool, str]:
+        """Return (installed, reason): whether `msi_path` needs no install.
+
+        That is the case when it is the package recorded in the state file,
+        with the same settings, and `installed_version(product_code)` (the
+        installed products provider, None for "not installed") still reports
+        its version. Raises OSError or MsiError when the package cannot be
+        read.
+        """
+        state = self.load()
+        known = state['package'] if state else None
+        fingerprint = package_fingerprint(msi_path, known)
+        if known is None:
+            return False, f"no install recorded in {self.path}"
+        if fingerprint.sha256 != known.sha256:
+            return False, f"{msi_path} differs from the package installed last ({known.product_version})"
+        if state.get('settings') != self.settings_digest:
+            return False, "the activation settings changed since the last install"
+
+        version = installed_version(fingerprint.product_code)
+        if version is None:
+            return False, f"{fingerprint.product_code} is no longer installed"
+        if version != fingerprint.product_version:
+            return False, f"version {version} is installed, the package is {fingerprint.product_version}"
+
+        if fingerprint != known:
+            # Same content under a new timestamp: store it so the next check skips hashing
+            self._write(fingerprint)
+        return True, f"{fingerprint.product_code} {version} is installed from this package"
+
+    def record(self, msi_path):
+        """Record `msi_path` as the package installed with these settings."""
+        state = self.load()
+        self._write(package_fingerprint(msi_path, state['package'] if state else None))
+
+    def _write(self, fingerprint: PackageFingerprint):
+        state = {
+            'package': fingerprint._asdict(),
+            'settings': self.settings_digest,
+            'recorded': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        temporary.write_text(json.dumps(state, indent=2), encoding='utf-8')
+        temporary.replace(self.path)
+
+
+# --- Fixture writer ------------------------------------------------------
+
+# CLSID of the root storage of an MSI database
+MSI_CLSID = uuid.UUID('000C1084-0000-0000-C000-000000000046').bytes_le
+
+
+def _directory_entry(name: str, kind: int, start: int = ENDOFCHAIN, size: int = 0,
+                     left: int = NOSTREAM, right: int = NOSTREAM, child: int = NOSTREAM,
+                     clsid: bytes = b'\0' * 16) -> bytes:
+    encoded = name.encode('utf-16-le')
+    if len(encoded) > 62:
+        raise ValueError(f"Stream name too long: {name!r}")
+    return (encoded.ljust(64, b'\0') + struct.pack('<HBB3I', len(encoded) + 2, kind, 1, left, right, child)
+            + clsid + b'\0' * 20 + struct.pack('<IQ', start, size))
+
+
+def write_compound_file(path, streams: Dict[str, bytes], clsid: bytes = b'\0' * 16):
+    """Write `streams` into a version 3 compound file (512-byte sectors) at `path`."""
+    sector_size, mini_size, cutoff = 512, 64, 4096
+
+    def pad(data: bytes, size: int) -> bytes:
+        return data + b'\0' * (-len(data) % size)
+
+    # Small streams go into the mini stream, the rest into regular sectors
+    mini_stream, minifat = b'', []
+    big: List[Tuple[str, bytes]] = []
+    starts: Dict[str, int] = {}
+    for name, data in streams.items():
+        if len(data) < cutoff:
+            first = len(mini_stream) // mini_size
+            count = -(-len(data) // mini_size)
+            starts[name] = first if count else ENDOFCHAIN
+            minifat.extend(list(range(first + 1, first + count)) + [ENDOFCHAIN] if count else [])
+            mini_stream += pad(data, mini_size)
+        else:
+            big.append((name, data))
+
+    # Sector plan: mini stream, big streams, mini FAT, directory, then the FAT
+    chunks: List[Tuple[str, bytes]] = [('', mini_stream)] + big
+    chunks.append(('minifat', struct.pack(f'<{len(minifat)}I', *minifat)))
+
+    # Directory: root, then streams as a balanced binary tree in CFB name order
+    names = sorted(streams, key=lambda n: (len(n), n.upper()))
+    index = {name: i + 1 for i, name in enumerate(names)}
+    links: Dict[str, Tuple[int, int]] = {}
+
+    def build(items: List[str]) -> int:
+        if not items:
+            return NOSTREAM
+        middle = len(items) // 2
+        links[items[middle]] = (build(items[:middle]), build(items[middle + 1:]))
+        return index[items[middle]]
+
+    root_child = build(names)
+    directory_sectors = -(-(len(names) + 1) * 128 // sector_size)
+
+    sectors_before_fat = sum(-(-len(data) // sector_size) for _, data in chunks) + directory_sectors
+    fat_sectors = 1
+    while fat_sectors * (sector_size // 4) < sectors_before_fat + fat_sectors:
+        fat_sectors += 1
+    if fat_sectors > 109:
+        raise ValueError("Compound file too large for a fixture")
+
+    fat: List[int] = []
+    chunk_starts = []
+    for _, data in chunks:
+        count = -(-len(data) // sector_size)
+        chunk_starts.append(len(fat) if count else ENDOFCHAIN)
+        fat.extend(list(range(len(fat) + 1, len(fat) + count)) + [ENDOFCHAIN] if count else [])
+    first_dir = len(fat)
+    fat.extend(list(range(first_dir + 1, first_dir + directory_sectors)) + [ENDOFCHAIN])
+    first_fat = len(fat)
+    fat.extend([FATSECT] * fat_sectors)
+    fat.extend([FREESECT] * (fat_sectors * sector_size // 4 - len(fat)))
+
+    for (name, _), start in zip(chunks[1:-1], chunk_starts[1:-1]):
+        starts[name] = start
+
+    directory = _directory_entry('Root Entry', ROOT, chunk_starts[0], len(mini_stream), child=root_child, clsid=clsid)
+    for name in names:
+        left, right = links[name]
+        directory += _directory_entry(name, STREAM, starts[name], len(streams[name]), left, right)
+    directory = pad(directory, sector_size)
+
+    num_minifat_sectors = -(-len(chunks[-1][1]) // sector_size)
+    header = CFB_SIGNATURE + b'\0' * 16 + struct.pack(
+        '<HHHHH6xIIIIIIIII', 0x3E, 3, 0xFFFE, 9, 6, 0, fat_sectors, first_dir, 0, cutoff,
+        chunk_starts[-1] if num_minifat_sectors else ENDOFCHAIN, num_minifat_sectors, ENDOFCHAIN, 0)
+    difat = list(range(first_fat, first_fat + fat_sectors)) + [FREESECT] * (109 - fat_sectors)
+    header += struct.pack('<109I', *difat)
+
+    body = b''.join(pad(data, sector_size) for _, data in chunks) + directory
+    body += struct.pack(f'<{len(fat)}I', *fat)
+    Path(path).write_bytes(header + body)
+
+
+# Format id of the summary information property set
+SUMMARY_FMTID = uuid.UUID('F29F85E0-4FF9-1068-AB91-08002B27B3D9').bytes_le
+
+
+def summary_information(codepage: int = 1252, title: str = 'Installation Database',
+                        template: str = 'x64;1033', package_code: Optional[str] = None) -> bytes:
+    """Return a \\x05SummaryInformation property set with the properties msiexec requires."""
+    encoding = _codec(codepage)
+
+    def string(value: str) -> bytes:
+        encoded = value.encode(encoding) + b'\0'
+        return struct.pack('<II', 30, len(encoded)) + encoded + b'\0' * (-len(encoded) % 4)  # VT_LPSTR
+
+    package_code = package_code or '{%s}' % str(uuid.uuid4()).upper()
+    values = [
+        (1, struct.pack('<IhH', 2, codepage if codepage < 0x8000 else codepage - 0x10000, 0)),  # codepage, VT_I2
+        (2, string(title)),
+        (7, string(template)),                  # platform;languages
+        (9, string(package_code)),              # package code
+        (14, struct.pack('<Ii', 3, 200)),       # minimum installer version, VT_I4
+        (15, struct.pack('<Ii', 3, 2)),         # word count: compressed sources
+    ]
+    offsets, body = [], b''
+    for pid, value in values:
+        offsets.append((pid, 8 + 8 * len(values) + len(body)))
+        body += value
+    section = struct.pack('<II', 8 + 8 * len(values) + len(body), len(values))
+    section += b''.join(struct.pack('<II', pid, offset) for pid, offset in offsets) + body
+    header = struct.pack('<HHI16sI', 0xFFFE, 0, 0x00020006, b'\0' * 16, 1) + SUMMARY_FMTID + struct.pack('<I', 48)
+    return header + section
+
+
+def write_msi(path, tables: Dict[str, Tuple[List[Tuple[str, int]], List[tuple]]], codepage: int = 1252):
+    """Write a minimal MSI database with `tables` ({name: (columns, rows)}) to `path`.
+
+    Columns are (name, type) pairs using the COLUMN_* types; rows are tuples
+    of str, int or None. Besides the tables, only the string pool and the
+    summary information are written.
+    """
+    encoding = _codec(codepage)
+    strings: Dict[str, int] = {}
+    refcounts: List[int] = []
+
+    def string_id(value: Optional[str]) -> int:
+        if not value:
+            return 0  # MSI has no empty strings, they are NULL
+        if value not in strings:
+            strings[value] = len(strings) + 1
+            refcounts.append(0)
+        refcounts[strings[value] - 1] += 1
+        return strings[value]
+
+    def encode_rows(columns: List[Tuple[str, int]], rows: List[tuple]) -> bytes:
+        out = b''
+        for i, (_, type_) in enumerate(columns):
+            for row in rows:
+                value = row[i]
+                if type_ & MSITYPE_STRING:
+                    out += struct.pack('<H', string_id(value))
+                elif type_ & 0xFF <= 2:
+                    out += struct.pack('<H', 0 if value is None else (value + 0x8000) & 0xFFFF)
+                else:
+                    out += struct.pack('<I', 0 if value is None else (value + 0x80000000) & 0xFFFFFFFF)
+        return out
+
+    column_rows = [(table, number, name, type_) for table, (columns, _) in tables.items()
+                   for number, (name, type_) in enumerate(columns, 1)]
+    streams = {
+        encode_stream_name('_Tables', table=True): encode_rows([('Name', COLUMN_STRING)], [(t,) for t in tables]),
+        encode_stream_name('_Columns', table=True): encode_rows(COLUMNS_SCHEMA, column_rows),
+    }
+    for table, (columns, rows) in tables.items():
+        if rows:
+            streams[encode_stream_name(table, table=True)] = encode_rows(columns, rows)
+
+    if len(strings) >= 0x10000:
+        raise ValueError("Too many strings for 2-byte string references")
+    pool = struct.pack('<HH', codepage & 0xFFFF, (codepage >> 16) & 0x7FFF)
+    data = b''
+    for value, refs in zip(strings, refcounts):
+        encoded = value.encode(encoding)
+        if len(encoded) >= 0x10000:
+            raise ValueError("Strings of 64 KiB or more are not supported")
+        pool += struct.pack('<HH', len(encoded), min(refs, 0xFFFF))
+        data += encoded
+    streams[encode_stream_name('_StringPool', table=True)] = pool
+    streams[encode_stream_name('_StringData', table=True)] = data
+
+    streams['\x05SummaryInformation'] = summary_information(codepage)
+
+    write_compound_file(path, streams, clsid=MSI_CLSID)
+
+
+# Column layouts of the tables the installer reads
+PROPERTY_COLUMNS = [('Property', COLUMN_STRING | MSITYPE_KEY), ('Value', COLUMN_TEXT)]
+DIALOG_COLUMNS = [
+    ('Dialog', COLUMN_STRING | MSITYPE_KEY), ('HCentering', COLUMN_I2), ('VCentering', COLUMN_I2),
+    ('Width', COLUMN_I2), ('Height', COLUMN_I2), ('Attributes', COLUMN_I4 | MSITYPE_NULLABLE),
+    ('Title', COLUMN_TEXT), ('Control_First', COLUMN_STRING), ('Control_Default', COLUMN_STRING | MSITYPE_NULLABLE),
+    ('Control_Cancel', COLUMN_STRING | MSITYPE_NULLABLE),
+]
+CONTROL_COLUMNS = [
+    ('Dialog_', COLUMN_STRING | MSITYPE_KEY), ('Control', COLUMN_STRING | MSITYPE_KEY), ('Type', COLUMN_STRING),
+    ('X', COLUMN_I2), ('Y', COLUMN_I2), ('Width', COLUMN_I2), ('Height', COLUMN_I2),
+    ('Attributes', COLUMN_I4 | MSITYPE_NULLABLE), ('Property', COLUMN_STRING | MSITYPE_NULLABLE),
+    ('Text', COLUMN_TEXT), ('Control_Next', COLUMN_STRING | MSITYPE_NULLABLE), ('Help', COLUMN_TEXT),
+]
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Inspect an MSI package without Windows")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('properties', 'List public properties and their defaults'),
+                            ('dialogs', 'List dialogs and their controls'),
+                            ('activation', 'Show the properties behind the activation fields'),
+                            ('fingerprint', 'Show the ProductCode, ProductVersion and content hash')):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('msi', help='Path to the .msi file')
+    subparsers.choices['dialogs'].add_argument('--dialog', help='Only show this dialog')
+
+    args = parser.parse_args()
+    if args.command == 'fingerprint':
+        try:
+            fingerprint = package_fingerprint(args.msi)
+        except (OSError, MsiError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        for name, value in fingerprint._asdict().items():
+            print(f"{name}: {value}")
+        return
+
+    try:
+        database = MsiDatabase(args.msi)
+    except (OSError, MsiError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.command == 'properties':
+        for name, value in database.public_properties().items():
+            print(f"{name} = {value!r}" if value is not None else f"{name} (no default)")
+    elif args.command == 'dialogs':
+        for dialog, controls in database.dialogs().items():
+            if args.dialog and dialog != args.dialog:
+                continue
+            print(dialog)
+            for control in controls:
+                binding = f" -> {control['Property']}" if control.get('Property') else ''
+                print(f"  {control.get('Control')} [{control.get('Type')}] "
+                      f"{clean_label(control.get('Text'))!r}{binding}")
+    else:
+        bindings = find_activation_properties(database)
+        if not bindings:
+            print("No activation fields found")
+            sys.exit(1)
+        for binding in bindings.values():
+            note = '' if binding.public else ' (private, cannot be set from the command line)'
+            print(f"{binding.field}: {binding.property} "
+                  f"({binding.dialog}.{binding.control}, label {binding.label!r}){note}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Persistent tesseract OCR for the TEHTRIS EDR installer automation.
+
+pytesseract runs the tesseract command for every call: a process spawn, a
+temporary image file and a reload of the language data each time, and the
+installer's polling loops OCR dozens of captures per install.
+
+TesseractEngine drives libtesseract in-process through its C API (ctypes,
+no extra package) and keeps the language data loaded between calls.
+TesseractWorker hosts an engine in a long-lived child process: frames go
+over a pipe as raw pixel buffers and come back as dictionaries in the
+layout of pytesseract's Output.DICT. TesseractPool hands calls to idle
+workers. Where libtesseract cannot be loaded, workers fall back to
+pytesseract, so results stay the same either way.
+
+image_to_data() is the in-process variant: one engine per process, loaded
+on first use (used by the multi-variant OCR pool workers).
+
+    python tehtris_ocr.py bench --calls 20
+
+Requirements:
+- tesseract (libtesseract next to tesseract.exe, or on the library path)
+- pytesseract (fallback and benchmark)
+- numpy (frame buffers)
+- psutil (benchmark)
+"""
+
+import argparse
+import atexit
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from tehtris_ui import lazy_import
+
+# Loaded on first use, so importing this module stays cheap; only frames
+# handed to an engine need it
+np = lazy_import('numpy')
+
+
+# Columns of tesseract's TSV output, as in pytesseract's Output.DICT
+TSV_COLUMNS = ['level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text']
+
+# libtesseract file names, most recent first
+LIBRARY_NAMES = ['libtesseract-5.dll', 'libtesseract-4.dll', 'tesseract53.dll', 'tesseract50.dll',
+                 'libtesseract.so.5', 'libtesseract.so.4', 'libtesseract.5.dylib', 'libtesseract.dylib']
+
+# Page segmentation mode of the tesseract command (PSM_AUTO); the API
+# default would treat every capture as a single block
+PSM_AUTO = 3
+
+
+class OcrError(Exception):
+    """OCR engine could not be loaded or failed on a frame."""
+
+
+def parse_tsv(tsv: str) -> Dict[str, list]:
+    """Convert tesseract TSV output (with or without header) into an Output.DICT-style dictionary."""
+    data: Dict[str, list] = {column: [] for column in TSV_COLUMNS}
+    for line in tsv.splitlines():
+        fields = line.split('\t', len(TSV_COLUMNS) - 1)
+        if len(fields) < len(TSV_COLUMNS) - 1 or fields[0] == 'level':
+            continue
+        fields += [''] * (len(TSV_COLUMNS) - len(fields))
+        for column, value in zip(TSV_COLUMNS, fields):
+            if column == 'text':
+                data[column].append(value)
+            elif column == 'conf':
+                data[column].append(float(value))
+            else:
+                data[column].append(int(value))
+    return data
+
+
+def tesseract_directory() -> Optional[Path]:
+    """Directory of the tesseract command (pytesseract's tesseract_cmd, else PATH), if any."""
+    command = 'tesseract'
+    try:
+        import pytesseract
+        command = pytesseract.pytesseract.tesseract_cmd
+    except ImportError:
+        pass
+    found = shutil.which(command) or (command if os.path.isfile(command) else None)
+    if found:
+        return Path(found).resolve().parent
+    default = Path(r'C:\Program Files\Tesseract-OCR')
+    return default if default.is_dir() else None
+
+
+def find_libtesseract() -> List[str]:
+    """Candidate paths or names of libtesseract, best first."""
+    candidates = []
+    directory = tesseract_directory()
+    if directory:
+        candidates += [str(directory / name) for name in LIBRARY_NAMES if (directory / name).exists()]
+    found = ctypes.util.find_library('tesseract')
+    if found:
+        candidates.append(found)
+    return candidates + LIBRARY_NAMES
+
+
+class TesseractEngine:
+    """libtesseract through its C API, with the language data loaded once."""
+
+    name = 'libtesseract'
+
+    def __init__(self, lang: str = 'eng', library: Optional[str] = None, datapath: Optional[str] = None,
+                 psm: int = PSM_AUTO):
+        self.lib = self._load(library)
+        self._declare()
+
+        directory = tesseract_directory()
+        if datapath is None and directory and (directory / 'tessdata').is_dir():
+            datapath = str(directory / 'tessdata')
+
+        self.handle = self.lib.TessBaseAPICreate()
+        if self.lib.TessBaseAPIInit3(self.handle, datapath.encode() if datapath else None, lang.encode()) != 0:
+            self.lib.TessBaseAPIDelete(self.handle)
+            raise OcrError(f"libtesseract could not load the '{lang}' language data")
+        self.lib.TessBaseAPISetPageSegMode(self.handle, psm)
+
+    @staticmethod
+    def _load(library: Optional[str]):
+        directory = tesseract_directory()
+        if directory and hasattr(os, 'add_dll_directory'):
+            # The Windows build keeps leptonica and friends next to tesseract.exe
+            os.add_dll_directory(str(directory))
+        errors = []
+        for candidate in [library] if library else find_libtesseract():
+            try:
+                return ctypes.CDLL(candidate)
+            except OSError as e:
+                errors.append(f"{candidate}: {e}")
+        raise OcrError("libtesseract not found (" + '; '.join(errors[-3:]) + ")")
+
+    def _declare(self):
+        lib = self.lib
+        lib.TessBaseAPICreate.restype = ctypes.c_void_p
+        lib.TessBaseAPIInit3.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+        lib.TessBaseAPIInit3.restype = ctypes.c_int
+        lib.TessBaseAPISetPageSegMode.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPISetImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
+                                            ctypes.c_int, ctypes.c_int]
+        lib.TessBaseAPIGetTsvText.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.TessBaseAPIGetTsvText.restype = ctypes.c_void_p
+        lib.TessDeleteText.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIClear.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIEnd.argtypes = [ctypes.c_void_p]
+        lib.TessBaseAPIDelete.argtypes = [ctypes.c_void_p]
+
+    def image_to_data(self, image) -> Dict[str, list]:
+        """OCR a grayscale or RGB(A) image (array or PIL image)."""
+        pixels = np.ascontiguousarray(np.asarray(image), dtype=np.uint8)
+        height, width = pixels.shape[:2]
+        bytes_per_pixel = 1 if pixels.ndim == 2 else pixels.shape[2]
+        self.lib.TessBaseAPISetImage(self.handle, pixels.ctypes.data, width, height, bytes_per_pixel,
+                                     pixels.strides[0])
+        text = self.lib.TessBaseAPIGetTsvText(self.handle, 0)
+        if not text:
+            raise OcrError("libtesseract returned no result")
+        try:
+            tsv = ctypes.string_at(text).decode('utf-8', 'replace')
+        finally:
+            self.lib.TessDeleteText(text)
+            self.lib.TessBaseAPIClear(self.handle)
+        return parse_tsv(tsv)
+
+    def close(self):
+        if self.handle:
+            self.lib.TessBaseAPIEnd(self.handle)
+            self.lib.TessBaseAPIDelete(self.handle)
+            self.handle = None
+
+
+class PytesseractEngine:
+    """The tesseract command through pytesseract, one process per call."""
+
+    name = 'pytesseract'
+
+    def __init__(self, lang: str = 'eng', **options):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.lang = lang
+
+    def image_to_data(self, image) -> Dict[str, list]:
+        return self.pytesseract.image_to_data(image, lang=self.lang, output_type=self.pytesseract.Output.DICT)
+
+    def close(self):
+        pass
+
+
+def load_engine(lang: str = 'eng', **options):
+    """Return a TesseractEngine, or a PytesseractEngine when libtesseract cannot be loaded."""
+    try:
+        return TesseractEngine(lang, **options)
+    except (OcrError, OSError, AttributeError):
+        return PytesseractEngine(lang)
+
+
+_engine = None
+
+
+def image_to_data(image) -> Dict[str, list]:
+    """OCR `image` with this process's engine, loaded on first use."""
+    global _engine
+    if _engine is None:
+        _engine = load_engine()
+    return _engine.image_to_data(image)
+
+
+def _worker_main(conn, engine_factory: Callable, options: dict):
+    """Child process: load an engine once, then OCR the frames sent over `conn`."""
+    try:
+        engine = engine_factory(**options)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', engine.name))
+
+    while True:
+        try:
+            header = conn.recv()
+        except (EOFError, OSError):
+            break
+        if header is None:
+            break
+        shape, dtype = header
+        pixels = np.frombuffer(conn.recv_bytes(), dtype=dtype).reshape(shape)
+        try:
+            conn.send(('ok', engine.image_to_data(pixels)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+    engine.close()
+
+
+class TesseractWorker:
+    """Long-lived OCR child process.
+
+    start() spawns it and returns at once; the engine loads in the child
+    while the caller goes on, and the first image_to_data() call waits for
+    it. A worker that died is restarted once per call.
+    """
+
+    def __init__(self, engine_factory: Callable = load_engine, **options):
+        self.engine_factory = engine_factory
+        self.options = options
+        self.engine_name: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        self.calls = 0
+        self._process = None
+        self._conn = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    def start(self):
+        """Spawn the worker process if it is not running."""
+        if self._process is not None and self._process.is_alive():
+            return
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_worker_main, args=(child, self.engine_factory, self.options),
+                                                name='tehtris-ocr-worker', daemon=True)
+        self.started_at = time.perf_counter()
+        self.engine_name = None
+        self._process.start()
+        child.close()
+
+    def _wait_ready(self):
+        status, detail = self._conn.recv()
+        if status != 'ready':
+            self.close()
+            raise OcrError(f"OCR worker failed to start: {detail}")
+        self.engine_name = detail
+        self.startup_seconds = time.perf_counter() - self.started_at
+
+    def _request(self, pixels) -> Dict[str, list]:
+        self.start()
+        if self.engine_name is None:
+            self._wait_ready()
+        self._conn.send((pixels.shape, pixels.dtype.str))
+        self._conn.send_bytes(pixels.reshape(-1))
+        status, result = self._conn.recv()
+        if status != 'ok':
+            raise OcrError(result)
+        return result
+
+    def image_to_data(self, image) -> Dict[str, list]:
+        """OCR `image` in the worker process."""
+        pixels = np.ascontiguousarray(np.asarray(image), dtype=np.uint8)
+        self.calls += 1
+        try:
+            return self._request(pixels)
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            self.close()
+            return self._request(pixels)
+
+    def close(self):
+        """Stop the worker process."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout=2)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+
+class TesseractPool:
+    """A few TesseractWorkers; each call goes to an idle one.
+
+    Drop-in for pytesseract's image_to_data with Output.DICT. warm_up()
+    starts the workers ahead of the first call.
+    """
+
+    def __init__(self, workers: int = 1, engine_factory: Callable = load_engine, **options):
+        self.workers = [TesseractWorker(engine_factory, **options) for _ in range(workers)]
+        self._idle: queue.Queue = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+        self.calls = 0
+        self.seconds = 0.0
+        atexit.register(self.close)
+
+    def warm_up(self):
+        """Spawn the workers so that their engines load in the background."""
+        for worker in self.workers:
+            worker.start()
+
+    def image_to_data(self, image) -> Dict[str, list]:
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            return worker.image_to_data(image)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - start
+            self._idle.put(worker)
+
+    @property
+    def stats(self) -> dict:
+        startups = [w.startup_seconds for w in self.workers if w.startup_seconds is not None]
+        return {
+            'workers': len(self.workers),
+            'engine': next((w.engine_name for w in self.workers if w.engine_name), None),
+            'calls': self.calls,
+            'mean_ms': self.seconds * 1000 / self.calls if self.calls else 0.0,
+            'startup_ms': max(startups) * 1000 if startups else None,
+        }
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+def _cpu_seconds(pid: int) -> float:
+    import psutil
+    times = psutil.Process(pid).cpu_times()
+    return times.user + times.system
+
+
+def benchmark_ocr_worker(calls: int = 20, workers: int = 1, engine_factory: Callable = load_engine) -> dict:
+    """Time pytesseract's process-per-call OCR against a persistent worker pool.
+
+    Runs `calls` OCR passes over synthetic wizard labels both ways. CPU is
+    the tesseract processes' user+system time: the spawned children for
+    pytesseract, the worker processes (split into startup and calls) for
+    the pool.
+    """
+    import pytesseract
+    from tehtris_vision import BENCH_LABELS, preprocess_for_ocr, synthetic_label_frame
+
+    frames = [preprocess_for_ocr(synthetic_label_frame(BENCH_LABELS[i % len(BENCH_LABELS)], 'plain', i))
+              for i in range(calls)]
+
+    before = os.times()
+    start = time.perf_counter()
+    spawned = [pytesseract.image_to_data(frame, output_type=pytesseract.Output.DICT) for frame in frames]
+    spawn_seconds = time.perf_counter() - start
+    after = os.times()
+    # Children CPU is only accounted on POSIX; Windows reports zeros
+    spawn_cpu = (after.children_user - before.children_user) + (after.children_system - before.children_system)
+
+    pool = TesseractPool(workers, engine_factory)
+    try:
+        start = time.perf_counter()
+        pool.warm_up()
+        pool.image_to_data(frames[0])
+        first_seconds = time.perf_counter() - start
+        startup_cpu = sum(_cpu_seconds(worker.pid) for worker in pool.workers if worker.pid)
+
+        start = time.perf_counter()
+        pooled = [pool.image_to_data(frame) for frame in frames]
+        pool_seconds = time.perf_counter() - start
+        pool_cpu = sum(_cpu_seconds(worker.pid) for worker in pool.workers if worker.pid) - startup_cpu
+        engine = pool.stats['engine']
+    finally:
+        pool.close()
+
+    def words(data):
+        return [text for text in data['text'] if text.strip()]
+
+    return {
+        'calls': calls,
+        'engine': engine,
+        'spawn_ms': spawn_seconds * 1000 / calls,
+        'spawn_cpu_s': spawn_cpu,
+        'pool_first_call_ms': first_seconds * 1000,
+        'pool_startup_cpu_s': startup_cpu,
+        'pool_ms': pool_seconds * 1000 / calls,
+        'pool_cpu_s': pool_cpu,
+        'same_words': sum(words(a) == words(b) for a, b in zip(spawned, pooled)),
+    }
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Persistent tesseract OCR for the TEHTRIS installer")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench = subparsers.add_parser('bench', help='Compare process-per-call pytesseract with a persistent worker')
+    bench.add_argument('--calls', type=int, default=20, help='OCR passes per path (default: 20)')
+    bench.add_argument('--workers', type=int, default=1, help='Persistent workers (default: 1)')
+
+    args = parser.parse_args()
+    if args.command == 'bench':
+        try:
+            result = benchmark_ocr_worker(args.calls, args.workers)
+        except (ImportError, OSError, OcrError) as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"{result['calls']} OCR calls per path, persistent engine: {result['engine']}")
+        print(f"  pytesseract (spawn per call): {result['spawn_ms']:.1f} ms/call, {result['spawn_cpu_s']:.2f} s CPU")
+        print(f"  persistent worker:            {result['pool_ms']:.1f} ms/call, {result['pool_cpu_s']:.2f} s CPU")
+        print(f"  worker startup:               {result['pool_first_call_ms']:.0f} ms to first result, "
+              f"{result['pool_startup_cpu_s']:.2f} s CPU (once)")
+        print(f"  identical word lists:         {result['same_words']}/{result['calls']}")
+
+
+if __name__ == '__main__':
+    main()
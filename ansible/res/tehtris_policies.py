@@ -0,0 +1,663 @@
+#!/usr/bin/env python3
+"""
+Policy compiler for the Windows hardening tasks.
+
+Parses the LGPO text files under policies/ (the format LGPO.exe /t
+imports) and the registry files under defender/ into one model of
+registry entries, checks it, and writes one merged payload per import, so
+that each host runs one LGPO.exe /t import of the policies, one of the
+Defender group policies and a single `reg import` instead of one per file:
+
+    python tehtris_policies.py check --hardcore --disable-defender
+    python tehtris_policies.py compile --disable-defender --lgpo-out policy.txt \\
+        --defender-lgpo-out defender.txt --reg-out defender.reg
+
+Without any --*-out, `compile` prints the payloads, the entry counts and
+the registry keys the entries touch as JSON (what
+tasks/compile-policies.yml reads).
+
+`diff` prints the same JSON for just the entries that differ from a host's
+current registry state, read from `reg export` output of those keys (`-`
+for stdin):
+
+    python tehtris_policies.py diff --hardcore host-export.reg
+
+The export is the concatenated output of `reg export <key>` for every key
+in the `keys` list, in UTF-16 as reg.exe writes it or in UTF-8, and
+--missing names each key the host found absent:
+
+    python tehtris_policies.py diff host-export.reg --missing 'HKLM\\SOFTWARE\\Policies\\Microsoft\\Windows Defender'
+
+A listed key that is in neither (its export failed, say for lack of
+access) is unknown, and every entry under it is kept. Subkeys are known
+from the exported subtrees.
+
+Which files are compiled follows the playbook switches (POLICY_SETS):
+privacy, security and updates always, hardcore.txt with --hardcore
+(hardcore_mode) and the Defender files with --disable-defender
+(disable_defender).
+
+LGPO text entries are four lines -- Computer or User, key, value name and
+action (DWORD:<n>, SZ:<text>, EXSZ:<text>, DELETE, DELETEALLVALUES or
+CREATEKEY) -- separated by blank lines, with ';' comments. Registry files
+are the regedit 5.00 format, including [-key] and "name"=- deletions.
+
+Entries are identified by hive, key and value name, case-insensitively as
+in the registry. The same value set to the same data twice is kept once;
+set to different data, or set in one place and deleted in another, it is
+a conflict and compiling fails, naming both sources -- except for the
+files of OVERRIDING_SETS: hardcore.txt is a stricter take on updates.txt
+and replaces the entries it changes, as importing it last used to. The
+LGPO payload holds the entries of the .txt files except defender.txt,
+whose entries are the Defender LGPO payload (DEFENDER_SET): like the .reg
+payload, disable-defender.yml imports it before the security tools and the
+EDR are installed. The .reg payload holds the entries of the .reg files
+that no policy file already sets, since those keys (Defender tamper
+protection, PolicyManager) need PowerRun and are not group policy
+settings.
+"""
+
+import argparse
+import codecs
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+RES_DIR = Path(__file__).resolve().parent
+
+# Policy files per playbook switch, relative to this directory; 'base' is
+# always compiled. Files are compiled in this order.
+POLICY_SETS = {
+    'base': ['policies/privacy.txt', 'policies/security.txt', 'policies/updates.txt'],
+    'hardcore_mode': ['policies/hardcore.txt'],
+    'disable_defender': ['policies/defender.txt', 'defender/*.reg'],
+}
+
+# Sets whose entries replace those of the files before them instead of
+# conflicting with them
+OVERRIDING_SETS = ('hardcore_mode',)
+
+# Set whose LGPO entries are a payload of their own (defender_lgpo), imported
+# by disable-defender.yml before the security tools and the EDR install
+# rather than with the other policies in policies.yml
+DEFENDER_SET = 'disable_defender'
+
+LGPO_SCOPES = {'computer': 'HKLM', 'user': 'HKCU'}
+REG_HEADERS = ('Windows Registry Editor Version 5.00', 'REGEDIT4')
+REG_HIVES = {'HKEY_LOCAL_MACHINE': 'HKLM', 'HKEY_CURRENT_USER': 'HKCU'}
+
+# Actions on a whole key; the value name of their entries is '*'
+KEY_ACTIONS = ('DELETEALLVALUES', 'CREATEKEY', 'DELETEKEY')
+
+# Value types of registry files: hex(<n>) number -> type name, None for plain hex:
+REG_HEX_TYPES = {None: 'BINARY', 0: 'NONE', 2: 'EXSZ', 3: 'BINARY', 4: 'DWORD', 7: 'MULTISZ', 11: 'QWORD'}
+
+
+class PolicyError(Exception):
+    """Raised for unparseable policy files and conflicting entries."""
+
+
+class PolicyEntry(NamedTuple):
+    """One registry change.
+
+    `kind` is a value type (DWORD, QWORD, SZ, EXSZ, MULTISZ, BINARY, NONE) or
+    an action (DELETE, DELETEALLVALUES, CREATEKEY, DELETEKEY). `data` is an
+    int for DWORD and QWORD, a str for SZ and EXSZ, a tuple of str for
+    MULTISZ, bytes for BINARY and NONE, and None for actions. `source` is
+    "<file>:<line>".
+    """
+    hive: str
+    key: str
+    name: str
+    kind: str
+    data: object
+    source: str
+
+    @property
+    def identity(self) -> Tuple[str, str, str]:
+        return self.hive, self.key.lower(), self.name.lower()
+
+    @property
+    def is_delete(self) -> bool:
+        return self.kind in ('DELETE', 'DELETEALLVALUES', 'DELETEKEY')
+
+    def same_change(self, other: 'PolicyEntry') -> bool:
+        return (self.kind, self.data) == (other.kind, other.data)
+
+    def describe(self) -> str:
+        change = self.kind if self.data is None else f"{self.kind}:{self.data!r}"
+        return f"{self.hive}\\{self.key}\\{self.name or '(Default)'} = {change} ({self.source})"
+
+
+def read_text(path: Path) -> str:
+    """Read a policy or registry file; regedit writes UTF-16 with a BOM."""
+    return decode_text(path.read_bytes())
+
+
+def decode_text(raw: bytes) -> str:
+    if raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return raw.decode('utf-16')
+    return raw.decode('utf-8-sig', errors='replace')
+
+
+def parse_lgpo(text: str, source: str) -> List[PolicyEntry]:
+    """Parse LGPO.exe text format."""
+    entries: List[PolicyEntry] = []
+    lines = [(number, line.strip()) for number, line in enumerate(text.splitlines(), 1)]
+    lines = [(number, line) for number, line in lines if line and not line.startswith(';')]
+    if len(lines) % 4:
+        raise PolicyError(f"{source}: {len(lines)} lines, entries take 4 (scope, key, value, action)")
+    for index in range(0, len(lines), 4):
+        (number, scope), (_, key), (_, name), (_, action) = lines[index:index + 4]
+        where = f"{source}:{number}"
+        hive = LGPO_SCOPES.get(scope.lower())
+        if hive is None:
+            raise PolicyError(f"{where}: expected Computer or User, got {scope!r}")
+        kind, _, value = action.partition(':')
+        kind = kind.upper()
+        if kind == 'DWORD':
+            data = int(value, 0) if value.lower().startswith('0x') else int(value)
+        elif kind in ('SZ', 'EXSZ'):
+            data = value
+        elif kind in ('DELETE', 'DELETEALLVALUES', 'CREATEKEY') and not value:
+            data = None
+            if kind != 'DELETE':
+                name = '*'
+        else:
+            raise PolicyError(f"{where}: unsupported action {action!r}")
+        entries.append(PolicyEntry(hive, key.strip('\\'), name, kind, data, where))
+    return entries
+
+
+def _reg_string(text: str, where: str) -> Tuple[str, str]:
+    """Split a quoted .reg string off the start of `text`; returns (string, rest)."""
+    match = re.match(r'"((?:[^"\\]|\\.)*)"', text)
+    if not match:
+        raise PolicyError(f"{where}: expected a quoted string in {text!r}")
+    return re.sub(r'\\(.)', r'\1', match.group(1)), text[match.end():]
+
+
+def _reg_value(data: str, where: str, lenient: bool = False) -> Tuple[str, object]:
+    """Decode a .reg value; with `lenient`, value types policies never set
+    (hex(8) resource lists and the like) are read as ('HEX(<n>)', bytes)."""
+    if data == '-':
+        return 'DELETE', None
+    if data.startswith('"'):
+        value, rest = _reg_string(data, where)
+        if rest.strip():
+            raise PolicyError(f"{where}: unexpected {rest!r} after the string")
+        return 'SZ', value
+    if data.lower().startswith('dword:'):
+        digits = data[6:]
+        if not re.fullmatch(r'[0-9a-fA-F]{1,9}', digits) or int(digits, 16) > 0xFFFFFFFF:
+            raise PolicyError(f"{where}: invalid dword {digits!r}")
+        return 'DWORD', int(digits, 16)
+    match = re.fullmatch(r'hex(?:\(([0-9a-fA-F]+)\))?:([0-9a-fA-F,\s]*)', data)
+    if match:
+        kind = REG_HEX_TYPES.get(int(match.group(1), 16) if match.group(1) else None)
+        raw = bytes(int(byte, 16) for byte in re.split(r'[,\s]+', match.group(2).strip()) if byte)
+        if kind is None and lenient:
+            return f"HEX({match.group(1)})", raw
+        if kind is None:
+            raise PolicyError(f"{where}: unsupported value type hex({match.group(1)})")
+        if kind in ('DWORD', 'QWORD'):
+            return kind, int.from_bytes(raw, 'little')
+        if kind == 'EXSZ':
+            return kind, raw.decode('utf-16-le').rstrip('\0')
+        if kind == 'MULTISZ':
+            return kind, tuple(part for part in raw.decode('utf-16-le').rstrip('\0').split('\0'))
+        return kind, raw
+    raise PolicyError(f"{where}: unsupported value {data!r}")
+
+
+def parse_reg(text: str, source: str, export: bool = False) -> List[PolicyEntry]:
+    """Parse a regedit 5.00 registry file.
+
+    With `export`, `text` is `reg export` output, possibly of several keys
+    one after the other: every key header yields a CREATEKEY entry, repeated
+    file headers are skipped and unusual value types are kept as bytes.
+    """
+    lines = text.splitlines()
+    if not lines or lines[0].strip() not in REG_HEADERS:
+        raise PolicyError(f"{source}: not a registry file")
+    entries: List[PolicyEntry] = []
+    hive = key = None
+    number = 1
+    while number < len(lines):
+        start = number + 1
+        line = lines[number].strip()
+        number += 1
+        # Long hex values continue on the next lines after a trailing backslash
+        while line.endswith('\\') and number < len(lines) and '=' in line:
+            line = line[:-1] + lines[number].strip()
+            number += 1
+        where = f"{source}:{start}"
+        if not line or line.startswith(';') or export and line in REG_HEADERS:
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            path = line[1:-1]
+            delete = path.startswith('-')
+            root, _, key = path.lstrip('-').partition('\\')
+            hive = REG_HIVES.get(root.upper())
+            if hive is None or not key:
+                raise PolicyError(f"{where}: unsupported key {path!r}")
+            if delete:
+                entries.append(PolicyEntry(hive, key, '*', 'DELETEKEY', None, where))
+                hive = key = None
+            elif export:
+                entries.append(PolicyEntry(hive, key, '*', 'CREATEKEY', None, where))
+            continue
+        if hive is None:
+            raise PolicyError(f"{where}: value outside of a key")
+        if line.startswith('@='):
+            name, rest = '', line[1:]
+        else:
+            name, rest = _reg_string(line, where)
+        if not rest.startswith('='):
+            raise PolicyError(f"{where}: expected '=' after the value name")
+        kind, data = _reg_value(rest[1:].strip(), where, lenient=export)
+        entries.append(PolicyEntry(hive, key, name, kind, data, where))
+    return entries
+
+
+def policy_files(hardcore: bool = False, disable_defender: bool = False, base_dir: Path = RES_DIR) -> List[Path]:
+    """Return the files of the selected POLICY_SETS, in compile order."""
+    selected = ['base'] + (['hardcore_mode'] if hardcore else []) + (['disable_defender'] if disable_defender else [])
+    files: List[Path] = []
+    for name in selected:
+        for pattern in POLICY_SETS[name]:
+            matches = sorted(base_dir.glob(pattern))
+            if not matches:
+                raise PolicyError(f"No policy file matches {pattern} in {base_dir}")
+            files += matches
+    return files
+
+
+def overriding_files(base_dir: Path = RES_DIR) -> List[Path]:
+    """Return the files of OVERRIDING_SETS."""
+    return [path for name in OVERRIDING_SETS for pattern in POLICY_SETS[name] for path in base_dir.glob(pattern)]
+
+
+def defender_files(base_dir: Path = RES_DIR) -> List[Path]:
+    """Return the files of DEFENDER_SET."""
+    return [path for pattern in POLICY_SETS[DEFENDER_SET] for path in base_dir.glob(pattern)]
+
+
+def parse_file(path: Path, base_dir: Path = RES_DIR) -> List[PolicyEntry]:
+    try:
+        source = str(path.relative_to(base_dir))
+    except ValueError:
+        source = str(path)
+    try:
+        text = read_text(path)
+    except OSError as e:
+        raise PolicyError(f"Cannot read {path}: {e}") from e
+    return parse_reg(text, source) if path.suffix.lower() == '.reg' else parse_lgpo(text, source)
+
+
+class PolicySet:
+    """The merged entries of several policy files.
+
+    `lgpo`, `defender_lgpo` and `reg` hold the deduplicated entries for each
+    payload in the order they were first seen; `duplicates` counts the entries dropped as
+    repeats, `overrides` lists (replaced, overriding) pairs and `conflicts`
+    lists (kept, conflicting) pairs.
+    """
+
+    def __init__(self):
+        self.lgpo: List[PolicyEntry] = []
+        self.defender_lgpo: List[PolicyEntry] = []
+        self.reg: List[PolicyEntry] = []
+        self.duplicates = 0
+        self.overrides: List[Tuple[PolicyEntry, PolicyEntry]] = []
+        self.conflicts: List[Tuple[PolicyEntry, PolicyEntry]] = []
+        self._seen: Dict[Tuple[str, str, str], PolicyEntry] = {}
+
+    @classmethod
+    def from_files(cls, paths: Iterable[Path], base_dir: Path = RES_DIR) -> 'PolicySet':
+        # Policy files first, so that a value both set anyway goes through LGPO
+        paths = sorted(paths, key=lambda path: path.suffix.lower() == '.reg')
+        overriding = {path.resolve() for path in overriding_files(base_dir)}
+        defender = {path.resolve() for path in defender_files(base_dir)}
+        policies = cls()
+        for path in paths:
+            policies.add(parse_file(path, base_dir), reg=path.suffix.lower() == '.reg',
+                         override=path.resolve() in overriding, defender=path.resolve() in defender)
+        return policies
+
+    def add(self, entries: Iterable[PolicyEntry], reg: bool = False, override: bool = False,
+            defender: bool = False):
+        """Merge entries; with `override` they replace differing ones in place.
+
+        LGPO entries go to `defender_lgpo` with `defender`, to `lgpo` otherwise.
+        """
+        target = self.reg if reg else self.defender_lgpo if defender else self.lgpo
+        for entry in entries:
+            if entry.kind in KEY_ACTIONS:
+                # Key-wide actions are ordered against the values around
+                # them (a [-key] before re-creating it), not deduplicated
+                target.append(entry)
+                continue
+            seen = self._seen.get(entry.identity)
+            if seen is None:
+                self._seen[entry.identity] = entry
+                target.append(entry)
+            elif seen.same_change(entry):
+                self.duplicates += 1
+            elif override:
+                kept = next(payload for payload in self.payloads if seen in payload)
+                kept[kept.index(seen)] = entry
+                self._seen[entry.identity] = entry
+                self.overrides.append((seen, entry))
+            else:
+                self.conflicts.append((seen, entry))
+
+    def check(self):
+        """Raise PolicyError listing every conflict."""
+        if self.conflicts:
+            raise PolicyError("Conflicting policy entries:\n" + "\n".join(
+                f"  {kept.describe()}\n  vs {other.describe()}" for kept, other in self.conflicts))
+
+    @property
+    def payloads(self) -> List[List[PolicyEntry]]:
+        return [self.lgpo, self.defender_lgpo, self.reg]
+
+    @property
+    def entries(self) -> List[PolicyEntry]:
+        return self.lgpo + self.defender_lgpo + self.reg
+
+    @property
+    def keys(self) -> List[str]:
+        """The registry keys the entries touch, as "<hive>\\<key>", in order."""
+        keys: Dict[Tuple[str, str], str] = {}
+        for entry in self.entries:
+            keys.setdefault((entry.hive, entry.key.lower()), f"{entry.hive}\\{entry.key}")
+        return list(keys.values())
+
+    def changed(self, state: 'RegistryState') -> 'PolicySet':
+        """Return the entries that `state` does not satisfy yet.
+
+        A key deletion is judged together with the entries after it that
+        rebuild the key; once it has to be applied, so do they. Entries it
+        wipes out are never applied.
+        """
+        delta = PolicySet()
+        delta.duplicates, delta.overrides = self.duplicates, self.overrides
+        for entries, target in zip(self.payloads, delta.payloads):
+            cleared: List[PolicyEntry] = []
+            for index, entry in enumerate(entries):
+                if any(_under(entry, parent) for parent in cleared):
+                    target.append(entry)
+                    continue
+                if any(_under(entry, later) for later in entries[index + 1:]):
+                    continue
+                rebuild = [later for later in entries[index + 1:] if _under(later, entry)]
+                if not state.satisfies(entry, rebuild):
+                    target.append(entry)
+                    if entry.kind in ('DELETEKEY', 'DELETEALLVALUES'):
+                        cleared.append(entry)
+        return delta
+
+
+def _under(entry: PolicyEntry, action: PolicyEntry) -> bool:
+    """Whether `entry` is affected by the key-wide `action` (values of the
+    key, and of its subkeys for DELETEKEY)."""
+    if action.kind not in ('DELETEKEY', 'DELETEALLVALUES') or entry.hive != action.hive:
+        return False
+    key, parent = entry.key.lower(), action.key.lower()
+    if action.kind == 'DELETEALLVALUES':
+        return key == parent and entry.kind not in KEY_ACTIONS
+    return key == parent or key.startswith(parent + '\\')
+
+
+class RegistryState:
+    """A host's current values of the keys a policy set touches.
+
+    `keys` maps (hive, lowercase key) to None for a key that does not exist,
+    or to its values ({lowercase name: (kind, data)}) and lowercase subkey
+    names. Keys it leaves out are unknown: no entry under them is in place.
+    """
+
+    def __init__(self, keys: Dict[Tuple[str, str], Optional[Tuple[Dict[str, Tuple[str, object]], List[str]]]]):
+        self._keys = keys
+
+    @classmethod
+    def from_reg_export(cls, text: str, keys: Iterable[str], missing: Iterable[str] = (),
+                        source: str = 'export') -> 'RegistryState':
+        """Read `reg export` output of the "<hive>\\<key>" paths in `keys`.
+
+        A key of `keys` that is not in the export does not exist if it is in
+        `missing` (the keys the host found absent) or under an exported key;
+        otherwise its export failed and it is unknown.
+        """
+        values: Dict[Tuple[str, str], Dict[str, Tuple[str, object]]] = {}
+        for entry in parse_reg(text, source, export=True) if text.strip() else []:
+            existing = values.setdefault((entry.hive, entry.key.lower()), {})
+            if entry.kind != 'CREATEKEY':
+                existing[entry.name.lower()] = entry.kind, entry.data
+        subkeys: Dict[Tuple[str, str], List[str]] = {identity: [] for identity in values}
+        for hive, key in values:
+            parent, _, name = key.rpartition('\\')
+            if (hive, parent) in subkeys:
+                subkeys[hive, parent].append(name)
+
+        absent = {(hive, key.lower()) for hive, _, key in (path.partition('\\') for path in missing)}
+        state: Dict[Tuple[str, str], Optional[Tuple[Dict[str, Tuple[str, object]], List[str]]]] = {}
+        for path in keys:
+            hive, _, key = path.partition('\\')
+            parts = key.lower().split('\\')
+            ancestors = {(hive, '\\'.join(parts[:depth])) for depth in range(1, len(parts))}
+            if (hive, key.lower()) in absent or ancestors & values.keys():
+                state[hive, key.lower()] = None
+        for identity, key_values in values.items():
+            state[identity] = key_values, subkeys[identity]
+        return cls(state)
+
+    def satisfies(self, entry: PolicyEntry, rebuild: Iterable[PolicyEntry] = ()) -> bool:
+        """Whether the entry's change is already in place.
+
+        For key-wide actions, `rebuild` are the later entries under the key:
+        the values and subkeys they set are expected to be there.
+        """
+        identity = entry.hive, entry.key.lower()
+        if identity not in self._keys:
+            return False
+        current = self._keys[identity]
+        if entry.kind == 'CREATEKEY':
+            return current is not None
+        if entry.kind in ('DELETEKEY', 'DELETEALLVALUES'):
+            return current is None or self._only(identity, entry.kind == 'DELETEKEY', rebuild)
+        value = current[0].get(entry.name.lower()) if current else None
+        if entry.kind == 'DELETE':
+            return value is None
+        return value == (entry.kind, entry.data)
+
+    def _only(self, identity: Tuple[str, str], subtree: bool, rebuild: Iterable[PolicyEntry]) -> bool:
+        """Whether the key (with `subtree`, and its exported subkeys) holds
+        no values or subkeys besides those `rebuild` sets."""
+        hive, root = identity
+        expected: Dict[str, set] = {root: set()}
+        children: Dict[str, set] = {root: set()}
+        for later in rebuild:
+            key = later.key.lower()
+            expected.setdefault(key, set())
+            if later.kind not in KEY_ACTIONS and not later.is_delete:
+                expected[key].add(later.name.lower())
+            # Every key between the root and this one is recreated with it
+            parts = key[len(root):].strip('\\').split('\\') if key != root else []
+            for depth, part in enumerate(parts):
+                parent = '\\'.join([root] + parts[:depth])
+                children.setdefault(parent, set()).add(part)
+        for (key_hive, key), current in self._keys.items():
+            if key_hive != hive or current is None or not (key == root or subtree and key.startswith(root + '\\')):
+                continue
+            values, subkeys = current
+            if not set(values) <= expected.get(key, set()):
+                return False
+            if subtree and not set(subkeys) <= children.get(key, set()):
+                return False
+        return True
+
+
+# -- Payloads --------------------------------------------------------------------
+
+def format_lgpo(entries: Iterable[PolicyEntry]) -> str:
+    """Write entries in LGPO.exe text format."""
+    scopes = {hive: scope.capitalize() for scope, hive in LGPO_SCOPES.items()}
+    blocks = []
+    for entry in entries:
+        if entry.kind == 'DWORD':
+            action = f"DWORD:{entry.data}"
+        elif entry.kind in ('SZ', 'EXSZ'):
+            action = f"{entry.kind}:{entry.data}"
+        elif entry.kind in ('DELETE', 'DELETEALLVALUES', 'CREATEKEY'):
+            action = entry.kind
+        else:
+            raise PolicyError(f"LGPO text cannot express {entry.describe()}")
+        blocks.append(f"; {entry.source}\r\n{scopes[entry.hive]}\r\n{entry.key}\r\n{entry.name}\r\n{action}\r\n")
+    return "\r\n".join(blocks)
+
+
+def _reg_quote(text: str) -> str:
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _reg_data(entry: PolicyEntry) -> str:
+    if entry.kind == 'DELETE':
+        return '-'
+    if entry.kind == 'DWORD':
+        return f"dword:{entry.data:08x}"
+    if entry.kind == 'SZ':
+        return _reg_quote(entry.data)
+    if entry.kind == 'QWORD':
+        raw, number = entry.data.to_bytes(8, 'little'), 'b'
+    elif entry.kind == 'EXSZ':
+        raw, number = (entry.data + '\0').encode('utf-16-le'), '2'
+    elif entry.kind == 'MULTISZ':
+        raw, number = ('\0'.join(entry.data) + '\0\0').encode('utf-16-le'), '7'
+    elif entry.kind == 'NONE':
+        raw, number = entry.data, '0'
+    else:
+        raw, number = entry.data, ''
+    return f"hex{'(' + number + ')' if number else ''}:" + ','.join(f'{byte:02x}' for byte in raw)
+
+
+def format_reg(entries: Iterable[PolicyEntry]) -> str:
+    """Write entries as a regedit 5.00 registry file."""
+    roots = {hive: root for root, hive in REG_HIVES.items()}
+    lines = ['Windows Registry Editor Version 5.00']
+    current: Optional[Tuple[str, str]] = None
+    for entry in entries:
+        path = f"{roots[entry.hive]}\\{entry.key}"
+        if entry.kind == 'DELETEKEY':
+            lines += ['', f"[-{path}]"]
+            current = None
+            continue
+        if entry.kind in KEY_ACTIONS:
+            raise PolicyError(f"Registry files cannot express {entry.describe()}")
+        if current != (entry.hive, entry.key.lower()):
+            lines += ['', f"[{path}]"]
+            current = (entry.hive, entry.key.lower())
+        name = '@' if entry.name == '' else _reg_quote(entry.name)
+        lines.append(f"{name}={_reg_data(entry)}")
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def compiled_payloads(policies: PolicySet, files: List[Path], unchanged: int = 0,
+                      base_dir: Path = RES_DIR) -> dict:
+    """Return the payloads, their counts and keys, for the playbook.
+
+    A payload is empty when it has no entries, so that its import can be
+    skipped.
+    """
+    return {
+        'files': [str(path.relative_to(base_dir)) for path in files],
+        'lgpo': format_lgpo(policies.lgpo) if policies.lgpo else '',
+        'defender_lgpo': format_lgpo(policies.defender_lgpo) if policies.defender_lgpo else '',
+        'reg': format_reg(policies.reg) if policies.reg else '',
+        'lgpo_entries': len(policies.lgpo),
+        'defender_lgpo_entries': len(policies.defender_lgpo),
+        'reg_entries': len(policies.reg),
+        'duplicates': policies.duplicates,
+        'overrides': len(policies.overrides),
+        'unchanged': unchanged,
+        'keys': policies.keys,
+    }
+
+
+def read_export(path: str, keys: Iterable[str], missing: Iterable[str] = ()) -> RegistryState:
+    """Read `reg export` output from `path`, '-' for stdin; `missing` as in RegistryState.from_reg_export."""
+    try:
+        raw = sys.stdin.buffer.read() if path == '-' else Path(path).read_bytes()
+    except OSError as e:
+        raise PolicyError(f"Cannot read {path}: {e}") from e
+    return RegistryState.from_reg_export(decode_text(raw), keys, missing, 'stdin' if path == '-' else path)
+
+
+def write_payload(path: Path, text: str, encoding: str):
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with open(tmp_path, 'w', encoding=encoding, newline='') as f:
+            f.write(text)
+    except UnicodeEncodeError as e:
+        raise PolicyError(f"{path}: {e}") from e
+    tmp_path.replace(path)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Merge the LGPO text and registry files into single payloads")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    commands = {
+        'check': subparsers.add_parser('check', help='Parse the selected files and report duplicates and conflicts'),
+        'compile': subparsers.add_parser('compile', help='Write the merged payloads, or print them as JSON'),
+        'diff': subparsers.add_parser('diff', help="Print the payloads of the entries a host's export differs from"),
+    }
+    for command in commands.values():
+        command.add_argument('--hardcore', action='store_true', help='Include hardcore.txt (hardcore_mode)')
+        command.add_argument('--disable-defender', action='store_true',
+                             help='Include defender.txt and defender/*.reg (disable_defender)')
+    commands['compile'].add_argument('--lgpo-out', type=Path, help='Merged LGPO.exe /t text file to write')
+    commands['compile'].add_argument('--defender-lgpo-out', type=Path,
+                                     help='LGPO.exe /t text file of the Defender group policies to write')
+    commands['compile'].add_argument('--reg-out', type=Path, help='Merged registry file to write')
+    commands['diff'].add_argument('export', help="reg export output of the host's policy keys, '-' for stdin")
+    commands['diff'].add_argument('--missing', action='append', default=[], metavar='KEY',
+                                  help='A policy key the host does not have (repeatable); keys neither '
+                                       'exported nor listed here are unknown and all their entries applied')
+    args = parser.parse_args()
+
+    try:
+        files = policy_files(args.hardcore, args.disable_defender)
+        policies = PolicySet.from_files(files)
+        if args.command == 'check':
+            print(f"{len(files)} files: {len(policies.lgpo)} LGPO entries, {len(policies.defender_lgpo)} Defender "
+                  f"LGPO entries, {len(policies.reg)} registry entries, "
+                  f"{policies.duplicates} duplicates dropped, {len(policies.overrides)} overridden, "
+                  f"{len(policies.conflicts)} conflicts")
+            for replaced, entry in policies.overrides:
+                print(f"  {entry.describe()} overrides {replaced.source}")
+        policies.check()
+        if args.command == 'compile':
+            # LGPO reads ANSI text; regedit's own exports are UTF-16 with a BOM
+            if args.lgpo_out:
+                write_payload(args.lgpo_out, format_lgpo(policies.lgpo), 'ascii')
+            if args.defender_lgpo_out:
+                write_payload(args.defender_lgpo_out, format_lgpo(policies.defender_lgpo), 'ascii')
+            if args.reg_out:
+                write_payload(args.reg_out, format_reg(policies.reg), 'utf-16')
+            if not args.lgpo_out and not args.defender_lgpo_out and not args.reg_out:
+                print(json.dumps(compiled_payloads(policies, files), indent=2))
+        elif args.command == 'diff':
+            delta = policies.changed(read_export(args.export, policies.keys, args.missing))
+            unchanged = len(policies.entries) - len(delta.entries)
+            print(json.dumps(compiled_payloads(delta, files, unchanged), indent=2))
+    except PolicyError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
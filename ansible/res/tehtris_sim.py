@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+"""
+Simulated TEHTRIS EDR setup wizard.
+
+SimulatedWizard reproduces the dialog sequence of the TEHTRIS EDR MSI --
+welcome, license, activation, ready to install, progress, finish -- as an
+in-memory window tree (a FakeWin32) with configurable latencies for the
+installer start, page transitions and the install itself. As with msiexec,
+every page is a new top-level dialog titled "TEHTRIS EDR Setup".
+
+Pages are rendered into a screen image so that the screenshot, OCR,
+template and color strategies have pixels to work on. OCR returns the
+rendered words with their boxes after `ocr_latency` seconds, standing in
+for a tesseract pass.
+
+SimulatedBackend exposes the wizard through the UIBackend interface, so
+both installer scripts run end to end off Windows:
+
+    python tehtris_edr_installer.py --backend sim
+    python tehtris_edr_installer_minimal.py TEHTRIS.msi --backend sim
+
+write_fixture_msi() writes an MSI whose Dialog and Control tables describe
+the same pages, for the MSI reader and the silent install mode.
+
+Requirements:
+- pillow (rendering)
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+from tehtris_msi import CONTROL_COLUMNS, DIALOG_COLUMNS, PROPERTY_COLUMNS, write_msi
+from tehtris_ui import SETUP_WINDOW_TITLE, FakeWin32, UIBackend
+
+
+WINDOW_SIZE = (500, 390)
+TITLE_BAR_HEIGHT = 30
+
+# Page layouts: (class, caption, (left, top, width, height) in window
+# coordinates, role). Roles name the controls the wizard reacts to.
+NAVIGATION = [
+    ('Button', '< &Back', (222, 322, 80, 24), 'back'),
+    ('Button', '&Next >', (306, 322, 80, 24), 'next'),
+    ('Button', 'Cancel', (400, 322, 80, 24), 'cancel'),
+]
+
+PAGES: Dict[str, list] = {
+    'welcome': [
+        ('Static', 'Welcome to the TEHTRIS EDR Setup Wizard', (20, 50, 460, 24), 'heading'),
+        ('Static', 'The Setup Wizard will install TEHTRIS EDR on your computer.', (20, 100, 460, 20), None),
+        ('Static', 'Click Next to continue or Cancel to exit the Setup Wizard.', (20, 125, 460, 20), None),
+    ] + NAVIGATION,
+    'license': [
+        ('Static', 'End-User License Agreement', (20, 50, 460, 24), 'heading'),
+        ('RichEdit20W', 'TEHTRIS EDR END-USER LICENSE AGREEMENT', (20, 85, 460, 140), None),
+        ('Button', 'I &accept the terms in the License Agreement', (20, 235, 400, 20), 'accept'),
+        ('Button', 'I &do not accept the terms in the License Agreement', (20, 259, 400, 20), 'decline'),
+    ] + NAVIGATION,
+    'activation': [
+        ('Static', 'Activation Information', (20, 50, 460, 24), 'heading'),
+        ('Static', 'Server address:', (20, 90, 440, 20), None),
+        ('Edit', '', (20, 110, 440, 24), 'field'),
+        ('Static', 'Tag:', (20, 145, 440, 20), None),
+        ('Edit', '', (20, 165, 440, 24), 'field'),
+        ('Static', 'License key:', (20, 200, 440, 20), None),
+        ('Edit', '', (20, 220, 440, 24), 'field'),
+    ] + NAVIGATION,
+    'ready': [
+        ('Static', 'Ready to install TEHTRIS EDR', (20, 50, 460, 24), 'heading'),
+        ('Static', 'Click Install to begin the installation.', (20, 100, 460, 20), None),
+        ('Button', '< &Back', (222, 322, 80, 24), 'back'),
+        ('Button', '&Install', (306, 322, 80, 24), 'install'),
+        ('Button', 'Cancel', (400, 322, 80, 24), 'cancel'),
+    ],
+    'progress': [
+        ('Static', 'Installing TEHTRIS EDR', (20, 50, 460, 24), 'heading'),
+        ('Static', 'Status:', (20, 100, 460, 20), 'status'),
+        ('msctls_progress32', '', (20, 130, 460, 20), 'progress'),
+    ] + NAVIGATION,
+    'finish': [
+        ('Static', 'Completed the TEHTRIS EDR Setup Wizard', (20, 50, 460, 24), 'heading'),
+        ('Static', 'Click the Finish button to exit the Setup Wizard.', (20, 100, 460, 20), None),
+        ('Button', '< &Back', (222, 322, 80, 24), 'back'),
+        ('Button', '&Finish', (306, 322, 80, 24), 'finish'),
+        ('Button', 'Cancel', (400, 322, 80, 24), 'cancel'),
+    ],
+}
+
+# Controls that start disabled on each page
+DISABLED = {
+    'welcome': {'back'},
+    'license': {'next'},
+    'activation': {'next'},
+    'progress': {'back', 'next'},
+    'finish': {'back', 'cancel'},
+}
+
+# MSI dialog names of the pages and the public properties bound to the
+# activation fields, as written by write_fixture_msi
+DIALOG_NAMES = {
+    'welcome': 'WelcomeDlg',
+    'license': 'LicenseAgreementDlg',
+    'activation': 'ActivationDlg',
+    'ready': 'VerifyReadyDlg',
+    'progress': 'ProgressDlg',
+    'finish': 'ExitDialog',
+}
+FIXTURE_PROPERTIES = ['EDR_SERVER', 'EDR_TAG', 'EDR_KEY']
+FIXTURE_PRODUCT_CODE = '{3F2A7C1E-8B4D-4E6F-9A0B-1C2D3E4F5A6B}'
+FIXTURE_PRODUCT_VERSION = '2.0.0'
+
+# Processes of the simulated host, as (pid, name, exe), and the version-info
+# descriptions of their executables. The TEHTRIS agent starts
+# `agent_latency` seconds after an install completes.
+BACKGROUND_PROCESSES = [
+    (4, 'System', ''),
+    (688, 'svchost.exe', r'C:\Windows\System32\svchost.exe'),
+    (1432, 'UpdateAgent.exe', r'C:\Program Files\Contoso\UpdateAgent.exe'),
+    (2916, 'explorer.exe', r'C:\Windows\explorer.exe'),
+]
+AGENT_PROCESS = (5124, 'TehtrisAgent.exe', r'C:\Program Files\TEHTRIS\EDR\TehtrisAgent.exe')
+FILE_DESCRIPTIONS = {
+    r'C:\Program Files\Contoso\UpdateAgent.exe': 'Contoso Update Agent',
+    AGENT_PROCESS[2]: 'TEHTRIS EDR Agent',
+}
+
+PAGE_ORDER = ['welcome', 'license', 'activation', 'ready']
+DEFAULT_ROLES = ('next', 'install', 'finish')
+RADIO_ROLES = ('accept', 'decline')
+PROGRESS_STEPS = ['Copying new files', 'Writing registry values', 'Registering product', 'Starting services']
+
+
+class SimulatedWizard(FakeWin32):
+    """In-memory TEHTRIS EDR setup wizard driven through the win32gui calls.
+
+    Time-based changes (the window appearing after launch, page transitions,
+    install progress) are scheduled events, applied whenever the wizard is
+    queried or acted on; no background thread is involved.
+
+    With `expose_captions=False` the controls behave like owner-drawn ones:
+    GetWindowText returns nothing for them, so only the screen strategies
+    (template, OCR, hotkeys) can find the buttons.
+
+    `installed_products` ({ProductCode: version}) are the products already
+    on the simulated host; a completed install adds the fixture product and
+    starts the agent process `agent_latency` seconds later.
+    """
+
+    def __init__(self, launch_latency: float = 1.0, page_latency: float = 0.3, install_seconds: float = 5.0,
+                 screen_size: Tuple[int, int] = (1280, 800), background_windows: int = 20,
+                 expose_captions: bool = True, installed_products: Optional[Dict[str, str]] = None,
+                 agent_latency: float = 0.5, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.launch_latency = launch_latency
+        self.page_latency = page_latency
+        self.install_seconds = install_seconds
+        self.agent_latency = agent_latency
+        self.expose_captions = expose_captions
+        self.screen_size = screen_size
+        self.clock = clock
+
+        self.page: Optional[str] = None
+        self.window: Optional[int] = None
+        self.roles: Dict[str, List[int]] = {}
+        self.focus: Optional[int] = None
+        self.select_all = False
+        self.progress = 0.0
+        self.installed = False
+        self.installed_products = dict(installed_products or {})
+        self.agent_started: Optional[float] = None
+        self.cancelled = False
+        self.busy = False
+        self.values: Dict[int, str] = {}
+        self.history: List[Tuple[float, str]] = []
+        self.version = 0
+        self._events: List[Tuple[float, Callable]] = []
+        self._ticking = False
+
+        left = (screen_size[0] - WINDOW_SIZE[0]) // 2
+        top = (screen_size[1] - WINDOW_SIZE[1]) // 2
+        self.window_rect = (left, top, left + WINDOW_SIZE[0], top + WINDOW_SIZE[1])
+
+        self.desktop = self.add_window("Program Manager", 'Progman', rect=(0, 0) + tuple(screen_size))
+        for index in range(background_windows):
+            window = self.add_window(f"Window {index}", 'ApplicationFrameWindow', visible=index % 2 == 0)
+            self.add_window("", 'Static', parent=window)
+        self.foreground = self.add_window("Administrator: Windows PowerShell", 'ConsoleWindowClass',
+                                          rect=(40, 40, 900, 600))
+
+    # -- Scheduling ---------------------------------------------------------------
+
+    def _call(self, name: str):
+        super()._call(name)
+        self.tick()
+
+    def schedule(self, delay: float, action: Callable):
+        self._events.append((self.clock() + delay, action))
+        self._events.sort(key=lambda event: event[0])
+
+    def tick(self):
+        """Apply the scheduled events that are due."""
+        if self._ticking:
+            return
+        self._ticking = True
+        try:
+            while self._events and self._events[0][0] <= self.clock():
+                _, action = self._events.pop(0)
+                action()
+        finally:
+            self._ticking = False
+
+    def _record(self, event: str):
+        self.history.append((self.clock(), event))
+        self.version += 1
+
+    def GetWindowText(self, hwnd) -> str:
+        text = super().GetWindowText(hwnd)
+        window = self.windows[hwnd]
+        owner_drawn = window['parent'] is not None and window['parent'] == self.window and window['class'] != 'Edit'
+        if owner_drawn and not self.expose_captions:
+            return ""
+        return text
+
+    # -- Pages --------------------------------------------------------------------
+
+    def launch(self):
+        """Start the installer; the welcome page appears after `launch_latency`."""
+        self._record("launch")
+        self.schedule(self.launch_latency, lambda: self.show_page('welcome'))
+
+    def install_silently(self, properties: Dict[str, str]) -> int:
+        """Install without UI, like msiexec /qn; returns an msiexec exit code.
+
+        Fails with 1603 (fatal error) unless every activation property is set.
+        """
+        self._record("silent install")
+        if not all(properties.get(name) for name in FIXTURE_PROPERTIES):
+            self._record("silent install failed")
+            return 1603
+        self._complete_install()
+        return 0
+
+    def show_page(self, page: Optional[str]):
+        """Replace the current dialog with a new one for `page` (None closes the wizard)."""
+        if self.window is not None:
+            self.remove_window(self.window)
+        self.window = None
+        self.roles = {}
+        self.focus = None
+        self.busy = False
+        self.page = page
+        if page is None:
+            self.foreground = self.desktop
+            self._record("closed")
+            return
+
+        left, top = self.window_rect[:2]
+        self.window = self.add_window(SETUP_WINDOW_TITLE, rect=self.window_rect)
+        for class_name, caption, (x, y, w, h), role in PAGES[page]:
+            rect = (left + x, top + TITLE_BAR_HEIGHT + y, left + x + w, top + TITLE_BAR_HEIGHT + y + h)
+            hwnd = self.add_window(caption, class_name, parent=self.window,
+                                   enabled=role not in DISABLED.get(page, ()), rect=rect)
+            if role:
+                self.roles.setdefault(role, []).append(hwnd)
+        self.foreground = self.window
+        self._record(f"page {page}")
+
+        if page == 'progress':
+            self.progress = 0.0
+            for step in range(1, 11):
+                self.schedule(self.install_seconds * step / 10, lambda step=step: self._advance_install(step))
+
+    def _advance_install(self, step: int):
+        if self.page != 'progress':
+            return
+        self.progress = step / 10
+        status = PROGRESS_STEPS[min(step * len(PROGRESS_STEPS) // 10, len(PROGRESS_STEPS) - 1)]
+        self.set_text(self.roles['status'][0], f"Status: {status}")
+        self.version += 1
+        if step == 10:
+            self._complete_install()
+            self.schedule(self.page_latency, lambda: self.show_page('finish'))
+
+    def _complete_install(self):
+        self.installed = True
+        self.installed_products[FIXTURE_PRODUCT_CODE] = FIXTURE_PRODUCT_VERSION
+        self.agent_started = self.clock() + self.agent_latency
+        self._record("installed")
+
+    def processes(self) -> List[Tuple[int, str, str]]:
+        """Running processes as (pid, name, exe).
+
+        Reads the state without applying scheduled events, so it is safe to
+        call from the agent watcher thread.
+        """
+        running = list(BACKGROUND_PROCESSES)
+        if self.agent_started is not None and self.clock() >= self.agent_started:
+            running.append(AGENT_PROCESS)
+        return running
+
+    def _transition(self, page: Optional[str]):
+        """Go to `page` after the page latency; the current page ignores input meanwhile."""
+        self.busy = True
+        self.schedule(self.page_latency, lambda: self.show_page(page))
+
+    def role_of(self, hwnd) -> Optional[str]:
+        for role, handles in self.roles.items():
+            if hwnd in handles:
+                return role
+        return None
+
+    def _update_next(self):
+        """Enable Next once the page's requirements are met."""
+        if 'next' not in self.roles:
+            return
+        if self.page == 'license':
+            ready = self.values.get(self.roles['accept'][0]) == 'checked'
+        elif self.page == 'activation':
+            ready = all(self.windows[hwnd]['text'].strip() for hwnd in self.roles['field'])
+        else:
+            return
+        self.set_enabled(self.roles['next'][0], ready)
+        self.version += 1
+
+    def press(self, hwnd) -> bool:
+        """Click a control of the current page. Returns True if it reacted."""
+        self.tick()
+        if self.busy or hwnd not in self.windows or self.windows[hwnd]['parent'] != self.window:
+            return False
+        if not self.windows[hwnd]['enabled']:
+            return False
+
+        role = self.role_of(hwnd)
+        if role not in RADIO_ROLES + ('next', 'back', 'install', 'finish', 'cancel', 'field'):
+            return False
+        self.foreground = self.window
+        self._record(f"press {role}")
+        if role in RADIO_ROLES:
+            accept, decline = self.roles['accept'][0], self.roles['decline'][0]
+            self.values[accept] = 'checked' if role == 'accept' else ''
+            self.values[decline] = 'checked' if role == 'decline' else ''
+            self._update_next()
+        elif role == 'next':
+            self._transition(PAGE_ORDER[PAGE_ORDER.index(self.page) + 1])
+        elif role == 'back' and self.page in PAGE_ORDER[1:]:
+            self._transition(PAGE_ORDER[PAGE_ORDER.index(self.page) - 1])
+        elif role == 'install':
+            self._transition('progress')
+        elif role == 'finish':
+            self._transition(None)
+        elif role == 'cancel':
+            self.cancelled = True
+            self._transition(None)
+        elif role == 'field':
+            self.focus = hwnd
+            self.select_all = False
+        return True
+
+    def edit(self, hwnd, text: str):
+        """Set the text of an edit control of the current page."""
+        self.tick()
+        if hwnd in self.windows and self.windows[hwnd]['class'] == 'Edit':
+            self.set_text(hwnd, text)
+            self._update_next()
+
+    def focus_next(self):
+        """Move the keyboard focus to the next field (Tab)."""
+        fields = self.roles.get('field', [])
+        if self.focus in fields:
+            index = fields.index(self.focus) + 1
+            self.focus = fields[index] if index < len(fields) else None
+        self.select_all = False
+
+    def control_at(self, x: int, y: int) -> Optional[int]:
+        """Return the control of the current page under screen point (x, y)."""
+        self.tick()
+        if self.window is None:
+            return None
+        for hwnd in reversed(list(self._descendants(self.window))):
+            left, top, right, bottom = self.windows[hwnd]['rect']
+            if left <= x < right and top <= y < bottom:
+                return hwnd
+        return None
+
+    def hotkey(self, *keys: str) -> bool:
+        """Apply a keyboard shortcut. Returns True if it had an effect."""
+        self.tick()
+        keys = tuple(key.lower() for key in keys)
+        if keys == ('win', 'd'):
+            self.foreground = self.desktop
+            return True
+        if self.window is None or self.foreground != self.window:
+            return False
+        if keys == ('ctrl', 'a') and self.focus:
+            self.select_all = True
+            return True
+        if keys == ('tab',):
+            self.focus_next()
+            return True
+        if keys in (('enter',), ('return',)):
+            for role in DEFAULT_ROLES:
+                for hwnd in self.roles.get(role, []):
+                    if self.windows[hwnd]['enabled']:
+                        return self.press(hwnd)
+            return False
+        if len(keys) == 2 and keys[0] == 'alt':
+            mnemonic = '&' + keys[1]
+            for hwnd in self._descendants(self.window):
+                if mnemonic in self.windows[hwnd]['text'].lower():
+                    return self.press(hwnd)
+        return False
+
+    def type_text(self, text: str):
+        """Type into the focused field."""
+        self.tick()
+        if self.focus is None or self.focus not in self.windows:
+            return
+        current = '' if self.select_all else self.windows[self.focus]['text']
+        self.select_all = False
+        self.edit(self.focus, current + text)
+
+    # -- Rendering ----------------------------------------------------------------
+
+    def render(self) -> Tuple['Image.Image', list]:
+        """Draw the screen; returns the image and the (word, box, line) of every drawn word."""
+        image = Image.new('RGB', self.screen_size, (0, 99, 177))
+        draw = ImageDraw.Draw(image)
+        words: list = []
+        if self.window is None:
+            return image, words
+
+        left, top, right, bottom = self.window_rect
+        draw.rectangle((left, top, right - 1, bottom - 1), fill=(240, 240, 240), outline=(100, 100, 100))
+        draw.rectangle((left, top, right - 1, top + TITLE_BAR_HEIGHT), fill=(255, 255, 255))
+        self._draw_text(draw, words, (left + 10, top + 8), SETUP_WINDOW_TITLE, (0, 0, 0))
+
+        for hwnd in self._descendants(self.window):
+            window = self.windows[hwnd]
+            x0, y0, x1, y1 = window['rect']
+            caption = window['text'].replace('&', '')
+            color = (0, 0, 0) if window['enabled'] else (160, 160, 160)
+            role = self.role_of(hwnd)
+            class_name = window['class']
+
+            if class_name == 'Button' and role in RADIO_ROLES:
+                draw.ellipse((x0, y0 + 3, x0 + 13, y0 + 16), fill=(255, 255, 255), outline=(50, 50, 50))
+                if self.values.get(hwnd) == 'checked':
+                    draw.ellipse((x0 + 4, y0 + 7, x0 + 9, y0 + 12), fill=(0, 0, 0))
+                self._draw_text(draw, words, (x0 + 20, y0 + 3), caption, color)
+            elif class_name == 'Button':
+                default = role in DEFAULT_ROLES and window['enabled']
+                draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=(225, 225, 225),
+                               outline=(0, 120, 215) if default else (173, 173, 173), width=2 if default else 1)
+                width = draw.textlength(caption, font=FONT)
+                self._draw_text(draw, words, (x0 + (x1 - x0 - width) / 2, y0 + 5), caption, color)
+            elif class_name in ('Edit', 'RichEdit20W'):
+                draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=(255, 255, 255), outline=(122, 122, 122))
+                self._draw_text(draw, words, (x0 + 4, y0 + 5), caption, color)
+            elif class_name == 'msctls_progress32':
+                draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=(230, 230, 230), outline=(188, 188, 188))
+                if self.progress:
+                    draw.rectangle((x0 + 1, y0 + 1, x0 + int((x1 - x0 - 2) * self.progress), y1 - 2),
+                                   fill=(6, 176, 37))
+            else:
+                self._draw_text(draw, words, (x0, y0 + 3), caption, color)
+        return image, words
+
+    @staticmethod
+    def _draw_text(draw, words: list, origin: Tuple[float, float], text: str, color):
+        """Draw `text` and record the screen box of each of its words."""
+        if not text:
+            return
+        x, y = origin
+        draw.text((x, y), text, fill=color, font=FONT)
+        line = len({word[2] for word in words}) + 1
+        position = 0
+        for word in text.split():
+            position = text.index(word, position)
+            start = x + draw.textlength(text[:position], font=FONT)
+            bbox = draw.textbbox((start, y), word, font=FONT)
+            words.append((word, (int(bbox[0]), int(bbox[1]), int(bbox[2] - bbox[0]), int(bbox[3] - bbox[1])), line))
+            position += len(word)
+
+
+def _load_font():
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        return ImageFont.load_default(size=13)
+    except TypeError:  # Pillow < 10.1 has a single bitmap font
+        return ImageFont.load_default()
+
+
+FONT = _load_font()
+
+
+class SimulatedBackend(UIBackend):
+    """UIBackend over a SimulatedWizard.
+
+    `ocr_latency` seconds are spent per OCR call, like a tesseract pass over
+    a wizard-sized capture.
+    """
+
+    name = 'sim'
+    simulated = True
+
+    def __init__(self, wizard: Optional[SimulatedWizard] = None, ocr_latency: float = 0.15, **options):
+        self.wizard = wizard or SimulatedWizard(**options)
+        self.win32 = self.wizard
+        self.screen_available = PIL_AVAILABLE
+        self.ocr_available = PIL_AVAILABLE
+        self.ocr_latency = ocr_latency
+        self._frame: Optional[tuple] = None
+        self._last_region: Optional[Tuple[int, int, int, int]] = None
+
+    def launch(self, msi_path):
+        self.wizard.launch()
+
+    def install_silently(self, msi_path, properties: Dict[str, str], log_path=None, timeout: Optional[float] = None) -> int:
+        self.wizard._call('install_silently')
+        time.sleep(self.wizard.install_seconds)
+        return self.wizard.install_silently(properties)
+
+    def installed_product_version(self, product_code: str) -> Optional[str]:
+        self.wizard._call('installed_product_version')
+        return self.wizard.installed_products.get(product_code)
+
+    def is_admin(self) -> bool:
+        return True
+
+    def list_processes(self, name_filter: Callable[[str], bool]) -> List[Tuple[int, str, str]]:
+        return [process for process in self.wizard.processes() if name_filter(process[1])]
+
+    def file_description(self, path: str) -> Optional[str]:
+        return FILE_DESCRIPTIONS.get(path)
+
+    def click_control(self, hwnd, synchronous: bool = False):
+        self.wizard._call('click_control')
+        self.wizard.press(hwnd)
+
+    def set_text(self, hwnd, text: str):
+        self.wizard._call('set_text')
+        self.wizard.edit(hwnd, text)
+
+    def send_tab(self, hwnd):
+        self.wizard._call('send_tab')
+        self.wizard.focus = hwnd
+        self.wizard.focus_next()
+
+    def click(self, x: int, y: int):
+        self.wizard._call('click')
+        hwnd = self.wizard.control_at(x, y)
+        if hwnd is not None:
+            self.wizard.press(hwnd)
+
+    def hotkey(self, *keys: str):
+        self.wizard._call('hotkey')
+        self.wizard.hotkey(*keys)
+
+    def write(self, text: str):
+        self.wizard._call('write')
+        self.wizard.type_text(text)
+
+    def _render(self) -> tuple:
+        """Return the rendered screen and its words, re-drawing only after a change."""
+        if self._frame is None or self._frame[0] != self.wizard.version:
+            self._frame = (self.wizard.version,) + self.wizard.render()
+        return self._frame[1], self._frame[2]
+
+    def screenshot(self, region=None):
+        self.wizard._call('screenshot')
+        image, _ = self._render()
+        self._last_region = region
+        if region:
+            left, top, width, height = region
+            return image.crop((left, top, left + width, top + height))
+        return image.copy()
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self.wizard.screen_size
+
+    def ocr_data(self, image) -> dict:
+        """Return the words of the last screenshot that fall inside it.
+
+        OCR always runs on the most recent capture, so that capture's region
+        maps the rendered words into image coordinates; an image larger than
+        that capture (an upscaled OCR variant) gets scaled boxes.
+        """
+        # Counted without advancing the wizard: multi-variant OCR calls this
+        # from worker threads
+        FakeWin32._call(self.wizard, 'ocr_data')
+        time.sleep(self.ocr_latency)
+        _, words = self._render()
+        height, width = image.shape[:2]
+        left, top = self._last_region[:2] if self._last_region else (0, 0)
+        capture_width = self._last_region[2] if self._last_region else self.wizard.screen_size[0]
+        scale = width / capture_width
+
+        data = {key: [] for key in ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+                                    'left', 'top', 'width', 'height', 'conf', 'text')}
+        word_counts: Dict[int, int] = {}
+        for word, (x, y, w, h), line in words:
+            x, y, w, h = [int(round(value * scale)) for value in (x - left, y - top, w, h)]
+            if x < 0 or y < 0 or x + w > width or y + h > height:
+                continue
+            # Each drawn caption is reported as its own block with one line
+            word_counts[line] = word_counts.get(line, 0) + 1
+            entry = {'level': 5, 'page_num': 1, 'block_num': line, 'par_num': 1, 'line_num': 1,
+                     'word_num': word_counts[line], 'left': x, 'top': y, 'width': w, 'height': h,
+                     'conf': 96, 'text': word}
+            for key, value in entry.items():
+                data[key].append(value)
+        return data
+
+
+# MSI control types of the simulated window classes
+CONTROL_TYPES = {
+    'Static': 'Text',
+    'Edit': 'Edit',
+    'RichEdit20W': 'ScrollableText',
+    'msctls_progress32': 'ProgressBar',
+}
+
+
+def fixture_tables() -> dict:
+    """Property, Dialog and Control tables describing the simulated wizard."""
+    dialogs, controls = [], []
+    for page, layout in PAGES.items():
+        dialog = DIALOG_NAMES[page]
+        names = []
+        fields = iter(FIXTURE_PROPERTIES)
+        for index, (class_name, caption, (x, y, width, height), role) in enumerate(layout):
+            control_type = CONTROL_TYPES.get(class_name, 'PushButton')
+            if role in RADIO_ROLES:
+                control_type = 'RadioButtonGroup'
+            name = role.capitalize() if role in ('back', 'next', 'cancel', 'install', 'finish') else f"{control_type}{index}"
+            prop = next(fields) if role == 'field' else 'LicenseAccepted' if role in RADIO_ROLES else None
+            names.append(name)
+            controls.append((dialog, name, control_type, x, y, width, height, 3, prop, caption or None, None, None))
+        default = next((n for n in names if n.lower() in DEFAULT_ROLES), None)
+        dialogs.append((dialog, 50, 50, WINDOW_SIZE[0], WINDOW_SIZE[1], 3, SETUP_WINDOW_TITLE, names[0], default,
+                        'Cancel' if 'Cancel' in names else None))
+
+    properties = [('ProductName', 'TEHTRIS EDR'), ('ProductCode', FIXTURE_PRODUCT_CODE),
+                  ('ProductVersion', FIXTURE_PRODUCT_VERSION), ('Manufacturer', 'TEHTRIS'), ('LicenseAccepted', '0')]
+    return {
+        'Property': (PROPERTY_COLUMNS, properties),
+        'Dialog': (DIALOG_COLUMNS, dialogs),
+        'Control': (CONTROL_COLUMNS, controls),
+    }
+
+
+def write_fixture_msi(path) -> Path:
+    """Write an MSI whose dialogs match the simulated wizard (no files, UI tables only).
+
+    With it, the MSI reader and the silent install mode run off Windows:
+
+        python tehtris_sim.py write-msi fixture.msi
+        python tehtris_edr_installer.py --backend sim --silent --msi-path fixture.msi
+    """
+    write_msi(path, fixture_tables())
+    return Path(path)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Simulated TEHTRIS EDR setup wizard")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    write = subparsers.add_parser('write-msi', help='Write an MSI fixture matching the simulated wizard')
+    write.add_argument('path', help='Output .msi path')
+
+    args = parser.parse_args()
+    if args.command == 'write-msi':
+        print(f"Wrote {write_fixture_msi(args.path)}")
+
+
+if __name__ == '__main__':
+    main()
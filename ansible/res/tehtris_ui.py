@@ -0,0 +1,1255 @@
+#!/usr/bin/env python3
+"""
+UI automation primitives shared by the TEHTRIS EDR installer scripts.
+
+Instead of fixed sleeps, installer steps wait on a condition ("the setup
+window exists", "the Next button is enabled", "the page changed") with
+wait_until, which polls quickly at first and backs off up to a maximum
+interval until the condition holds or the deadline passes. StepTimer
+records how long each step took so runs can be compared.
+
+Control lookups go through ControlTreeSnapshot, which enumerates the setup
+window once and answers lookups from an index until the tree changes.
+FakeWin32 provides the same calls over an in-memory window tree, so the
+lookups can be exercised and benchmarked off Windows:
+
+    python tehtris_ui.py bench-snapshot
+
+Everything the installers do to the screen goes through a UIBackend: window
+enumeration and control text (its `win32` object), clicking and setting
+text on controls, mouse clicks, hotkeys, typing, screenshots and OCR.
+Win32Backend is the real desktop; create_backend('sim') returns the
+simulated wizard from tehtris_sim, which runs the installers off Windows.
+
+StepTimer can write each step, and the installers each locator attempt,
+as a structured span (SpanLog, JSONL next to the installation log). Span
+files collected from many hosts are aggregated into per-step p50/p95 and
+strategy win rates with:
+
+    python tehtris_ui.py report spans/
+
+StrategyTable keeps the attempt spans of past runs on a host and orders
+the locating strategies of the next run by expected time to success.
+
+AgentWatcher polls the backend's process list for the TEHTRIS agent, on a
+background thread while the install finishes, so that verification does
+not start from scratch once the wizard closes.
+
+Requirements:
+- pywin32 (for the win32gui predicates)
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+try:
+    import win32gui
+    WIN32GUI_AVAILABLE = True
+except ImportError:
+    WIN32GUI_AVAILABLE = False
+
+# Probed, not imported: the installers import these themselves when needed
+PYAUTOGUI_AVAILABLE = importlib.util.find_spec('pyautogui') is not None
+TESSERACT_AVAILABLE = importlib.util.find_spec('pytesseract') is not None
+
+# pyautogui settings for every screen action: moving the mouse to a corner
+# aborts the run, and each call is followed by a pause
+PYAUTOGUI_FAILSAFE = True
+PYAUTOGUI_PAUSE = 0.5
+
+SETUP_WINDOW_TITLE = "TEHTRIS EDR Setup"
+
+
+def lazy_import(name: str):
+    """Return module `name` without running it yet, or None if it is not installed.
+
+    The module executes on its first attribute access, so probing an
+    optional dependency at import time costs a spec lookup instead of its
+    whole import (cv2 and numpy take a tenth of a second or more).
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        return None
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+_pyautogui = None
+
+
+def load_pyautogui():
+    """Import pyautogui on first use and apply PYAUTOGUI_FAILSAFE/PYAUTOGUI_PAUSE."""
+    global _pyautogui
+    if _pyautogui is None:
+        import pyautogui
+        pyautogui.FAILSAFE = PYAUTOGUI_FAILSAFE
+        pyautogui.PAUSE = PYAUTOGUI_PAUSE
+        _pyautogui = pyautogui
+    return _pyautogui
+
+
+def wait_until(predicate: Callable, timeout: float, interval: float = 0.05, max_interval: float = 1.0,
+               backoff: float = 1.5, clock: Callable[[], float] = time.monotonic,
+               sleep: Callable[[float], None] = time.sleep):
+    """Poll `predicate` until it returns a truthy value or `timeout` seconds pass.
+
+    The first poll is immediate; the delay between polls starts at `interval`
+    and grows by `backoff` up to `max_interval`. Exceptions raised by the
+    predicate count as "not yet". Returns the last predicate result.
+    """
+    deadline = clock() + timeout
+    delay = interval
+    while True:
+        try:
+            result = predicate()
+        except Exception:
+            result = None
+        if result:
+            return result
+
+        remaining = deadline - clock()
+        if remaining <= 0:
+            return result
+        sleep(min(delay, remaining))
+        delay = min(delay * backoff, max_interval)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Return the q-th percentile (0-100) of `values`, interpolating between ranks."""
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+class SpanLog:
+    """Structured timing spans of installer steps and locator attempts, as JSONL.
+
+    Step spans cover one installer step (StepTimer opens them). Spans
+    opened inside a step are locator attempts: they carry the step name,
+    the element looked for, the strategy, and the attempt number (the n-th
+    attempt for that element in the step, whatever the strategy). Each
+    span records its duration, the OCR calls and control-tree enumerations
+    made meanwhile (read from the `ocr_calls`/`enumerations` counters), and
+    its outcome: 'ok'/'failed' for steps, 'hit'/'miss' for attempts, and
+    'error' when an exception escaped.
+
+    Spans are appended to `path` as they end, one JSON object per line, so
+    a run that dies keeps the spans written so far. `run` tells runs
+    sharing a file apart; `python tehtris_ui.py report` aggregates files.
+    """
+
+    def __init__(self, path: Optional[Path] = None, ocr_calls: Optional[Callable[[], int]] = None,
+                 enumerations: Optional[Callable[[], int]] = None, clock: Callable[[], float] = time.perf_counter):
+        self.path = path
+        self.counters = {'ocr_calls': ocr_calls or (lambda: 0), 'enumerations': enumerations or (lambda: 0)}
+        self.clock = clock
+        self.run = uuid.uuid4().hex[:12]
+        self.host = platform.node()
+        self.spans: List[dict] = []
+        self._steps: List[str] = []
+        self._attempts: Counter = Counter()
+        self._file = None
+
+    @property
+    def current_step(self) -> Optional[str]:
+        """Name of the innermost open step span."""
+        return self._steps[-1] if self._steps else None
+
+    def step(self, name: str):
+        """Span of installer step `name`; locator attempts inside it are attributed to it."""
+        self._attempts[(name, None)] += 1
+        return self._span(name, None, None, self._attempts[(name, None)], 'ok')
+
+    def attempt(self, element: str, strategy: str):
+        """Span of one attempt at locating `element` with `strategy`; set `span['outcome'] = 'hit'` on success."""
+        step = self.current_step
+        self._attempts[(step, element)] += 1
+        return self._span(step, element, strategy, self._attempts[(step, element)], 'miss')
+
+    @contextmanager
+    def _span(self, step: Optional[str], element: Optional[str], strategy: Optional[str], attempt: int,
+              outcome: str):
+        span = {'run': self.run, 'host': self.host, 'time': round(time.time(), 3), 'step': step,
+                'element': element, 'strategy': strategy, 'attempt': attempt, 'outcome': outcome}
+        before = {name: counter() for name, counter in self.counters.items()}
+        is_step = element is None
+        if is_step:
+            self._steps.append(step)
+        start = self.clock()
+        try:
+            yield span
+        except Exception as e:
+            span['outcome'] = 'error'
+            span['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span['duration_ms'] = round((self.clock() - start) * 1000, 3)
+            for name, counter in self.counters.items():
+                span[name] = counter() - before[name]
+            if is_step:
+                self._steps.pop()
+            self.emit(span)
+
+    def emit(self, span: dict):
+        self.spans.append(span)
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(json.dumps(span) + '\n')
+            self._file.flush()
+        except OSError:
+            # Telemetry must not fail the install
+            self.path = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_spans(paths: Iterable[str]) -> Tuple[List[dict], int]:
+    """Read span files (or directories of *.jsonl files); returns (spans, unreadable lines)."""
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files += sorted(path.glob('*.jsonl')) if path.is_dir() else [path]
+    spans, skipped = [], 0
+    for file in files:
+        with open(file, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    spans.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A run killed mid-write leaves a partial last line
+                    skipped += 1
+    return spans, skipped
+
+
+def summarize_spans(spans: List[dict]) -> dict:
+    """Aggregate spans from any number of runs and hosts.
+
+    Returns the run and host counts, per-step latency (p50/p95 over step
+    spans) with failure counts, and per element and strategy the number of
+    attempts and hits; `win_rate` is hits over attempts, `share` the part
+    of the element's hits that strategy won.
+    """
+    durations: Dict[str, List[float]] = {}
+    failures: Counter = Counter()
+    attempts: Counter = Counter()
+    hits: Counter = Counter()
+    for span in spans:
+        if span.get('element') is None:
+            durations.setdefault(span['step'], []).append(span['duration_ms'])
+            if span['outcome'] != 'ok':
+                failures[span['step']] += 1
+        else:
+            key = (span['element'], span['strategy'])
+            attempts[key] += 1
+            hits[key] += span['outcome'] == 'hit'
+
+    element_hits: Counter = Counter()
+    for (element, _), count in hits.items():
+        element_hits[element] += count
+    return {
+        'runs': len({(span.get('host'), span.get('run')) for span in spans}),
+        'hosts': len({span.get('host') for span in spans}),
+        'steps': {
+            step: {'count': len(values), 'failures': failures[step],
+                   'p50_ms': percentile(values, 50), 'p95_ms': percentile(values, 95)}
+            for step, values in durations.items()
+        },
+        'strategies': {
+            f"{element} -> {strategy}": {
+                'attempts': count, 'hits': hits[(element, strategy)],
+                'win_rate': hits[(element, strategy)] / count,
+                'share': hits[(element, strategy)] / element_hits[element] if element_hits[element] else 0.0,
+            }
+            for (element, strategy), count in sorted(attempts.items())
+        },
+    }
+
+
+class StrategyTable:
+    """Hit rate and latency of each locating strategy per step and element, kept in a JSON file.
+
+    observe() folds in the locator attempt spans of a run (SpanLog.spans).
+    order() sorts the strategies available for an element by expected time
+    to success: the mean duration of an attempt over its hit rate (Laplace
+    smoothed), so a cheap strategy that sometimes works goes ahead of a
+    reliable one that costs seconds. Strategies without history follow in
+    the caller's order, and strategies that missed `demote_after` times in
+    a row come last until they hit again.
+    """
+
+    def __init__(self, path, demote_after: int = 3):
+        self.path = Path(path)
+        self.demote_after = demote_after
+        self.steps: Dict[str, Dict[str, Dict[str, dict]]] = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Dict[str, dict]]]:
+        try:
+            steps = json.loads(self.path.read_text(encoding='utf-8'))['steps']
+            return steps if isinstance(steps, dict) else {}
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def entry(self, step: Optional[str], element: str, strategy: str) -> Optional[dict]:
+        return self.steps.get(step or '', {}).get(element, {}).get(strategy)
+
+    def observe(self, spans: Iterable[dict]):
+        """Count the locator attempt spans among `spans`."""
+        for span in spans:
+            if span.get('element') is None:
+                continue
+            entry = self.steps.setdefault(span['step'] or '', {}).setdefault(span['element'], {}).setdefault(
+                span['strategy'], {'attempts': 0, 'hits': 0, 'seconds': 0.0, 'miss_streak': 0})
+            entry['attempts'] += 1
+            entry['seconds'] += span['duration_ms'] / 1000
+            if span['outcome'] == 'hit':
+                entry['hits'] += 1
+                entry['miss_streak'] = 0
+            else:
+                entry['miss_streak'] += 1
+
+    @staticmethod
+    def expected_seconds(entry: dict) -> float:
+        """Expected time until `entry`'s strategy succeeds, repeating it as needed."""
+        hit_rate = (entry['hits'] + 1) / (entry['attempts'] + 2)
+        return entry['seconds'] / entry['attempts'] / hit_rate
+
+    def order(self, step: Optional[str], element: str, strategies: List[str]) -> List[str]:
+        """Return `strategies` (in their static order) in the order to try them for `element`."""
+        known, unknown, demoted = [], [], []
+        for strategy in strategies:
+            entry = self.entry(step, element, strategy)
+            if not entry or not entry['attempts']:
+                unknown.append(strategy)
+            elif entry['miss_streak'] >= self.demote_after:
+                demoted.append(strategy)
+            else:
+                known.append((self.expected_seconds(entry), strategy))
+        known.sort(key=lambda item: item[0])
+        return [strategy for _, strategy in known] + unknown + demoted
+
+    def save(self):
+        state = {'steps': self.steps, 'updated': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        temporary.write_text(json.dumps(state, indent=2), encoding='utf-8')
+        temporary.replace(self.path)
+
+
+class StepTimer:
+    """Wall-clock duration of each installer step.
+
+    With `spans`, every step is also written as a step span.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter, spans: Optional[SpanLog] = None):
+        self.clock = clock
+        self.spans = spans
+        self.steps: List[Tuple[str, float, bool]] = []
+
+    def record(self, name: str, seconds: float, ok: bool = True):
+        self.steps.append((name, seconds, ok))
+
+    @contextmanager
+    def step(self, name: str):
+        """Time the enclosed block. The block sets `result['ok'] = False` on failure."""
+        result = {'ok': True}
+        with self.spans.step(name) if self.spans else nullcontext({}) as span:
+            start = self.clock()
+            try:
+                yield result
+            except Exception:
+                result['ok'] = False
+                raise
+            finally:
+                self.record(name, self.clock() - start, result['ok'])
+                span['outcome'] = 'ok' if result['ok'] else 'failed'
+
+    def run(self, name: str, func: Callable, *args, **kwargs):
+        """Call `func` and record its duration; a falsy return value counts as failure."""
+        with self.step(name) as result:
+            value = func(*args, **kwargs)
+            result['ok'] = bool(value)
+            return value
+
+    @property
+    def total(self) -> float:
+        return sum(seconds for _, seconds, _ in self.steps)
+
+    def report(self) -> List[str]:
+        """Return one formatted line per step followed by the total."""
+        width = max([len(name) for name, _, _ in self.steps] + [5])
+        lines = [f"{name:<{width}}  {seconds:8.2f}s  {'ok' if ok else 'FAILED'}" for name, seconds, ok in self.steps]
+        lines.append(f"{'total':<{width}}  {self.total:8.2f}s")
+        return lines
+
+
+# -- win32gui enumeration -----------------------------------------------------
+
+def normalize_caption(text: str) -> str:
+    """Lowercase a control caption and drop its '&' mnemonic markers."""
+    return text.replace('&', '').strip().lower()
+
+
+def _child_handles(api, hwnd) -> list:
+    """Return the handles of all descendants of `hwnd` in enumeration order."""
+    handles = []
+
+    def callback(child, handles):
+        handles.append(child)
+        return True
+
+    try:
+        api.EnumChildWindows(hwnd, callback, handles)
+    except Exception:
+        pass
+    return handles
+
+
+def find_setup_windows(title: str = SETUP_WINDOW_TITLE, api=None) -> list:
+    """Return the handles of visible top-level windows whose title contains `title`."""
+    api = api or win32gui
+    windows = []
+
+    def callback(hwnd, windows):
+        try:
+            if api.IsWindowVisible(hwnd) and title in api.GetWindowText(hwnd):
+                windows.append(hwnd)
+        except Exception:
+            pass
+        return True
+
+    api.EnumWindows(callback, windows)
+    return windows
+
+
+def list_controls(hwnd, api=None) -> list:
+    """Return (hwnd, class name, text, enabled) for every visible child control."""
+    api = api or win32gui
+    controls = []
+    for child in _child_handles(api, hwnd):
+        try:
+            if api.IsWindowVisible(child):
+                controls.append((child, api.GetClassName(child), api.GetWindowText(child),
+                                 bool(api.IsWindowEnabled(child))))
+        except Exception:
+            pass
+    return controls
+
+
+def find_button(text: str, title: str = SETUP_WINDOW_TITLE, enabled: bool = False, api=None) -> Optional[int]:
+    """Return the handle of a button whose caption contains `text` (ignoring '&' and case).
+
+    Enumerates every top-level window and control on each call; installer
+    steps use ControlTreeSnapshot, this is kept as the benchmark reference.
+    """
+    wanted = normalize_caption(text)
+    for window in find_setup_windows(title, api):
+        for child, class_name, caption, is_enabled in list_controls(window, api):
+            if class_name == 'Button' and wanted in normalize_caption(caption):
+                if is_enabled or not enabled:
+                    return child
+    return None
+
+
+class Control(NamedTuple):
+    """A visible child control of a setup window."""
+    hwnd: int
+    window: int
+    class_name: str
+    text: str
+    tab_index: int  # enumeration order, which follows the dialog's tab order
+
+
+class ControlTreeSnapshot:
+    """Indexed view of the controls of the setup window(s).
+
+    One EnumWindows/EnumChildWindows pass records every visible control with
+    its class and caption; lookups are then answered from `by_class`,
+    `by_caption` and `controls` (tab order) until the tree changes. Before a
+    lookup the snapshot is validated cheaply: the child handles of the known
+    setup windows and a hash of their captions are re-read, without scanning
+    every top-level window or calling GetClassName. The tree is re-enumerated
+    when that fingerprint differs, when a setup window is gone, or once it is
+    older than `max_age` seconds. `has_window()` also re-reads the top-level
+    windows, so that a setup window opened since the last enumeration is
+    noticed at once.
+
+    Lookups within `trust_for` seconds of a validation skip it; call
+    `expire()` after acting on the window to force the next validation.
+    Enabled state is not part of the fingerprint and is always read live.
+
+    `api` is the win32gui module or any object providing the same functions,
+    such as FakeWin32.
+    """
+
+    def __init__(self, title: str = SETUP_WINDOW_TITLE, api=None, max_age: float = 10.0,
+                 trust_for: float = 0.05, clock: Callable[[], float] = time.monotonic):
+        if api is None and WIN32GUI_AVAILABLE:
+            api = win32gui
+        self.api = api
+        self.title = title
+        self.max_age = max_age
+        self.trust_for = trust_for
+        self.clock = clock
+
+        self.windows: List[int] = []
+        self.controls: List[Control] = []
+        self.by_class: Dict[str, List[Control]] = {}
+        self.by_caption: Dict[str, List[Control]] = {}
+        self._fingerprint: Optional[tuple] = None
+        self._taken_at: Optional[float] = None
+        self._validated_at: Optional[float] = None
+
+        self.enumerations = 0
+        self.validations = 0
+        self.lookups = 0
+
+    def _read_window(self, window) -> Tuple[list, tuple]:
+        """Return the child handles of `window` and its fingerprint entry."""
+        children = _child_handles(self.api, window)
+        texts = []
+        for child in children:
+            try:
+                texts.append(self.api.GetWindowText(child))
+            except Exception:
+                texts.append(None)
+        return children, (window, len(children), hash(tuple(children)), hash(tuple(texts)))
+
+    def refresh(self) -> bool:
+        """Re-enumerate the setup windows and their controls. Returns True if a window was found."""
+        if self.api is None:
+            return False
+        self.enumerations += 1
+        try:
+            windows = find_setup_windows(self.title, self.api)
+        except Exception:
+            windows = []
+
+        controls = []
+        fingerprint = []
+        for window in windows:
+            children, entry = self._read_window(window)
+            fingerprint.append(entry)
+            for tab_index, child in enumerate(children):
+                try:
+                    if self.api.IsWindowVisible(child):
+                        controls.append(Control(child, window, self.api.GetClassName(child),
+                                                self.api.GetWindowText(child), tab_index))
+                except Exception:
+                    pass
+
+        self.windows = windows
+        self.controls = controls
+        self.by_class = {}
+        self.by_caption = {}
+        for control in controls:
+            self.by_class.setdefault(control.class_name, []).append(control)
+            self.by_caption.setdefault(normalize_caption(control.text), []).append(control)
+        self._fingerprint = tuple(fingerprint)
+        self._taken_at = self._validated_at = self.clock()
+        return bool(windows)
+
+    def _fingerprint_changed(self) -> bool:
+        for window, entry in zip(self.windows, self._fingerprint):
+            try:
+                if not (self.api.IsWindow(window) and self.api.IsWindowVisible(window)):
+                    return True
+            except Exception:
+                return True
+            if self._read_window(window)[1] != entry:
+                return True
+        return False
+
+    def ensure_fresh(self) -> bool:
+        """Validate the snapshot, re-enumerating if the tree changed. Returns True if a window is known."""
+        if self.api is None:
+            return False
+        now = self.clock()
+        if self._taken_at is None or now - self._taken_at > self.max_age or not self.windows:
+            return self.refresh()
+        if self._validated_at is not None and now - self._validated_at <= self.trust_for:
+            return True
+        self.validations += 1
+        if self._fingerprint_changed():
+            return self.refresh()
+        self._validated_at = now
+        return True
+
+    def expire(self):
+        """Make the next lookup validate the snapshot (after a click or keystroke)."""
+        self._validated_at = None
+
+    def invalidate(self):
+        """Make the next lookup re-enumerate the tree."""
+        self._taken_at = None
+
+    def has_window(self) -> bool:
+        """Return True while a setup window is open.
+
+        Costs one EnumWindows pass; the controls are re-enumerated only when
+        the setup windows differ from the snapshot's.
+        """
+        if self.api is None:
+            return False
+        try:
+            windows = find_setup_windows(self.title, self.api)
+        except Exception:
+            windows = []
+        if windows != self.windows:
+            return self.refresh()
+        return bool(windows) and self.ensure_fresh()
+
+    def find_button(self, text: str, enabled: bool = False, exclude: Optional[str] = None) -> Optional[Control]:
+        """Return a button whose caption contains `text` (ignoring '&' and case).
+
+        Buttons whose caption contains `exclude` ("I do not accept") are
+        skipped; with `enabled` only enabled buttons are returned.
+        """
+        self.lookups += 1
+        if not self.ensure_fresh():
+            return None
+        wanted = normalize_caption(text)
+        exact = [c for c in self.by_caption.get(wanted, ()) if c.class_name == 'Button']
+        candidates = exact or [c for c in self.by_class.get('Button', ()) if wanted in normalize_caption(c.text)]
+        for control in candidates:
+            if exclude and exclude in normalize_caption(control.text):
+                continue
+            try:
+                if enabled and not self.api.IsWindowEnabled(control.hwnd):
+                    continue
+            except Exception:
+                continue
+            return control
+        return None
+
+    def of_class(self, class_names) -> List[Control]:
+        """Return the controls of the given classes in tab order."""
+        self.lookups += 1
+        if not self.ensure_fresh():
+            return []
+        return [control for control in self.controls if control.class_name in class_names]
+
+    def signature(self) -> Optional[tuple]:
+        """Return a hashable summary of the current page (tree fingerprint and button states)."""
+        if not self.ensure_fresh():
+            return None
+        states = []
+        for control in self.by_class.get('Button', ()):
+            try:
+                states.append(bool(self.api.IsWindowEnabled(control.hwnd)))
+            except Exception:
+                states.append(None)
+        return self._fingerprint, tuple(states)
+
+    def window_rect(self) -> Optional[Tuple[int, int, int, int]]:
+        """Return the (left, top, right, bottom) rectangle of the first setup window."""
+        if not self.ensure_fresh():
+            return None
+        return self.api.GetWindowRect(self.windows[0])
+
+    def has_focus(self) -> bool:
+        """Return True if a setup window is the foreground window."""
+        return self.ensure_fresh() and self.api.GetForegroundWindow() in self.windows
+
+    @property
+    def stats(self) -> dict:
+        return {'enumerations': self.enumerations, 'validations': self.validations, 'lookups': self.lookups}
+
+
+def desktop_has_focus(api=None) -> bool:
+    """Return True once the desktop (after Win+D) is the foreground window."""
+    api = api or win32gui
+    return api.GetClassName(api.GetForegroundWindow()) in ('Progman', 'WorkerW')
+
+
+# -- UI backends -----------------------------------------------------------------
+
+class UIBackend(ABC):
+    """Window, input and screen access used by the installer scripts.
+
+    `win32` is a win32gui-compatible object used for window enumeration and
+    control text (ControlTreeSnapshot reads through it). `screen_available`
+    tells whether screenshot, click and hotkey can be used, `ocr_available`
+    whether ocr_data can. Backends must implement every abstract method, so
+    that a partial one fails when constructed rather than midway through an
+    install.
+    """
+
+    name = 'base'
+    simulated = False
+    win32 = None
+    screen_available = False
+    ocr_available = False
+
+    @abstractmethod
+    def launch(self, msi_path):
+        """Start the MSI installer UI."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def install_silently(self, msi_path, properties: Dict[str, str], log_path=None,
+                         timeout: Optional[float] = None) -> int:
+        """Install the MSI without UI (msiexec /qn) and return msiexec's exit code."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def installed_product_version(self, product_code: str) -> Optional[str]:
+        """Return the version of the installed product `product_code`, or None when it is not installed."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_admin(self) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_processes(self, name_filter: Callable[[str], bool]) -> List[Tuple[int, str, str]]:
+        """Return (pid, name, exe) of the running processes whose name passes `name_filter`.
+
+        Only those processes are queried beyond their name.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def file_description(self, path: str) -> Optional[str]:
+        """Return the FileDescription from the version info of `path`."""
+        raise NotImplementedError
+
+    def get_text(self, hwnd) -> str:
+        return self.win32.GetWindowText(hwnd)
+
+    def control_rect(self, hwnd) -> Tuple[int, int, int, int]:
+        return self.win32.GetWindowRect(hwnd)
+
+    @abstractmethod
+    def click_control(self, hwnd, synchronous: bool = False):
+        """Click a button control (BM_CLICK, or a synchronous mouse down/up)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_text(self, hwnd, text: str):
+        """Replace the text of an edit control."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def send_tab(self, hwnd):
+        """Send Tab to a control so that it validates its value and moves focus on."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def click(self, x: int, y: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def hotkey(self, *keys: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, text: str):
+        """Type `text` into the focused control."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def screenshot(self, region=None):
+        """Return a PIL image of the screen, or of `region` (left, top, width, height)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def screen_size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def ocr_data(self, image) -> dict:
+        """OCR `image` into a dictionary in the layout of pytesseract's Output.DICT."""
+        raise NotImplementedError
+
+    def warm_up_ocr(self):
+        """Get OCR ready ahead of the first ocr_data call, without waiting for it."""
+
+
+class Win32Backend(UIBackend):
+    """The Windows desktop through pywin32, pyautogui and pytesseract."""
+
+    name = 'win32'
+
+    def __init__(self):
+        self.win32 = win32gui if WIN32GUI_AVAILABLE else None
+        self.screen_available = PYAUTOGUI_AVAILABLE
+        self.ocr_available = TESSERACT_AVAILABLE
+        self._ocr_pool = None
+
+    def launch(self, msi_path):
+        return subprocess.Popen(['msiexec', '/i', str(msi_path)])
+
+    def install_silently(self, msi_path, properties: Dict[str, str], log_path=None,
+                         timeout: Optional[float] = None) -> int:
+        from tehtris_msi import msiexec_command
+        # Passed as a string: msiexec needs PROPERTY="value" quoting, which
+        # list2cmdline would not produce
+        return subprocess.run(msiexec_command(msi_path, properties, log_path), timeout=timeout).returncode
+
+    def installed_product_version(self, product_code: str) -> Optional[str]:
+        # Windows Installer registers every product under its ProductCode,
+        # with DisplayVersion set to the ProductVersion
+        try:
+            import winreg
+        except ImportError:
+            return None
+        key_path = rf"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall\{product_code}"
+        for view in (winreg.KEY_WOW64_64KEY, winreg.KEY_WOW64_32KEY):
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path, 0, winreg.KEY_READ | view) as key:
+                    return str(winreg.QueryValueEx(key, 'DisplayVersion')[0])
+            except OSError:
+                continue
+        return None
+
+    def is_admin(self) -> bool:
+        try:
+            import ctypes
+            return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        except Exception:
+            return False
+
+    def list_processes(self, name_filter: Callable[[str], bool]) -> List[Tuple[int, str, str]]:
+        import psutil
+        found = []
+        for proc in psutil.process_iter(['name']):
+            name = proc.info['name'] or ''
+            if not name_filter(name):
+                continue
+            try:
+                with proc.oneshot():
+                    found.append((proc.pid, name, proc.exe()))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+        return found
+
+    def file_description(self, path: str) -> Optional[str]:
+        import win32api
+        return win32api.GetFileVersionInfo(path, '\\StringFileInfo\\040904b0\\FileDescription')
+
+    def click_control(self, hwnd, synchronous: bool = False):
+        import win32con
+        if synchronous:
+            win32gui.SendMessage(hwnd, win32con.WM_LBUTTONDOWN, 0, 0)
+            win32gui.SendMessage(hwnd, win32con.WM_LBUTTONUP, 0, 0)
+        else:
+            win32gui.PostMessage(hwnd, win32con.BM_CLICK, 0, 0)
+
+    def set_text(self, hwnd, text: str):
+        import win32con
+        # WM_SETTEXT is synchronous, so the control holds the value once it returns
+        win32gui.SendMessage(hwnd, win32con.WM_SETTEXT, 0, "")
+        win32gui.SendMessage(hwnd, win32con.WM_SETTEXT, 0, text)
+
+    def send_tab(self, hwnd):
+        import win32con
+        win32gui.SendMessage(hwnd, win32con.WM_KEYDOWN, win32con.VK_TAB, 0)
+        win32gui.SendMessage(hwnd, win32con.WM_KEYUP, win32con.VK_TAB, 0)
+
+    def click(self, x: int, y: int):
+        load_pyautogui().click(x, y)
+
+    def hotkey(self, *keys: str):
+        load_pyautogui().hotkey(*keys)
+
+    def write(self, text: str):
+        load_pyautogui().write(text)
+
+    def screenshot(self, region=None):
+        pyautogui = load_pyautogui()
+        return pyautogui.screenshot(region=region) if region else pyautogui.screenshot()
+
+    def screen_size(self) -> Tuple[int, int]:
+        return tuple(load_pyautogui().size())
+
+    def ocr_data(self, image) -> dict:
+        # A persistent tesseract process instead of one spawn per call
+        if self._ocr_pool is None:
+            from tehtris_ocr import TesseractPool
+            self._ocr_pool = TesseractPool()
+        return self._ocr_pool.image_to_data(image)
+
+    def warm_up_ocr(self):
+        if self.ocr_available:
+            if self._ocr_pool is None:
+                from tehtris_ocr import TesseractPool
+                self._ocr_pool = TesseractPool()
+            self._ocr_pool.warm_up()
+
+
+def create_backend(name: str = 'win32', **options) -> UIBackend:
+    """Return the UI backend called `name` ('win32' or 'sim')."""
+    if name == 'win32':
+        return Win32Backend()
+    if name == 'sim':
+        from tehtris_sim import SimulatedBackend
+        return SimulatedBackend(**options)
+    raise ValueError(f"Unknown UI backend: {name}")
+
+
+# -- Agent verification ----------------------------------------------------------
+
+class AgentProcess(NamedTuple):
+    pid: int
+    name: str
+    exe: str
+    description: str
+
+
+class AgentWatcher:
+    """Polls for running TEHTRIS agent processes.
+
+    A scan only asks the backend about processes with "agent" in their name.
+    An agent matches when the FileDescription of its exe mentions TEHTRIS,
+    or, when that cannot be read (or `check_description` is off), when its
+    path does. Descriptions are cached by (exe path, mtime, size), so repeated
+    scans of the same processes cost one process listing.
+
+    start() polls on a daemon thread until an agent appears or stop() is
+    called, backing off to `max_interval` while the install runs; result()
+    wakes it up to poll every `interval` and waits for it with a timeout.
+    Without start(), result() polls in place.
+    """
+
+    def __init__(self, backend: 'UIBackend', check_description: bool = True, interval: float = 0.1,
+                 max_interval: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.backend = backend
+        self.check_description = check_description
+        self.interval = interval
+        self.max_interval = max_interval
+        self.clock = clock
+
+        self.agents: List[AgentProcess] = []
+        self.started: Optional[float] = None
+        self.found_after: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self.stats: Counter = Counter()
+        self._descriptions: Dict[tuple, Optional[str]] = {}
+        self._found = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _description(self, exe: str) -> Optional[str]:
+        try:
+            stat = os.stat(exe)
+            key = (exe, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            key = (exe, None, None)
+        if key in self._descriptions:
+            self.stats['cache_hits'] += 1
+            return self._descriptions[key]
+
+        self.stats['version_lookups'] += 1
+        try:
+            description = self.backend.file_description(exe) or None
+        except Exception:
+            description = None
+        self._descriptions[key] = description
+        return description
+
+    def scan(self) -> List[AgentProcess]:
+        """Return the TEHTRIS agent processes running now."""
+        self.stats['scans'] += 1
+        agents = []
+        for pid, name, exe in self.backend.list_processes(lambda name: 'agent' in name.lower()):
+            if not exe:
+                continue
+            self.stats['candidates'] += 1
+            description = self._description(exe) if self.check_description else None
+            if description is not None:
+                if 'tehtris' in description.lower():
+                    agents.append(AgentProcess(pid, name, exe, description))
+            elif 'tehtris' in exe.lower():
+                agents.append(AgentProcess(pid, name, exe, 'Path contains TEHTRIS'))
+        return agents
+
+    def _poll(self) -> bool:
+        """Scan once; True when done (an agent was found or processes cannot be listed)."""
+        try:
+            agents = self.scan()
+        except Exception as e:
+            # psutil missing, AccessDenied from the process listing, ...:
+            # record it for result()'s caller instead of dying silently
+            self.error = e
+            return True
+        if not agents:
+            return False
+        self.agents = agents
+        self.found_after = self.clock() - self.started
+        self._found.set()
+        return True
+
+    def start(self):
+        """Start polling on a background thread."""
+        if self._thread is not None:
+            return
+        self.started = self.clock()
+        self._thread = threading.Thread(target=self._watch, name='tehtris-agent-watcher', daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        # Back off while the install runs; once result() waits, poll every `interval`
+        delay = self.interval
+        while not self._stop.is_set() and not self._poll():
+            if not self._wake.is_set():
+                self._wake.wait(delay)
+                delay = min(delay * 1.5, self.max_interval)
+            else:
+                self._stop.wait(self.interval)
+
+    def result(self, timeout: float) -> List[AgentProcess]:
+        """Return the agents found, waiting at most `timeout` seconds for one to appear."""
+        if self._thread is None:
+            self.started = self.clock()
+            wait_until(self._poll, timeout, self.interval, self.max_interval)
+            return self.agents
+
+        deadline = self.clock() + timeout
+        self._wake.set()
+        while not self._found.is_set() and self._thread.is_alive():
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            self._found.wait(min(remaining, 0.05))
+        self.stop()
+        return self.agents
+
+    def stop(self):
+        """Stop the background poll."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_interval)
+
+
+# -- In-memory window tree -----------------------------------------------------
+
+class FakeWin32:
+    """In-memory stand-in for the win32gui functions used by the installers.
+
+    Windows form a tree of class, text, visibility, enabled state and
+    rectangle; every API call is counted in `calls` so lookup strategies can
+    be compared off Windows.
+    """
+
+    def __init__(self):
+        self.windows: Dict[int, dict] = {}
+        self.calls: Counter = Counter()
+        self.foreground: Optional[int] = None
+        self._next_hwnd = 0x1000
+
+    def add_window(self, text: str = "", class_name: str = '#32770', parent: Optional[int] = None,
+                   visible: bool = True, enabled: bool = True, rect: Tuple[int, int, int, int] = (0, 0, 0, 0)) -> int:
+        hwnd = self._next_hwnd
+        self._next_hwnd += 4
+        self.windows[hwnd] = {'parent': parent, 'class': class_name, 'text': text, 'visible': visible,
+                              'enabled': enabled, 'rect': rect}
+        return hwnd
+
+    def remove_window(self, hwnd: int):
+        """Destroy `hwnd` and its descendants."""
+        for child in [h for h, w in self.windows.items() if w['parent'] == hwnd]:
+            self.remove_window(child)
+        self.windows.pop(hwnd, None)
+        if self.foreground == hwnd:
+            self.foreground = None
+
+    def set_text(self, hwnd: int, text: str):
+        self.windows[hwnd]['text'] = text
+
+    def set_enabled(self, hwnd: int, enabled: bool):
+        self.windows[hwnd]['enabled'] = enabled
+
+    def _call(self, name: str):
+        """Count an API call; subclasses also advance their state here."""
+        self.calls[name] += 1
+
+    def _window(self, hwnd) -> dict:
+        if hwnd not in self.windows:
+            raise OSError(1400, "Invalid window handle")
+        return self.windows[hwnd]
+
+    def _descendants(self, hwnd):
+        for child in [h for h, w in self.windows.items() if w['parent'] == hwnd]:
+            yield child
+            yield from self._descendants(child)
+
+    # win32gui API
+
+    def EnumWindows(self, callback, extra):
+        self._call('EnumWindows')
+        for hwnd in [h for h, w in self.windows.items() if w['parent'] is None]:
+            if callback(hwnd, extra) is False:
+                break
+
+    def EnumChildWindows(self, hwnd, callback, extra):
+        self._call('EnumChildWindows')
+        for child in list(self._descendants(hwnd)):
+            if callback(child, extra) is False:
+                break
+
+    def GetWindowText(self, hwnd) -> str:
+        self._call('GetWindowText')
+        return self._window(hwnd)['text']
+
+    def GetClassName(self, hwnd) -> str:
+        self._call('GetClassName')
+        return self._window(hwnd)['class']
+
+    def IsWindow(self, hwnd) -> bool:
+        self._call('IsWindow')
+        return hwnd in self.windows
+
+    def IsWindowVisible(self, hwnd) -> bool:
+        self._call('IsWindowVisible')
+        return hwnd in self.windows and self.windows[hwnd]['visible']
+
+    def IsWindowEnabled(self, hwnd) -> bool:
+        self._call('IsWindowEnabled')
+        return self._window(hwnd)['enabled']
+
+    def GetWindowRect(self, hwnd) -> Tuple[int, int, int, int]:
+        self._call('GetWindowRect')
+        return self._window(hwnd)['rect']
+
+    def GetForegroundWindow(self) -> Optional[int]:
+        self._call('GetForegroundWindow')
+        return self.foreground
+
+
+# -- Benchmarks ------------------------------------------------------------------
+
+def build_fake_desktop(background_windows: int = 200, children: int = 8) -> Tuple[FakeWin32, dict]:
+    """Return a FakeWin32 desktop with unrelated windows and a setup window on its progress page."""
+    api = FakeWin32()
+    for index in range(background_windows):
+        window = api.add_window(f"Window {index}", 'ApplicationFrameWindow', visible=index % 3 == 0)
+        for child in range(children):
+            api.add_window(f"Item {child}", 'Static', parent=window)
+
+    setup = api.add_window(SETUP_WINDOW_TITLE, rect=(400, 300, 900, 690))
+    page = {
+        'title': api.add_window("Installing TEHTRIS EDR", 'Static', parent=setup),
+        'status': api.add_window("Status:", 'Static', parent=setup),
+        'progress': api.add_window("", 'msctls_progress32', parent=setup),
+        'back': api.add_window("< &Back", 'Button', parent=setup, enabled=False),
+        'next': api.add_window("&Next >", 'Button', parent=setup, enabled=False),
+        'cancel': api.add_window("Cancel", 'Button', parent=setup),
+    }
+    return api, page
+
+
+def benchmark_snapshot(background_windows: int = 200, children: int = 8, polls: int = 90,
+                       interval: float = 2.0) -> dict:
+    """Count win32gui calls for the completion poll (Finish, then Close) with and without a snapshot.
+
+    The status text changes every fifth poll, as during a real install, and
+    the clock advances `interval` seconds per poll.
+    """
+    results = {}
+    for mode in ('per_call', 'snapshot'):
+        api, page = build_fake_desktop(background_windows, children)
+        now = [0.0]
+        snapshot = ControlTreeSnapshot(api=api, clock=lambda: now[0])
+        start = time.perf_counter()
+        for poll in range(polls):
+            if poll % 5 == 0:
+                api.set_text(page['status'], f"Status: copying file {poll}")
+            for text in ("Finish", "Close"):
+                if mode == 'per_call':
+                    find_button(text, api=api)
+                else:
+                    snapshot.find_button(text, exclude='not')
+            now[0] += interval
+        elapsed = time.perf_counter() - start
+        results[mode] = {'calls': sum(api.calls.values()), 'ms': elapsed * 1000, 'stats': snapshot.stats}
+
+    return {
+        'polls': polls,
+        'windows': background_windows + 1,
+        'per_call': results['per_call'],
+        'snapshot': results['snapshot'],
+    }
+
+
+def main():
+    """Command line entry point for the UI benchmarks and the span report."""
+    parser = argparse.ArgumentParser(description="TEHTRIS installer UI helpers")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench = subparsers.add_parser('bench-snapshot', help='Compare per-call enumeration with a control-tree snapshot')
+    bench.add_argument('--windows', type=int, default=200, help='Unrelated top-level windows (default: 200)')
+    bench.add_argument('--children', type=int, default=8, help='Child controls per unrelated window (default: 8)')
+    bench.add_argument('--polls', type=int, default=90, help='Completion polls (default: 90)')
+    bench.add_argument('--interval', type=float, default=2.0, help='Seconds between polls (default: 2.0)')
+
+    report = subparsers.add_parser('report', help='Aggregate span files from any number of hosts')
+    report.add_argument('paths', nargs='+', help='Span files (*.jsonl) or directories holding them')
+    report.add_argument('--json', action='store_true', help='Print the summary as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        spans, skipped = load_spans(args.paths)
+        summary = summarize_spans(spans)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+            return
+        print(f"{len(spans)} spans from {summary['runs']} runs on {summary['hosts']} hosts"
+              + (f" ({skipped} unreadable lines skipped)" if skipped else ""))
+        if summary['steps']:
+            width = max(len(step) for step in list(summary['steps']) + ['step'])
+            print(f"\n  {'step':<{width}}  {'count':>6}  {'failed':>6}  {'p50 ms':>9}  {'p95 ms':>9}")
+            for step, entry in summary['steps'].items():
+                print(f"  {step:<{width}}  {entry['count']:6d}  {entry['failures']:6d}  "
+                      f"{entry['p50_ms']:9.1f}  {entry['p95_ms']:9.1f}")
+        if summary['strategies']:
+            width = max(len(name) for name in list(summary['strategies']) + ['element -> strategy'])
+            print(f"\n  {'element -> strategy':<{width}}  {'attempts':>8}  {'hits':>6}  {'win rate':>8}  {'share':>6}")
+            for name, entry in summary['strategies'].items():
+                print(f"  {name:<{width}}  {entry['attempts']:8d}  {entry['hits']:6d}  "
+                      f"{entry['win_rate']:8.0%}  {entry['share']:6.0%}")
+
+    elif args.command == 'bench-snapshot':
+        result = benchmark_snapshot(args.windows, args.children, args.polls, args.interval)
+        print(f"{result['polls']} polls, {result['windows']} top-level windows")
+        for mode in ('per_call', 'snapshot'):
+            entry = result[mode]
+            print(f"  {mode + ':':<10} {entry['calls']:7d} win32gui calls "
+                  f"({entry['calls'] / result['polls']:.0f}/poll), {entry['ms']:.1f} ms")
+        stats = result['snapshot']['stats']
+        print(f"  snapshot: {stats['enumerations']} enumerations, {stats['validations']} validations, "
+              f"{stats['lookups']} lookups")
+
+
+if __name__ == '__main__':
+    main()
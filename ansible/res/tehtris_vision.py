@@ -0,0 +1,1175 @@
+#!/usr/bin/env python3
+"""
+Screen capture and OCR helpers for the TEHTRIS EDR installer automation.
+
+The installer looks up several labels per wizard page ("&Next >", "Next >",
+"Suivant", ...). Running tesseract once per label is what makes the OCR
+strategy slow, so a capture is OCR'd once into an OcrFrame and every text
+query for that UI state is answered from it.
+
+Captures can be restricted to the installer window (or a sub-area of it such
+as the button strip). OCR cost grows with pixel count, so cropping a ~500x400
+wizard out of a 1920x1080 desktop is roughly a tenth of the work. Frames keep
+their capture origin and report screen coordinates either way.
+
+Polling loops put a FrameChangeDetector in front of OCR: a new capture is
+only OCR'd when its downsampled pixels differ from the previous capture of
+the same area, otherwise the previous OcrFrame keeps answering queries.
+
+When a label is not found in that frame, MultiVariantOcr can retry the same
+capture through other preprocessing variants (raw gray, Otsu-binarized, 2x
+upscaled, inverted) concurrently, taking the first variant that finds the
+label with enough confidence and cancelling the rest.
+`python tehtris_vision.py bench-ocr` compares hit rate and latency of the
+single-variant and multi-variant paths on synthetic degraded labels.
+
+Queries go through a WordIndex built from the tesseract output, which maps
+normalized words to their boxes and knows the line/block layout, so
+multi-word labels such as "Server address" match as a phrase.
+
+TemplateLocator is the fast path ahead of OCR: reference crops of the wizard
+buttons are matched with cv2.matchTemplate, which costs milliseconds where a
+tesseract pass costs hundreds of milliseconds or more.
+
+ScreenshotWriter takes debug screenshots off the critical path: captures go
+through a bounded queue to a background thread that downscales, encodes and
+writes them, dropping the oldest when the disk cannot keep up.
+FlightRecorder keeps recent frames and control-tree dumps in memory instead,
+deduplicated and capped by a byte budget, and archives them only on demand
+(the installer does so when a step fails).
+
+find_color_elements searches one capture for several HSV color ranges at
+once (one color conversion, connected-component labeling per range).
+Run `python tehtris_vision.py bench-color` to compare it with the previous
+one-contour-search-per-call implementation on synthetic frames.
+
+cv2 and numpy are imported lazily (tehtris_ui.lazy_import), on the first
+call that uses them, so importing this module stays cheap.
+
+Requirements:
+- pyautogui
+- opencv-python
+- numpy
+- pytesseract
+"""
+
+import argparse
+import atexit
+import hashlib
+import io
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# (left, top, width, height) in screen pixels
+Region = Tuple[int, int, int, int]
+
+from tehtris_ui import PYAUTOGUI_AVAILABLE, TESSERACT_AVAILABLE, lazy_import, load_pyautogui
+
+# Loaded on first use: importing cv2 (and numpy with it) is most of the
+# installer's startup time, and the win32gui path never needs it
+cv2 = lazy_import('cv2')
+np = lazy_import('numpy')
+OPENCV_AVAILABLE = cv2 is not None and np is not None
+
+VISION_AVAILABLE = OPENCV_AVAILABLE and PYAUTOGUI_AVAILABLE and TESSERACT_AVAILABLE
+
+
+# Sub-areas of the installer window as fractions (left, top, width, height).
+# The MSI wizard keeps Back/Next/Install/Finish/Cancel in its bottom strip.
+WINDOW_AREAS = {
+    'window': (0.0, 0.0, 1.0, 1.0),
+    'buttons': (0.0, 0.8, 1.0, 0.2),
+}
+
+
+def area_region(window_rect: Tuple[int, int, int, int], area: str = 'window',
+                screen_size: Optional[Tuple[int, int]] = None) -> Optional[Region]:
+    """Convert a window rectangle (left, top, right, bottom) into a capture region.
+
+    The region is clipped to the screen; None is returned when nothing of the
+    requested area is visible.
+    """
+    fx, fy, fw, fh = WINDOW_AREAS[area]
+    left, top, right, bottom = window_rect
+    width, height = right - left, bottom - top
+
+    x0 = left + int(width * fx)
+    y0 = top + int(height * fy)
+    x1 = x0 + int(round(width * fw))
+    y1 = y0 + int(round(height * fh))
+
+    if screen_size:
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, screen_size[0]), min(y1, screen_size[1])
+
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def capture_screen(region: Optional[Region] = None, screenshot=None):
+    """Grab the screen, or only `region` of it, as an RGB array plus its origin.
+
+    `screenshot` is a pyautogui.screenshot-compatible callable (a UI backend's
+    screenshot method); pyautogui is used by default.
+    """
+    screenshot = screenshot or load_pyautogui().screenshot
+    if region:
+        return np.array(screenshot(region=region)), (region[0], region[1])
+    return np.array(screenshot()), (0, 0)
+
+
+def tesseract_image_to_data(image) -> dict:
+    """Run tesseract over `image` and return its word table as a dictionary.
+
+    Uses this process's persistent engine from tehtris_ocr (libtesseract
+    with its language data loaded once, or the tesseract command).
+    """
+    from tehtris_ocr import image_to_data
+    return image_to_data(image)
+
+
+class ColorElement(NamedTuple):
+    """Connected region of a color range, in screen coordinates."""
+    center: Tuple[int, int]
+    area: int
+    box: Tuple[int, int, int, int]
+
+
+def find_color_elements(image_rgb, color_ranges: Dict[str, dict], min_area: int = 100,
+                        downscale: float = 1.0, origin: Tuple[int, int] = (0, 0)) -> Dict[str, List[ColorElement]]:
+    """Find the regions of every HSV color range in a single pass over the capture.
+
+    `color_ranges` maps a name to {'lower': [h, s, v], 'upper': [h, s, v]}.
+    The capture is converted to HSV once (optionally after downscaling by
+    `downscale`), each range is labeled with connectedComponentsWithStats and
+    components are filtered by area with NumPy. Labeling is restricted to the
+    bounding rectangle of the matching pixels and skipped for empty masks.
+    Results per name are sorted by decreasing area; areas and boxes are
+    reported at full resolution.
+    """
+    if downscale != 1.0:
+        # Nearest neighbour keeps the exact UI colors instead of blending edges
+        image_rgb = cv2.resize(image_rgb, None, fx=downscale, fy=downscale, interpolation=cv2.INTER_NEAREST)
+    hsv = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2HSV)
+
+    scaled_min_area = min_area * downscale * downscale
+    results = {}
+    for name, color_range in color_ranges.items():
+        mask = cv2.inRange(hsv, np.array(color_range['lower']), np.array(color_range['upper']))
+        roi_x, roi_y, roi_w, roi_h = cv2.boundingRect(mask)
+        if roi_w * roi_h <= scaled_min_area:
+            results[name] = []
+            continue
+
+        # 16-bit labels are several times faster to write than the default 32-bit
+        roi = mask[roi_y:roi_y + roi_h, roi_x:roi_x + roi_w]
+        try:
+            _, _, stats, centroids = cv2.connectedComponentsWithStats(roi, connectivity=8, ltype=cv2.CV_16U)
+        except cv2.error:
+            _, _, stats, centroids = cv2.connectedComponentsWithStats(roi, connectivity=8)
+
+        # Label 0 is the background
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = np.nonzero(areas > scaled_min_area)[0]
+        keep = keep[np.argsort(-areas[keep], kind='stable')] + 1
+
+        elements = []
+        for label in keep:
+            x, y, w, h, area = stats[label]
+            x, y = x + roi_x, y + roi_y
+            cx, cy = centroids[label][0] + roi_x, centroids[label][1] + roi_y
+            elements.append(ColorElement(
+                center=(origin[0] + int(cx / downscale), origin[1] + int(cy / downscale)),
+                area=int(area / (downscale * downscale)),
+                box=(origin[0] + int(x / downscale), origin[1] + int(y / downscale),
+                     int(w / downscale), int(h / downscale)),
+            ))
+        results[name] = elements
+    return results
+
+
+def find_color_element_contours(image_rgb, color_range: dict, min_area: int = 100) -> Optional[Tuple[int, int]]:
+    """Previous per-call implementation (RGB->BGR->HSV, contours, sort by area).
+
+    Kept as the reference for `bench-color`.
+    """
+    screenshot_bgr = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR)
+    hsv = cv2.cvtColor(screenshot_bgr, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, np.array(color_range['lower']), np.array(color_range['upper']))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        if cv2.contourArea(contour) > min_area:
+            M = cv2.moments(contour)
+            if M["m00"] != 0:
+                return (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+    return None
+
+
+def preprocess_for_ocr(image_rgb):
+    """Convert an RGB capture into the grayscale, contrast-boosted image fed to tesseract."""
+    gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+    return cv2.convertScaleAbs(gray, alpha=1.5, beta=30)
+
+
+# Preprocessing recipes for multi-variant OCR; 'contrast' is preprocess_for_ocr
+OCR_VARIANTS = ('contrast', 'gray', 'otsu', 'upscaled', 'inverted')
+
+
+def preprocess_variant(image_rgb, variant: str):
+    """Return the `variant` preprocessing of an RGB capture and its scale relative to the capture."""
+    if variant == 'contrast':
+        return preprocess_for_ocr(image_rgb), 1.0
+    gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+    if variant == 'gray':
+        return gray, 1.0
+    if variant == 'otsu':
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1], 1.0
+    if variant == 'upscaled':
+        return cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC), 2.0
+    if variant == 'inverted':
+        return cv2.bitwise_not(gray), 1.0
+    raise ValueError(f"Unknown OCR variant: {variant}")
+
+
+def scale_ocr_data(data: dict, scale: float) -> dict:
+    """Map OCR boxes of an image scaled by `scale` back to the original image."""
+    scaled = dict(data)
+    for key in ('left', 'top', 'width', 'height'):
+        scaled[key] = [int(round(value / scale)) for value in data[key]]
+    return scaled
+
+
+# Set in each process pool worker: the id of the last search that was
+# cancelled, shared with the parent
+_cancelled_search = None
+
+
+def _init_ocr_worker(cancelled):
+    global _cancelled_search
+    _cancelled_search = cancelled
+
+
+def _warm_up_worker() -> bool:
+    return True
+
+
+def _ocr_variant(image_rgb, variant: str, image_to_data, search: int, cancelled=None) -> Optional[dict]:
+    """Preprocess and OCR one variant; None when the search was cancelled before OCR started."""
+    cancelled = cancelled if cancelled is not None else _cancelled_search
+    image, scale = preprocess_variant(image_rgb, variant)
+    if cancelled is not None and cancelled.value >= search:
+        return None
+    data = image_to_data(image)
+    return scale_ocr_data(data, scale) if scale != 1.0 else data
+
+
+class VariantMatch(NamedTuple):
+    """First confident match of a multi-variant OCR search."""
+    text: str
+    position: Tuple[int, int]
+    variant: str
+    seconds: float
+
+
+class MultiVariantOcr:
+    """OCR of one capture through several preprocessing variants at once.
+
+    find() submits one task per variant and returns the first confident
+    match. Variants still queued are cancelled; variants already running
+    skip OCR if it has not started yet, and are otherwise left to finish
+    with their result ignored.
+
+    tesseract (the default `image_to_data`) runs in a process pool; other
+    callables, such as a simulated backend's ocr_data, run in a thread pool
+    because they may not be picklable. The pool starts on first use or on
+    warm_up().
+    """
+
+    def __init__(self, image_to_data=None, variants=OCR_VARIANTS, workers: Optional[int] = None,
+                 processes: Optional[bool] = None):
+        self.image_to_data = image_to_data or tesseract_image_to_data
+        self.variants = tuple(variants)
+        self.workers = workers or len(self.variants)
+        self.processes = image_to_data is None if processes is None else processes
+        self.stats: Counter = Counter()
+        self._executor = None
+        self._cancelled = None
+        self._searches = 0
+
+    def _pool(self):
+        if self._executor is None:
+            # multiprocessing is imported here, not at startup: only this pool needs it
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._cancelled = multiprocessing.Value('q', 0)
+            if self.processes:
+                self._executor = ProcessPoolExecutor(self.workers, initializer=_init_ocr_worker,
+                                                     initargs=(self._cancelled,))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='tehtris-ocr')
+        return self._executor
+
+    def warm_up(self):
+        """Start the pool workers in the background, ahead of the first search."""
+        pool = self._pool()
+        for _ in range(self.workers):
+            pool.submit(_warm_up_worker)
+
+    def find(self, image_rgb, texts: List[str], origin: Tuple[int, int] = (0, 0), confidence: float = 0.8,
+             variants=None, timeout: Optional[float] = None) -> Optional[VariantMatch]:
+        """Return the first match of any of `texts` in any variant of `image_rgb`, in screen coordinates."""
+        pool = self._pool()
+        self._searches += 1
+        search = self._searches
+        self.stats['searches'] += 1
+        shared = None if self.processes else self._cancelled
+        start = time.perf_counter()
+        futures = {
+            pool.submit(_ocr_variant, image_rgb, variant, self.image_to_data, search, shared): variant
+            for variant in (variants or self.variants)
+        }
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                try:
+                    data = future.result()
+                except Exception:
+                    self.stats['errors'] += 1
+                    continue
+                if data is None:
+                    continue
+                self.stats['ocr_calls'] += 1
+                frame = OcrFrame(data, origin=origin)
+                for text in texts:
+                    position = frame.find_text(text, confidence)
+                    if position:
+                        variant = futures[future]
+                        self.stats[f"hits.{variant}"] += 1
+                        return VariantMatch(text, position, variant, time.perf_counter() - start)
+        except FutureTimeoutError:
+            self.stats['timeouts'] += 1
+        finally:
+            with self._cancelled.get_lock():
+                self._cancelled.value = search
+            for future in futures:
+                future.cancel()
+        self.stats['misses'] += 1
+        return None
+
+    def close(self):
+        """Stop the pool without waiting for running variants."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class FrameChangeDetector:
+    """Cheap pixel-level change check used to skip redundant OCR passes.
+
+    Each capture is reduced to a small grayscale thumbnail and compared with
+    the previous thumbnail recorded under the same key (usually the capture
+    area). A frame counts as changed when more than `min_changed_pixels`
+    thumbnail pixels differ by more than `pixel_threshold` gray levels.
+    """
+
+    def __init__(self, scale: float = 0.25, pixel_threshold: int = 16, min_changed_pixels: int = 0):
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_pixels = min_changed_pixels
+        self._last = {}
+
+        # Counters
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.ocr_calls = 0
+
+    def thumbnail(self, image_rgb):
+        """Downsample an RGB capture to the grayscale thumbnail used for comparison."""
+        gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape
+        size = (max(1, int(width * self.scale)), max(1, int(height * self.scale)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def has_changed(self, image_rgb, key=None) -> bool:
+        """Record a capture under `key` and report whether it differs from the previous one."""
+        self.frames_seen += 1
+        thumb = self.thumbnail(image_rgb)
+        previous = self._last.get(key)
+        self._last[key] = thumb
+
+        if previous is None or previous.shape != thumb.shape:
+            return True
+
+        diff = cv2.absdiff(previous, thumb)
+        return int(np.count_nonzero(diff > self.pixel_threshold)) > self.min_changed_pixels
+
+    def record_skip(self):
+        """Count a capture whose OCR pass was skipped."""
+        self.frames_skipped += 1
+
+    def record_ocr(self):
+        """Count an OCR pass."""
+        self.ocr_calls += 1
+
+    def reset(self, key=None):
+        """Forget the previous capture for `key`, or for every key when None."""
+        if key is None:
+            self._last.clear()
+        else:
+            self._last.pop(key, None)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_skipped': self.frames_skipped,
+            'ocr_calls': self.ocr_calls,
+        }
+
+
+def normalize_word(word: str) -> str:
+    """Lowercase a word and strip accelerator ampersands and surrounding punctuation."""
+    return re.sub(r"[^\w'-]+", '', word.replace('&', '').lower()).strip("'-")
+
+
+class WordIndex:
+    """Inverted index over `pytesseract.image_to_data` output.
+
+    Words are indexed by their normalized text and grouped by line and block
+    (tesseract's block_num/par_num/line_num), which allows phrase lookups
+    with adjacency checks. Boxes are (left, top, width, height) in the
+    coordinates of the OCR'd image.
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.words: Dict[str, List[int]] = {}
+        self.lines: Dict[Tuple[int, int, int], List[int]] = {}
+        self.blocks: Dict[int, List[Tuple[int, int, int]]] = {}
+        self._position: Dict[int, Tuple[Tuple[int, int, int], int]] = {}
+
+        for i, text in enumerate(data['text']):
+            if not text.strip():
+                continue
+            word = normalize_word(text)
+            if word:
+                self.words.setdefault(word, []).append(i)
+
+            line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            line = self.lines.setdefault(line_key, [])
+            self._position[i] = (line_key, len(line))
+            line.append(i)
+            if len(line) == 1:
+                self.blocks.setdefault(line_key[0], []).append(line_key)
+
+    def box(self, i: int) -> Tuple[int, int, int, int]:
+        data = self.data
+        return (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+
+    def conf(self, i: int) -> float:
+        return float(self.data['conf'][i])
+
+    def lookup(self, word: str) -> List[int]:
+        """Return entries whose normalized text is `word`, or contains it when there is no exact match."""
+        word = normalize_word(word)
+        if not word:
+            return []
+        if word in self.words:
+            return self.words[word]
+        return sorted(i for key, entries in self.words.items() if word in key for i in entries)
+
+    def find_phrase(self, phrase: str, min_conf: float = 0.0) -> Optional[Tuple[int, int, int, int]]:
+        """Return the union box of the first occurrence of `phrase` on a single line.
+
+        Every word of the phrase must be recognised above `min_conf` (0-100)
+        and follow the previous one directly on the same line. Words made
+        only of punctuation (e.g. the ">" in "Next >") are not required, but
+        an occurrence that has them ("Next >" rather than the "Next" of
+        "Click Next to continue") is preferred, and one that starts its line
+        (the "Install" button rather than "Ready to install") most of all.
+        """
+        tokens = [t for t in (normalize_word(w) for w in phrase.split()) if t]
+        if not tokens:
+            return None
+        literal = ''.join(phrase.replace('&', '').lower().split())
+        exact_match = None
+        loose_match = None
+
+        for start in self.lookup(tokens[0]):
+            if self.conf(start) <= min_conf:
+                continue
+
+            line_key, pos = self._position[start]
+            # Following words on the same line, ignoring punctuation-only entries
+            following = (i for i in self.lines[line_key][pos + 1:] if normalize_word(self.data['text'][i]))
+            matched = [start]
+            for token in tokens[1:]:
+                i = next(following, None)
+                if i is None:
+                    break
+                word = normalize_word(self.data['text'][i])
+                if (token != word and token not in word) or self.conf(i) <= min_conf:
+                    break
+                matched.append(i)
+
+            if len(matched) == len(tokens):
+                line_text = ''.join(self.data['text'][i] for i in self.lines[line_key][pos:])
+                if literal == ''.join(tokens) or line_text.replace('&', '').lower().startswith(literal):
+                    if not any(normalize_word(self.data['text'][i]) for i in self.lines[line_key][:pos]):
+                        return self.union_box(matched)
+                    exact_match = exact_match or self.union_box(matched)
+                loose_match = loose_match or self.union_box(matched)
+
+        return exact_match or loose_match
+
+    def union_box(self, entries: List[int]) -> Tuple[int, int, int, int]:
+        boxes = [self.box(i) for i in entries]
+        left = min(b[0] for b in boxes)
+        top = min(b[1] for b in boxes)
+        right = max(b[0] + b[2] for b in boxes)
+        bottom = max(b[1] + b[3] for b in boxes)
+        return (left, top, right - left, bottom - top)
+
+    def line_texts(self) -> List[str]:
+        """Return the text of every line, in reading order."""
+        return [' '.join(self.data['text'][i] for i in self.lines[key]) for key in sorted(self.lines)]
+
+    def block_texts(self) -> List[str]:
+        """Return the text of every block, lines joined by newlines."""
+        return [
+            '\n'.join(' '.join(self.data['text'][i] for i in self.lines[key]) for key in sorted(keys))
+            for _, keys in sorted(self.blocks.items())
+        ]
+
+
+class OcrFrame:
+    """OCR result of a single screen capture.
+
+    Holds the `pytesseract.image_to_data` dictionary for one UI state so that
+    any number of text queries can be answered without another screenshot or
+    tesseract run. Coordinates returned are screen coordinates.
+    """
+
+    def __init__(self, data: dict, origin: Tuple[int, int] = (0, 0), image=None,
+                 region: Optional[Region] = None):
+        self.data = data
+        self.origin = origin
+        self.image = image
+        self.region = region
+        self.captured_at = time.time()
+        self.queries = 0
+        self._index: Optional[WordIndex] = None
+
+    @classmethod
+    def capture(cls, region: Optional[Region] = None, image_to_data=None, screenshot=None) -> 'OcrFrame':
+        """Take a screenshot (of `region` only, if given) and run a single OCR pass over it."""
+        screenshot_np, origin = capture_screen(region, screenshot)
+        return cls.from_image(screenshot_np, origin, region, image_to_data)
+
+    @classmethod
+    def from_image(cls, image_rgb, origin: Tuple[int, int] = (0, 0), region: Optional[Region] = None,
+                   image_to_data=None) -> 'OcrFrame':
+        """Run a single OCR pass over an existing RGB capture.
+
+        `image_to_data` maps the preprocessed image to a dictionary in the
+        layout of pytesseract's Output.DICT; tesseract is used by default.
+        """
+        image_to_data = image_to_data or tesseract_image_to_data
+
+        enhanced = preprocess_for_ocr(image_rgb)
+        data = image_to_data(enhanced)
+        return cls(data, origin=origin, image=image_rgb, region=region)
+
+    @property
+    def age(self) -> float:
+        """Seconds since the frame was captured."""
+        return time.time() - self.captured_at
+
+    @property
+    def index(self) -> WordIndex:
+        """Word index over the OCR output, built on first use."""
+        if self._index is None:
+            self._index = WordIndex(self.data)
+        return self._index
+
+    def find_box(self, text: str, confidence: float = 0.8) -> Optional[Tuple[int, int, int, int]]:
+        """Return the screen box (left, top, width, height) of `text`, or None."""
+        self.queries += 1
+        box = self.index.find_phrase(text, min_conf=confidence * 100)
+        if box is None:
+            return None
+        return (self.origin[0] + box[0], self.origin[1] + box[1], box[2], box[3])
+
+    def find_text(self, text: str, confidence: float = 0.8) -> Optional[Tuple[int, int]]:
+        """Return the center of `text` (a word or a phrase on one line), or None."""
+        box = self.find_box(text, confidence)
+        if box is None:
+            return None
+        return (box[0] + box[2] // 2, box[1] + box[3] // 2)
+
+    def text_lines(self) -> list:
+        """Return the recognised words grouped into lines, top to bottom."""
+        return self.index.line_texts()
+
+
+class TemplateMatch(NamedTuple):
+    """Result of a template search, in screen coordinates."""
+    name: str
+    center: Tuple[int, int]
+    box: Tuple[int, int, int, int]
+    confidence: float
+    scale: float
+
+
+class TemplateLocator:
+    """Locate wizard buttons from reference crops with multi-scale template matching.
+
+    Templates are PNG crops stored as `<template_dir>/<name>.png` (e.g.
+    next.png, install.png, finish.png, accept.png). They are loaded once,
+    converted to grayscale and pre-scaled for every entry of `scales`.
+
+    The search is coarse-to-fine: each scaled template is first matched on a
+    half-resolution level of the image pyramid, then the best candidate is
+    refined at full resolution in a small window around it.
+    """
+
+    def __init__(self, template_dir, scales=(1.0, 0.9, 1.1, 0.8, 1.25), threshold: float = 0.85):
+        self.template_dir = Path(template_dir)
+        self.scales = scales
+        self.threshold = threshold
+        self._templates: Dict[str, list] = {}
+        self._loaded = False
+
+    @property
+    def names(self) -> List[str]:
+        self.load()
+        return sorted(self._templates)
+
+    def load(self, reload: bool = False):
+        """Load and preprocess every template of the bundle (once)."""
+        if self._loaded and not reload:
+            return
+        self._templates = {}
+        if self.template_dir.is_dir():
+            for path in sorted(self.template_dir.glob('*.png')):
+                image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+                if image is not None:
+                    self._add(path.stem.lower(), image)
+        self._loaded = True
+
+    def _add(self, name: str, gray):
+        variants = []
+        for scale in self.scales:
+            tpl = gray if scale == 1.0 else cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            small = cv2.pyrDown(tpl) if min(tpl.shape) >= 16 else None
+            variants.append((scale, tpl, small))
+        self._templates[name] = variants
+
+    def learn(self, name: str, image_rgb, box: Tuple[int, int, int, int]) -> bool:
+        """Save a crop of `image_rgb` as the template `name` unless one already exists."""
+        self.load()
+        name = name.lower()
+        left, top, width, height = box
+        if name in self._templates or width < 4 or height < 4:
+            return False
+
+        crop = cv2.cvtColor(image_rgb[top:top + height, left:left + width], cv2.COLOR_RGB2GRAY)
+        self.template_dir.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(self.template_dir / f"{name}.png"), crop)
+        self._add(name, crop)
+        return True
+
+    def locate(self, image_rgb, names: List[str], origin: Tuple[int, int] = (0, 0)) -> Optional[TemplateMatch]:
+        """Return the best match above `threshold` among the templates `names`."""
+        self.load()
+        names = [n.lower() for n in names if n.lower() in self._templates]
+        if not names:
+            return None
+
+        gray = cv2.cvtColor(image_rgb, cv2.COLOR_RGB2GRAY)
+        gray_small = cv2.pyrDown(gray)
+
+        best = None
+        for name in names:
+            for scale, tpl, small in self._templates[name]:
+                match = self._match(gray, gray_small, tpl, small)
+                if match and (best is None or match[0] > best[0]):
+                    best = (match[0], match[1], tpl.shape, name, scale)
+
+        if best is None or best[0] < self.threshold:
+            return None
+
+        confidence, (x, y), (height, width), name, scale = best
+        box = (origin[0] + x, origin[1] + y, width, height)
+        center = (box[0] + width // 2, box[1] + height // 2)
+        return TemplateMatch(name, center, box, confidence, scale)
+
+    @staticmethod
+    def _match(gray, gray_small, tpl, small):
+        """Coarse-to-fine match of one template; returns (score, (x, y)) or None."""
+        height, width = tpl.shape
+        if height > gray.shape[0] or width > gray.shape[1]:
+            return None
+
+        if small is None or small.shape[0] > gray_small.shape[0] or small.shape[1] > gray_small.shape[1]:
+            result = cv2.matchTemplate(gray, tpl, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(result)
+            return score, loc
+
+        # Coarse search at half resolution
+        result = cv2.matchTemplate(gray_small, small, cv2.TM_CCOEFF_NORMED)
+        _, _, _, (cx, cy) = cv2.minMaxLoc(result)
+
+        # Refine at full resolution around the candidate
+        margin = 4
+        x0, y0 = max(cx * 2 - margin, 0), max(cy * 2 - margin, 0)
+        x1 = min(cx * 2 + width + margin, gray.shape[1])
+        y1 = min(cy * 2 + height + margin, gray.shape[0])
+        result = cv2.matchTemplate(gray[y0:y1, x0:x1], tpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (rx, ry) = cv2.minMaxLoc(result)
+        return score, (x0 + rx, y0 + ry)
+
+
+class ScreenshotWriter:
+    """Encode and write debug screenshots on a background thread.
+
+    submit() puts a captured image on a bounded queue and returns at once, so
+    polling loops never wait on PNG compression or the disk. When the queue
+    is full the oldest pending capture is dropped (or, with
+    drop_oldest=False, the new one). Captures can be downscaled and written
+    as PNG, JPEG or raw NumPy arrays (.npy, no encoding at all).
+
+    close() flushes the queue and stops the thread; it also runs at exit.
+    """
+
+    FORMATS = {'png': 'png', 'jpeg': 'jpg', 'npy': 'npy'}
+
+    def __init__(self, directory: Path, max_queue: int = 8, drop_oldest: bool = True,
+                 scale: float = 1.0, image_format: str = 'png', jpeg_quality: int = 85):
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unknown screenshot format: {image_format}")
+        self.directory = Path(directory)
+        self.max_queue = max_queue
+        self.drop_oldest = drop_oldest
+        self.scale = scale
+        self.image_format = image_format
+        self.jpeg_quality = jpeg_quality
+
+        self._queue = deque()
+        self._busy = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+        # Counters
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.encode_seconds = 0.0
+        self.max_encode_seconds = 0.0
+        self.max_submit_seconds = 0.0
+
+    def submit(self, image, name: str) -> Optional[Path]:
+        """Queue `image` to be written as `name` plus the format's extension.
+
+        Returns the path the capture will be written to, or None when it was
+        dropped.
+        """
+        start = time.perf_counter()
+        path = self.directory / f"{name}.{self.FORMATS[self.image_format]}"
+        with self._condition:
+            if self._closed:
+                return None
+            if self._thread is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name='screenshot-writer', daemon=True)
+                self._thread.start()
+
+            self.submitted += 1
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if not self.drop_oldest:
+                    return None
+                self._queue.popleft()
+
+            self._queue.append((image, path, self.scale, self.image_format))
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._condition.notify_all()
+
+        self.max_submit_seconds = max(self.max_submit_seconds, time.perf_counter() - start)
+        return path
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                image, path, scale, image_format = self._queue.popleft()
+                self._busy = True
+
+            start = time.perf_counter()
+            try:
+                self._write(image, path, scale, image_format)
+                ok = True
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+
+            with self._condition:
+                self._busy = False
+                if ok:
+                    self.written += 1
+                    self.encode_seconds += elapsed
+                    self.max_encode_seconds = max(self.max_encode_seconds, elapsed)
+                else:
+                    self.failed += 1
+                self._condition.notify_all()
+
+    def _write(self, image, path: Path, scale: float, image_format: str):
+        if scale != 1.0:
+            width, height = image.size
+            image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))))
+        if image_format == 'npy':
+            import numpy
+            numpy.save(path, numpy.asarray(image))
+        elif image_format == 'jpeg':
+            image.convert('RGB').save(path, quality=self.jpeg_quality)
+        else:
+            image.save(path)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued capture has been written; False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Flush the queue and stop the writer thread."""
+        self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        atexit.unregister(self.close)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'submitted': self.submitted,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'mean_encode_ms': self.encode_seconds / self.written * 1000 if self.written else 0.0,
+            'max_encode_ms': self.max_encode_seconds * 1000,
+            'max_submit_ms': self.max_submit_seconds * 1000,
+        }
+
+
+class FlightRecorder:
+    """Ring buffer of recent frames and control-tree dumps, kept in memory.
+
+    Frames are stored as raw (downscaled by `scale`) pixels and control-tree
+    dumps as text. A record identical to the newest one of its kind only
+    increments that entry's repeat count, so a polling loop staring at an
+    unchanged page costs one entry. The oldest entries are evicted once the
+    buffer holds more than `max_bytes` of payload or `max_entries` entries.
+
+    Nothing touches the disk until dump() writes the buffer to a zip
+    archive (frames as PNG, plus a manifest).
+    """
+
+    def __init__(self, max_bytes: int = 32 * 2 ** 20, max_entries: int = 100, scale: float = 0.5):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.scale = scale
+        self._entries = deque()
+        self._newest = {}  # kind -> newest entry of that kind
+        self.bytes = 0
+
+        # Counters
+        self.recorded = 0
+        self.deduplicated = 0
+        self.evicted = 0
+
+    def record_frame(self, image, label: str) -> bool:
+        """Record a PIL image; returns False when it repeated the previous frame."""
+        if self.scale != 1.0:
+            width, height = image.size
+            image = image.resize((max(1, int(width * self.scale)), max(1, int(height * self.scale))))
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        return self._record('frame', label, image.tobytes(), {'size': image.size, 'mode': image.mode})
+
+    def record_text(self, kind: str, label: str, text: str) -> bool:
+        """Record a text dump (e.g. kind='controls'); returns False when it repeated the previous one."""
+        return self._record(kind, label, text.encode('utf-8'), {})
+
+    def _record(self, kind: str, label: str, data: bytes, meta: dict) -> bool:
+        now = time.time()
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        newest = self._newest.get(kind)
+        if newest is not None and newest['digest'] == digest:
+            newest['repeats'] += 1
+            newest['last_seen'] = now
+            self.deduplicated += 1
+            return False
+
+        entry = {'kind': kind, 'label': label, 'time': now, 'last_seen': now, 'repeats': 0,
+                 'digest': digest, 'data': data, 'meta': meta}
+        self._entries.append(entry)
+        self._newest[kind] = entry
+        self.bytes += len(data)
+        self.recorded += 1
+
+        while self._entries and (self.bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            oldest = self._entries.popleft()
+            self.bytes -= len(oldest['data'])
+            self.evicted += 1
+            if self._newest.get(oldest['kind']) is oldest:
+                del self._newest[oldest['kind']]
+        return True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._newest.clear()
+        self.bytes = 0
+
+    def dump(self, path: Path, reason: str = '') -> Path:
+        """Write the buffer to the zip archive `path` and return it."""
+        import zipfile
+        from PIL import Image
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        manifest = [f"reason: {reason}", f"entries: {len(self._entries)} ({self.evicted} older evicted)", ""]
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for number, entry in enumerate(self._entries):
+                stamp = time.strftime('%H%M%S', time.localtime(entry['time']))
+                name = f"{number:03d}_{stamp}_{entry['kind']}_{entry['label']}"
+                if entry['kind'] == 'frame':
+                    image = Image.frombytes(entry['meta']['mode'], entry['meta']['size'], entry['data'])
+                    buffer = io.BytesIO()
+                    image.save(buffer, 'PNG')
+                    name += '.png'
+                    # PNG is already compressed
+                    archive.writestr(name, buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+                else:
+                    name += '.txt'
+                    archive.writestr(name, entry['data'])
+                last_seen = time.strftime('%H:%M:%S', time.localtime(entry['last_seen']))
+                manifest.append(f"{name}  repeated {entry['repeats']}x, last seen {last_seen}")
+            archive.writestr('manifest.txt', '\n'.join(manifest) + '\n')
+        return path
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'recorded': self.recorded,
+            'deduplicated': self.deduplicated,
+            'evicted': self.evicted,
+        }
+
+
+# Synthetic UI colors used by bench-color, as (name, RGB, HSV range)
+BENCH_COLORS = [
+    ('primary_button', (0, 120, 215), {'lower': [100, 200, 150], 'upper': [110, 255, 255]}),
+    ('checkbox', (16, 124, 16), {'lower': [55, 200, 100], 'upper': [65, 255, 150]}),
+    ('warning', (255, 185, 0), {'lower': [18, 200, 200], 'upper': [24, 255, 255]}),
+    ('error', (232, 17, 35), {'lower': [175, 200, 200], 'upper': [180, 255, 255]}),
+]
+
+
+def synthetic_color_frame(width: int = 1920, height: int = 1080, seed: int = 0):
+    """Build a desktop-like frame with a few rectangles of every BENCH_COLORS color."""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 240, np.uint8)
+    # Some gray UI noise that matches none of the ranges
+    for _ in range(40):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(0, height - 100))
+        shade = int(rng.integers(180, 250))
+        frame[y:y + int(rng.integers(10, 100)), x:x + int(rng.integers(10, 200))] = shade
+    for _, rgb, _ in BENCH_COLORS:
+        for _ in range(3):
+            x, y = int(rng.integers(0, width - 120)), int(rng.integers(0, height - 40))
+            frame[y:y + int(rng.integers(12, 40)), x:x + int(rng.integers(20, 120))] = rgb
+    return frame
+
+
+def benchmark_color_detection(frames: int = 10, width: int = 1920, height: int = 1080,
+                              downscale: float = 1.0) -> dict:
+    """Time per-range contour searches against one batched search over synthetic frames."""
+    images = [synthetic_color_frame(width, height, seed) for seed in range(frames)]
+    color_ranges = {name: color_range for name, _, color_range in BENCH_COLORS}
+
+    start = time.perf_counter()
+    per_call = [
+        {name: find_color_element_contours(image, color_range) for name, color_range in color_ranges.items()}
+        for image in images
+    ]
+    per_call_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = [find_color_elements(image, color_ranges, downscale=downscale) for image in images]
+    batched_time = time.perf_counter() - start
+
+    # Compare the largest element per range with the contour implementation.
+    # Near-ties can legitimately differ: contours measure polygon area, the
+    # batched search counts pixels.
+    mismatches = 0
+    for legacy, result in zip(per_call, batched):
+        for name, center in legacy.items():
+            found = result[name][0].center if result[name] else None
+            if (center is None) != (found is None) or (
+                    center and max(abs(center[0] - found[0]), abs(center[1] - found[1])) > 2 / downscale):
+                mismatches += 1
+
+    return {
+        'frames': frames,
+        'ranges': len(color_ranges),
+        'per_call_ms': per_call_time * 1000 / frames,
+        'batched_ms': batched_time * 1000 / frames,
+        'speedup': per_call_time / batched_time if batched_time else float('inf'),
+        'mismatches': mismatches,
+    }
+
+
+BENCH_LABELS = ['Next', 'Install', 'Finish', 'Server address', 'License key', 'I accept the terms']
+
+# Degradations seen on real desktops: (text gray, background gray, font size, noise sigma)
+BENCH_STYLES = {
+    'plain': (0, 240, 15, 0),
+    'low-contrast': (150, 185, 15, 0),
+    'dark-theme': (230, 35, 15, 0),
+    'small': (40, 240, 9, 0),
+    'noisy': (60, 200, 13, 18),
+}
+
+
+def synthetic_label_frame(label: str, style: str, seed: int = 0):
+    """Render `label` on a wizard-sized strip in one of the BENCH_STYLES."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    text_gray, background, size, noise = BENCH_STYLES[style]
+    try:
+        font = ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        try:
+            font = ImageFont.truetype('arial.ttf', size)
+        except OSError:
+            font = ImageFont.load_default()
+    image = Image.new('RGB', (500, 80), (background,) * 3)
+    ImageDraw.Draw(image).text((20 + seed % 7 * 10, 30), label, fill=(text_gray,) * 3, font=font)
+    frame = np.array(image)
+    if noise:
+        rng = np.random.default_rng(seed)
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+    return frame
+
+
+def benchmark_ocr_variants(frames: int = 3, image_to_data=None, variants=OCR_VARIANTS) -> dict:
+    """Compare the single-variant OCR path with MultiVariantOcr on synthetic degraded labels.
+
+    Per style, reports the share of labels found and the mean/max seconds per
+    lookup for both paths.
+    """
+    searcher = MultiVariantOcr(image_to_data, variants=variants)
+    searcher.warm_up()
+    results = {}
+    try:
+        for style in BENCH_STYLES:
+            single_hits, multi_hits, single_times, multi_times = 0, 0, [], []
+            for seed in range(frames):
+                for label in BENCH_LABELS:
+                    image = synthetic_label_frame(label, style, seed)
+
+                    start = time.perf_counter()
+                    if OcrFrame.from_image(image, image_to_data=image_to_data).find_text(label):
+                        single_hits += 1
+                    single_times.append(time.perf_counter() - start)
+
+                    start = time.perf_counter()
+                    if searcher.find(image, [label]):
+                        multi_hits += 1
+                    multi_times.append(time.perf_counter() - start)
+
+            lookups = frames * len(BENCH_LABELS)
+            results[style] = {
+                'lookups': lookups,
+                'single_hit_rate': single_hits / lookups,
+                'multi_hit_rate': multi_hits / lookups,
+                'single_ms': sum(single_times) * 1000 / lookups,
+                'single_max_ms': max(single_times) * 1000,
+                'multi_ms': sum(multi_times) * 1000 / lookups,
+                'multi_max_ms': max(multi_times) * 1000,
+            }
+    finally:
+        searcher.close()
+    results['winning_variants'] = {key[5:]: count for key, count in searcher.stats.items() if key.startswith('hits.')}
+    return results
+
+
+def main():
+    """Command line entry point for the vision benchmarks."""
+    parser = argparse.ArgumentParser(description="TEHTRIS installer vision helpers")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    bench = subparsers.add_parser('bench-color', help='Benchmark batched color detection on synthetic frames')
+    bench.add_argument('--frames', type=int, default=10, help='Number of synthetic frames (default: 10)')
+    bench.add_argument('--width', type=int, default=1920, help='Frame width (default: 1920)')
+    bench.add_argument('--height', type=int, default=1080, help='Frame height (default: 1080)')
+    bench.add_argument('--downscale', type=float, default=1.0, help='Downscale factor for the batched search (default: 1.0)')
+
+    bench_ocr = subparsers.add_parser('bench-ocr', help='Compare single- and multi-variant OCR on synthetic degraded labels')
+    bench_ocr.add_argument('--frames', type=int, default=3, help='Renderings per label and style (default: 3)')
+    bench_ocr.add_argument('--variants', nargs='+', choices=OCR_VARIANTS, default=list(OCR_VARIANTS),
+                           help='Variants run by the multi-variant path (default: all)')
+
+    args = parser.parse_args()
+
+    if args.command == 'bench-ocr':
+        if not TESSERACT_AVAILABLE:
+            print("pytesseract (and the tesseract binary) are required for bench-ocr")
+            sys.exit(1)
+        results = benchmark_ocr_variants(args.frames, variants=args.variants)
+        winners = results.pop('winning_variants')
+        print(f"{'style':<13} {'single hit':>10} {'ms':>7} {'max ms':>7}  {'multi hit':>9} {'ms':>7} {'max ms':>7}")
+        for style, result in results.items():
+            print(f"{style:<13} {result['single_hit_rate']:>10.0%} {result['single_ms']:>7.0f} "
+                  f"{result['single_max_ms']:>7.0f}  {result['multi_hit_rate']:>9.0%} {result['multi_ms']:>7.0f} "
+                  f"{result['multi_max_ms']:>7.0f}")
+        print("Winning variants: " + ', '.join(f"{name} {count}" for name, count in sorted(winners.items())))
+
+    if args.command == 'bench-color':
+        result = benchmark_color_detection(args.frames, args.width, args.height, args.downscale)
+        print(f"{result['frames']} frames, {result['ranges']} color ranges")
+        print(f"  per-call contours: {result['per_call_ms']:.1f} ms/frame")
+        print(f"  batched:           {result['batched_ms']:.1f} ms/frame ({result['speedup']:.1f}x)")
+        print(f"  largest-element disagreements: {result['mismatches']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Builds a hash-pinned wheelhouse of requirements.txt for the Windows hosts.
+
+Run once on the controller; the hosts then install from the archive with
+pip --no-index instead of resolving and downloading from the index each:
+
+    python tehtris_wheelhouse.py --python-version 3.12
+
+Wheels are fetched for the hosts' platform and Python (--platform,
+default win_amd64), not the controller's. pip only resolves dependencies
+for a foreign platform when every package has a binary wheel, and
+pyautogui and most of its dependencies only publish sdists, so each
+package is fetched on its own (--no-deps): a binary wheel for the target
+when there is one, otherwise the sdist, built into a wheel that has to be
+pure Python. Dependencies are read from each wheel's metadata and their
+environment markers evaluated for the target.
+
+Writes next to requirements.txt:
+- tehtris_wheelhouse.zip: the wheels and requirements.lock, one
+  `name==version --hash=sha256:...` line per wheel, for
+  pip install --no-index --require-hashes
+- tehtris_wheelhouse.json: the manifest; `requirements_sha256` is the hash
+  of requirements.lock, recorded on a host once it has installed them
+  (see tasks/install-tehtris.yml)
+
+The archive is rebuilt only when requirements.txt, the platform or the
+Python version changed (--rebuild forces it). Its entries have fixed
+timestamps, so an unchanged set of wheels gives an identical archive.
+
+Requirements:
+- packaging
+- network access to the package index (PIP_INDEX_URL etc. apply)
+"""
+
+import argparse
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import zipfile
+from email.parser import Parser
+from pathlib import Path
+from typing import Dict, List, Set
+
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name, parse_wheel_filename
+
+RES_DIR = Path(__file__).resolve().parent
+ARCHIVE_NAME = 'tehtris_wheelhouse.zip'
+MANIFEST_NAME = 'tehtris_wheelhouse.json'
+LOCK_NAME = 'requirements.lock'
+
+# platform_machine of each pip --platform tag
+PLATFORM_MACHINES = {'win_amd64': 'AMD64', 'win32': 'x86', 'win_arm64': 'ARM64'}
+
+
+class WheelhouseError(Exception):
+    """Raised when a requirement cannot be turned into a wheel for the target."""
+
+
+def target_environment(platform: str, python_version: str) -> Dict[str, str]:
+    """Environment markers of a CPython `python_version` host on Windows `platform`."""
+    if platform not in PLATFORM_MACHINES:
+        raise WheelhouseError(f"Unsupported platform {platform} (known: {', '.join(PLATFORM_MACHINES)})")
+    return {
+        'os_name': 'nt',
+        'sys_platform': 'win32',
+        'platform_system': 'Windows',
+        'platform_machine': PLATFORM_MACHINES[platform],
+        'platform_release': '',
+        'platform_version': '',
+        'python_version': python_version,
+        'python_full_version': f'{python_version}.0',
+        'implementation_name': 'cpython',
+        'platform_python_implementation': 'CPython',
+        'implementation_version': f'{python_version}.0',
+    }
+
+
+def _pip(*args: str, cwd: Path):
+    process = subprocess.run([sys.executable, '-m', 'pip', *args, '--disable-pip-version-check', '--quiet'],
+                             cwd=cwd, capture_output=True, text=True)
+    if process.returncode != 0:
+        lines = (process.stderr or process.stdout).strip().splitlines()
+        raise WheelhouseError(lines[-1] if lines else f"pip {args[0]} failed")
+
+
+def fetch_wheel(requirement: Requirement, dest: Path, platform: str, python_version: str) -> Path:
+    """Fetch or build the wheel of `requirement` (without its dependencies) into `dest`."""
+    spec = f'{requirement.name}{requirement.specifier}'
+    with tempfile.TemporaryDirectory() as scratch:
+        scratch = Path(scratch)
+        try:
+            _pip('download', spec, '--no-deps', '--only-binary=:all:', '--platform', platform,
+                 '--python-version', python_version, '--implementation', 'cp', '--dest', str(scratch), cwd=scratch)
+        except WheelhouseError:
+            # No wheel for the target: build one from the sdist, which only
+            # works on another platform for pure Python packages
+            _pip('download', spec, '--no-deps', '--no-binary=:all:', '--dest', str(scratch / 'sdist'), cwd=scratch)
+            sdist = next((scratch / 'sdist').iterdir())
+            _pip('wheel', str(sdist), '--no-deps', '--wheel-dir', str(scratch), cwd=scratch)
+        wheel = next(scratch.glob('*.whl'))
+        if not any(tag.platform == 'any' or tag.platform == platform for tag in parse_wheel_filename(wheel.name)[3]):
+            raise WheelhouseError(f"{requirement.name} has no wheel for {platform} and does not build as pure Python")
+        target = dest / wheel.name
+        wheel.replace(target)
+    return target
+
+
+def wheel_requirements(wheel: Path) -> List[Requirement]:
+    """Return the Requires-Dist entries of `wheel`."""
+    with zipfile.ZipFile(wheel) as archive:
+        metadata = next(name for name in archive.namelist()
+                        if name.count('/') == 1 and name.endswith('.dist-info/METADATA'))
+        headers = Parser().parsestr(archive.read(metadata).decode('utf-8'), headersonly=True)
+    return [Requirement(value) for value in headers.get_all('Requires-Dist') or []]
+
+
+def resolve(requirements: List[Requirement], dest: Path, platform: str, python_version: str,
+            progress=print) -> Dict[str, Path]:
+    """Fetch the wheels of `requirements` and their dependencies for the target.
+
+    Returns the wheel per canonical project name. Each project is fetched
+    once, at the best version for the first requirement naming it; later
+    requirements that version does not satisfy are reported as conflicts.
+    """
+    environment = target_environment(platform, python_version)
+    wheels: Dict[str, Path] = {}
+    extras: Dict[str, Set[str]] = {}
+    queue = list(requirements)
+    while queue:
+        requirement = queue.pop(0)
+        name = canonicalize_name(requirement.name)
+        if name in wheels:
+            version = parse_wheel_filename(wheels[name].name)[1]
+            if not requirement.specifier.contains(version, prereleases=True):
+                raise WheelhouseError(f"{requirement} conflicts with {name} {version}, fetched for an earlier requirement")
+            if requirement.extras - extras[name]:
+                raise WheelhouseError(f"{requirement} asks for extras of {name} after it was resolved")
+            continue
+        wheel = fetch_wheel(requirement, dest, platform, python_version)
+        progress(f"  {wheel.name}")
+        wheels[name] = wheel
+        extras[name] = set(requirement.extras)
+        for dependency in wheel_requirements(wheel):
+            if dependency.marker is None or any(dependency.marker.evaluate({**environment, 'extra': extra})
+                                                for extra in extras[name] | {''}):
+                queue.append(dependency)
+    return wheels
+
+
+def read_requirements(path: Path) -> List[Requirement]:
+    requirements = []
+    for line in path.read_text(encoding='utf-8').splitlines():
+        line = line.split('#', 1)[0].strip()
+        if line:
+            requirements.append(Requirement(line))
+    return requirements
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_wheelhouse(requirements_path: Path, out_dir: Path, platform: str, python_version: str,
+                     rebuild: bool = False, progress=print) -> dict:
+    """Build the archive and manifest for `requirements_path` in `out_dir`; returns the manifest.
+
+    An existing manifest for the same requirements.txt, platform and Python
+    version is returned as is unless `rebuild`.
+    """
+    source_sha256 = sha256_file(requirements_path)
+    archive_path, manifest_path = out_dir / ARCHIVE_NAME, out_dir / MANIFEST_NAME
+    if not rebuild and archive_path.exists() and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+        if (manifest.get('source_sha256'), manifest.get('platform'), manifest.get('python_version')) == \
+                (source_sha256, platform, python_version):
+            progress(f"{archive_path} is up to date")
+            return manifest
+
+    progress(f"Fetching wheels for CPython {python_version} on {platform}:")
+    with tempfile.TemporaryDirectory() as scratch:
+        wheels = resolve(read_requirements(requirements_path), Path(scratch), platform, python_version, progress)
+        hashes = {wheel.name: sha256_file(wheel) for wheel in wheels.values()}
+        lock = ''.join(f"{name}=={parse_wheel_filename(wheels[name].name)[1]} "
+                       f"--hash=sha256:{hashes[wheels[name].name]}\n" for name in sorted(wheels))
+
+        # Fixed timestamps and order keep the archive identical for the same wheels
+        tmp_path = archive_path.with_suffix('.tmp')
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED) as archive:
+            for filename in sorted(hashes) + [LOCK_NAME]:
+                info = zipfile.ZipInfo(filename, date_time=(1980, 1, 1, 0, 0, 0))
+                data = lock.encode('utf-8') if filename == LOCK_NAME else (Path(scratch) / filename).read_bytes()
+                archive.writestr(info, data)
+        tmp_path.replace(archive_path)
+
+    manifest = {
+        'requirements_sha256': hashlib.sha256(lock.encode('utf-8')).hexdigest(),
+        'source_sha256': source_sha256,
+        'platform': platform,
+        'python_version': python_version,
+        'archive_sha256': sha256_file(archive_path),
+        'wheels': hashes,
+    }
+    tmp_path = manifest_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+    tmp_path.replace(manifest_path)
+    progress(f"Wrote {archive_path} ({len(hashes)} wheels, {archive_path.stat().st_size / 1e6:.1f} MB)")
+    return manifest
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Build the hosts' wheelhouse from requirements.txt")
+    parser.add_argument('--python-version', required=True,
+                        help="major.minor of the hosts' Python, e.g. 3.12 (binary wheels are built per version)")
+    parser.add_argument('--platform', default='win_amd64', choices=sorted(PLATFORM_MACHINES),
+                        help='pip platform tag of the hosts (default: win_amd64)')
+    parser.add_argument('--requirements', type=Path, default=RES_DIR / 'requirements.txt',
+                        help='Requirements file (default: requirements.txt next to this script)')
+    parser.add_argument('--out-dir', type=Path, default=RES_DIR,
+                        help='Where the archive and manifest are written (default: next to this script)')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild even if the archive is up to date')
+    args = parser.parse_args()
+
+    try:
+        build_wheelhouse(args.requirements, args.out_dir, args.platform, args.python_version, args.rebuild)
+    except (WheelhouseError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
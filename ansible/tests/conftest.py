@@ -0,0 +1,21 @@
+"""The scripts under res/ are run and shipped as top-level modules."""
+
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+RES_DIR = Path(__file__).resolve().parent.parent / 'res'
+sys.path.insert(0, str(RES_DIR))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Installers write their log, spans and state files to the working directory."""
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    logger = logging.getLogger('TehtrisEDRInstaller')
+    for handler in list(logger.handlers):
+        handler.close()
+        logger.removeHandler(handler)
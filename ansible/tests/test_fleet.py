@@ -0,0 +1,150 @@
+import base64
+import sys
+import time
+
+import pytest
+
+from tehtris_fleet import (EXIT_DEADLINE, AnsibleTransport, FleetRun, Host, Transport, host_status,
+                           read_inventory)
+
+INVENTORY = """\
+[windows_client:vars]
+ansible_connection=winrm
+ansible_user=admin
+ansible_password="Pass word#1"
+ansible_winrm_port=5986
+; comment
+
+[windows_client]
+# terraform writes one line per client
+client-1 ansible_host=10.0.0.1
+client-2 ansible_host=10.0.0.2 ansible_user=other
+client-3 ansible_host=pending
+client-4
+
+[linux_server]
+server-1 ansible_host=10.0.1.1
+"""
+
+
+def test_read_inventory(tmp_path):
+    path = tmp_path / 'hosts'
+    path.write_text(INVENTORY, encoding='utf-8')
+
+    hosts = read_inventory(path)
+    assert [host.name for host in hosts] == ['client-1', 'client-2', 'client-4']
+    client_1, client_2, client_4 = hosts
+    assert client_1.vars == {'ansible_connection': 'winrm', 'ansible_user': 'admin', 'ansible_password': 'Pass word#1',
+                             'ansible_winrm_port': '5986', 'ansible_host': '10.0.0.1'}
+    # Host variables override the group's
+    assert client_2.vars['ansible_user'] == 'other'
+    assert 'ansible_host' not in client_4.vars
+
+    assert [host.name for host in read_inventory(path, 'linux_server')] == ['server-1']
+    assert read_inventory(path, 'missing') == []
+
+
+@pytest.mark.parametrize('head, returncode, expected', [
+    (['client-1 | CHANGED | rc=0 >>', 'installed'], 0, 0),
+    (['client-1 | FAILED | rc=3 >>', 'already installed'], 2, 3),
+    (['client-1 | FAILED | rc=124 >>'], 2, 124),
+    (['client-1 | UNREACHABLE! => {', '    "changed": false,'], 4, 4),
+    ([], 1, 1),
+])
+def test_ansible_exit_code(head, returncode, expected):
+    transport = AnsibleTransport('hosts', 'C:\\Temp\\edr.msi', [])
+    assert transport.exit_code(returncode, head) == expected
+
+
+def test_ansible_command_encodes_the_remote_script(tmp_path):
+    transport = AnsibleTransport(tmp_path / 'hosts', 'C:\\Temp\\edr setup.msi', ['--force'])
+    argv = transport.command(Host('client-1', {}), tmp_path, 600)
+
+    assert argv[:5] == ['ansible', 'client-1', '-i', str(tmp_path / 'hosts'), '-m']
+    encoded = argv[-1].rsplit(' ', 1)[1]
+    script = base64.b64decode(encoded).decode('utf-16-le')
+    assert '"C:\\Temp\\edr setup.msi" --force' in script
+    assert 'AddSeconds(600)' in script
+    assert f'exit {EXIT_DEADLINE}' in script
+
+
+class StubTransport(Transport):
+    """Runs a Python snippet per host: `scripts` maps host names to their code."""
+
+    name = 'stub'
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.collected = []
+
+    def command(self, host, workdir, deadline):
+        return [sys.executable, '-c', self.scripts[host.name]]
+
+    def collect(self, host, workdir, dest):
+        self.collected.append(host.name)
+        dest.write_text('{}\n', encoding='utf-8')
+
+
+def exits(code, output='done'):
+    return f"print({output!r}, flush=True); raise SystemExit({code})"
+
+
+def test_fleet_run_statuses(tmp_path):
+    transport = StubTransport({'ok': exits(0), 'installed': exits(3), 'failed': exits(1),
+                               'stopped': exits(EXIT_DEADLINE, 'Deadline reached, installer stopped')})
+    lines = []
+    run = FleetRun(transport, tmp_path / 'logs', concurrency=4, deadline=30,
+                   progress=lambda host, line: lines.append((host, line)))
+    summary = run.run([Host(name, {}) for name in transport.scripts])
+
+    assert {result['host']: (result['status'], result['exit_code']) for result in summary['results']} == {
+        'ok': ('ok', 0), 'installed': ('installed', 3), 'failed': ('failed', 1), 'stopped': ('timeout', EXIT_DEADLINE),
+    }
+    assert summary['statuses'] == {'ok': 1, 'installed': 1, 'failed': 1, 'timeout': 1}
+    assert ('ok', 'done') in lines
+    assert (tmp_path / 'logs' / 'ok.log').read_text(encoding='utf-8') == 'done\n'
+    assert sorted(transport.collected) == sorted(transport.scripts)
+    assert (tmp_path / 'logs' / 'ok.jsonl').exists()
+
+
+def test_fleet_run_stops_hosts_at_the_deadline(tmp_path):
+    transport = StubTransport({'fast': exits(0),
+                               'stuck': "import time; print('installing', flush=True); time.sleep(60)"})
+    run = FleetRun(transport, tmp_path / 'logs', concurrency=2, deadline=0.5)
+    started = time.monotonic()
+    summary = run.run([Host('fast', {}), Host('stuck', {})])
+
+    assert time.monotonic() - started < 10
+    fast, stuck = summary['results']
+    assert (fast['status'], fast['exit_code']) == ('ok', 0)
+    assert (stuck['status'], stuck['exit_code']) == ('timeout', None)
+    assert stuck['log_tail'] == ['installing']
+    assert 0.5 <= stuck['duration_s'] < 10
+    assert run.running == 0
+
+
+def test_fleet_run_caps_concurrency(tmp_path):
+    scripts = {f'host-{index}': "import time; time.sleep(0.3)" for index in range(6)}
+    run = FleetRun(StubTransport(scripts), tmp_path / 'logs', concurrency=2, deadline=30)
+    summary = run.run([Host(name, {}) for name in scripts])
+
+    assert summary['peak_running'] == 2
+    assert summary['statuses'] == {'ok': 6}
+    assert run.running == 0
+
+
+def test_fleet_run_reports_hosts_that_cannot_start(tmp_path):
+    class Missing(StubTransport):
+        def command(self, host, workdir, deadline):
+            return [str(tmp_path / 'no-such-ansible')]
+
+    result = FleetRun(Missing({}), tmp_path / 'logs').run([Host('client-1', {})])['results'][0]
+    assert (result['status'], result['exit_code']) == ('failed', None)
+    assert result['log_tail'][-1].startswith('Could not start')
+
+
+def test_host_status():
+    assert host_status(None, timed_out=True) == 'timeout'
+    assert host_status(0, timed_out=False) == 'ok'
+    assert host_status(3, timed_out=False) == 'installed'
+    assert host_status(None, timed_out=False) == 'failed'
@@ -0,0 +1,69 @@
+import pytest
+
+from tehtris_msi import (COLUMN_STRING, MSITYPE_CHAR, InstallState, MsiDatabase, MsiError,
+                         activation_property_values)
+from tehtris_sim import FIXTURE_PRODUCT_CODE, FIXTURE_PRODUCT_VERSION, write_fixture_msi
+
+SETTINGS = {'server_address': 'edr.example.net', 'tag': 'QA', 'license_key': 'AAAA-BBBB-CCCC'}
+
+
+@pytest.fixture
+def fixture_msi(tmp_path):
+    return write_fixture_msi(tmp_path / 'TEHTRIS_EDR.msi')
+
+
+def installed_version(product_code):
+    return FIXTURE_PRODUCT_VERSION if product_code == FIXTURE_PRODUCT_CODE else None
+
+
+def test_fixture_declares_string_columns_like_real_packages(fixture_msi):
+    columns = MsiDatabase(fixture_msi).columns
+    property_column = columns['Property'][0]
+    assert property_column.type & 0x0FFF == COLUMN_STRING & 0x0FFF == 0x0D48
+    for table in ('Property', 'Dialog', 'Control'):
+        for column in columns[table]:
+            if column.is_string:
+                assert column.type & MSITYPE_CHAR
+                assert not column.is_binary
+
+
+def test_reads_properties(fixture_msi):
+    properties = MsiDatabase(fixture_msi).properties()
+    assert properties['ProductCode'] == FIXTURE_PRODUCT_CODE
+    assert properties['ProductVersion'] == FIXTURE_PRODUCT_VERSION
+
+
+def test_activation_property_values(fixture_msi):
+    assert activation_property_values(fixture_msi, SETTINGS) == {
+        'EDR_SERVER': 'edr.example.net',
+        'EDR_TAG': 'QA',
+        'EDR_KEY': 'AAAA-BBBB-CCCC',
+    }
+
+
+def test_activation_property_values_unknown_field(fixture_msi):
+    with pytest.raises(MsiError, match='proxy'):
+        activation_property_values(fixture_msi, dict(SETTINGS, proxy='10.0.0.1'))
+
+
+def test_install_state_round_trip(fixture_msi, tmp_path):
+    state_file = tmp_path / 'state.json'
+    state = InstallState(state_file, SETTINGS)
+    installed, reason = state.check(fixture_msi, installed_version)
+    assert not installed
+    assert 'no install recorded' in reason
+
+    state.record(fixture_msi)
+    installed, reason = InstallState(state_file, SETTINGS).check(fixture_msi, installed_version)
+    assert installed, reason
+
+    # The same package with another server is a different install
+    changed = InstallState(state_file, dict(SETTINGS, server_address='other.example.net'))
+    installed, reason = changed.check(fixture_msi, installed_version)
+    assert not installed
+    assert 'settings changed' in reason
+
+    # And so is the product being uninstalled since
+    installed, reason = InstallState(state_file, SETTINGS).check(fixture_msi, lambda code: None)
+    assert not installed
+    assert 'no longer installed' in reason
@@ -0,0 +1,118 @@
+import pytest
+
+from tehtris_policies import (RES_DIR, PolicyError, PolicySet, compiled_payloads, format_lgpo, format_reg, parse_file,
+                              parse_lgpo, parse_reg, policy_files)
+
+
+def changes(entries):
+    """Map each entry's identity to its change, as the registry would end up."""
+    return {entry.identity: (entry.kind, entry.data) for entry in entries}
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+def lgpo_entry(scope, key, name, action):
+    return f"{scope}\n{key}\n{name}\n{action}\n\n"
+
+
+REG_HEADER = "Windows Registry Editor Version 5.00\n\n"
+
+
+@pytest.mark.parametrize('hardcore', [False, True])
+@pytest.mark.parametrize('disable_defender', [False, True])
+def test_compiles_the_shipped_policies(hardcore, disable_defender):
+    files = policy_files(hardcore, disable_defender)
+    policies = PolicySet.from_files(files)
+    policies.check()
+
+    # Every entry of every file ends up in one payload, with the last
+    # overriding file winning
+    expected = {}
+    for path in files:
+        expected.update(changes(entry for entry in parse_file(path) if entry.kind != 'DELETEKEY'))
+    merged = changes(entry for entry in policies.entries if entry.kind != 'DELETEKEY')
+    assert merged == expected
+
+    assert changes(parse_lgpo(format_lgpo(policies.lgpo), 'merged.txt')) == changes(policies.lgpo)
+
+
+def test_merged_reg_matches_the_individual_files():
+    policies = PolicySet.from_files(policy_files(disable_defender=True))
+    merged = parse_reg(format_reg(policies.reg), 'merged.reg')
+    assert [(entry.identity, entry.kind, entry.data) for entry in merged] == \
+        [(entry.identity, entry.kind, entry.data) for entry in policies.reg]
+
+    lgpo = changes(policies.lgpo + policies.defender_lgpo)
+    merged_changes = changes(merged)
+    for path in sorted((RES_DIR / 'defender').glob('*.reg')):
+        for entry in parse_file(path):
+            if entry.kind == 'DELETEKEY':
+                assert any(m.kind == 'DELETEKEY' and m.identity == entry.identity for m in merged)
+                continue
+            # Values also set by defender.txt go through its LGPO import instead
+            assert merged_changes.get(entry.identity, lgpo.get(entry.identity)) == (entry.kind, entry.data), \
+                entry.describe()
+
+
+def test_defender_policies_are_their_own_payload():
+    policies = PolicySet.from_files(policy_files(hardcore=True, disable_defender=True))
+    defender = changes(parse_file(RES_DIR / 'policies' / 'defender.txt'))
+    assert changes(policies.defender_lgpo) == defender
+    assert not set(changes(policies.lgpo)) & set(defender)
+
+    # Without disable_defender the payload is empty, and its import skipped
+    payloads = compiled_payloads(PolicySet.from_files(policy_files()), policy_files())
+    assert (payloads['defender_lgpo'], payloads['defender_lgpo_entries']) == ('', 0)
+    assert payloads['lgpo_entries'] > 0
+
+
+def test_hardcore_overrides_updates():
+    policies = PolicySet.from_files(policy_files(hardcore=True))
+    [(replaced, override)] = policies.overrides
+    assert replaced.source.startswith('policies/updates.txt')
+    assert override.source.startswith('policies/hardcore.txt')
+    assert changes(policies.lgpo)[override.identity] == ('DWORD', 2)
+
+
+def test_duplicates_across_files_are_kept_once(tmp_path):
+    first = write(tmp_path, 'policies/a.txt',
+                  lgpo_entry('Computer', r'Software\Policies\Test', 'Value', 'DWORD:1')
+                  + lgpo_entry('User', r'Software\Policies\Test', 'Text', 'SZ:hello'))
+    second = write(tmp_path, 'policies/b.txt',
+                   lgpo_entry('Computer', r'SOFTWARE\policies\test', 'value', 'DWORD:1'))
+    registry = write(tmp_path, 'defender/c.reg',
+                     REG_HEADER + "[HKEY_LOCAL_MACHINE\\Software\\Policies\\Test]\n\"Value\"=dword:00000001\n"
+                     "\"Other\"=\"x\"\n")
+    policies = PolicySet.from_files([first, second, registry], base_dir=tmp_path)
+    policies.check()
+
+    assert policies.duplicates == 2
+    assert [entry.name for entry in policies.lgpo] == ['Value', 'Text']
+    assert [entry.name for entry in policies.reg] == ['Other']
+
+
+def test_conflicting_values_across_files(tmp_path):
+    first = write(tmp_path, 'policies/a.txt', lgpo_entry('Computer', r'Software\Policies\Test', 'Value', 'DWORD:1'))
+    second = write(tmp_path, 'policies/b.txt', lgpo_entry('Computer', r'Software\Policies\Test', 'Value', 'DELETE'))
+    registry = write(tmp_path, 'defender/c.reg',
+                     REG_HEADER + "[HKEY_LOCAL_MACHINE\\Software\\Policies\\Test]\n\"Value\"=\"1\"\n")
+    policies = PolicySet.from_files([first, second, registry], base_dir=tmp_path)
+
+    assert len(policies.conflicts) == 2
+    with pytest.raises(PolicyError) as error:
+        policies.check()
+    message = str(error.value)
+    for source in ('policies/a.txt:1', 'policies/b.txt:1', 'defender/c.reg:4'):
+        assert source in message
+
+
+def test_rejects_malformed_files():
+    with pytest.raises(PolicyError, match='entries take 4'):
+        parse_lgpo("Computer\nSoftware\\Test\nValue\n", 'broken.txt')
+    with pytest.raises(PolicyError, match='not a registry file'):
+        parse_reg("[HKEY_LOCAL_MACHINE\\Software]\n", 'broken.reg')
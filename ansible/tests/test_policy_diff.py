@@ -0,0 +1,213 @@
+import json
+import sys
+
+import pytest
+
+import tehtris_policies
+from tehtris_policies import (REG_HIVES, PolicyEntry, PolicySet, RegistryState, format_reg, parse_lgpo,
+                              policy_files, read_export)
+
+ROOTS = {hive: root for root, hive in REG_HIVES.items()}
+
+POLICIES = """\
+Computer
+Software\\Policies\\Example\\Updates
+NoAutoUpdate
+DWORD:1
+
+Computer
+Software\\Policies\\Example\\Updates
+Server
+SZ:https://updates.example
+
+Computer
+Software\\Policies\\Example\\Telemetry
+AllowTelemetry
+DWORD:0
+"""
+
+# What `reg export` writes for each of the two keys, one after the other
+IN_PLACE = """\
+Windows Registry Editor Version 5.00
+
+[HKEY_LOCAL_MACHINE\\SOFTWARE\\Policies\\Example\\Updates]
+"NoAutoUpdate"=dword:00000001
+"Server"="https://updates.example"
+
+Windows Registry Editor Version 5.00
+
+[HKEY_LOCAL_MACHINE\\SOFTWARE\\Policies\\Example\\Telemetry]
+"AllowTelemetry"=dword:00000000
+"""
+
+
+def example_policies():
+    policies = PolicySet()
+    policies.add(parse_lgpo(POLICIES, 'example.txt'))
+    return policies
+
+
+def diff(policies, export, missing=()):
+    state = RegistryState.from_reg_export(export.replace('\n', '\r\n'), policies.keys, missing)
+    return [(entry.name, entry.data) for entry in policies.changed(state).entries]
+
+
+def host_export(entries, keys):
+    """`reg export` each of `keys` on a host that has applied `entries`; returns
+    the export and the keys found missing, as the host script does."""
+    host = {}
+
+    def create(hive, key):
+        parts = key.split('\\')
+        for depth in range(1, len(parts) + 1):
+            path = '\\'.join(parts[:depth])
+            host.setdefault((hive, path.lower()), (path, {}))
+
+    for entry in entries:
+        identity = entry.hive, entry.key.lower()
+        if entry.kind == 'DELETEKEY':
+            for hive, key in list(host):
+                if hive == entry.hive and (key == identity[1] or key.startswith(identity[1] + '\\')):
+                    del host[hive, key]
+            continue
+        create(entry.hive, entry.key)
+        values = host[identity][1]
+        if entry.kind == 'DELETEALLVALUES':
+            values.clear()
+        elif entry.kind == 'DELETE':
+            values.pop(entry.name.lower(), None)
+        elif entry.kind != 'CREATEKEY':
+            values[entry.name.lower()] = entry
+
+    exports, missing = [], []
+    for path in keys:
+        hive, _, key = path.partition('\\')
+        subtree = sorted((hive_key for hive_key in host if hive_key[0] == hive and
+                          (hive_key[1] == key.lower() or hive_key[1].startswith(key.lower() + '\\'))),
+                         key=lambda hive_key: hive_key[1])
+        if not subtree:
+            missing.append(path)
+            continue
+        blocks = ['Windows Registry Editor Version 5.00\r\n']
+        for identity in subtree:
+            name, values = host[identity]
+            if values:
+                blocks.append(format_reg(values.values()).split('\r\n', 2)[2])
+            else:
+                blocks.append(f"[{ROOTS[hive]}\\{name}]\r\n")
+        exports.append('\r\n'.join(blocks))
+    return '\r\n'.join(exports), missing
+
+
+def test_identical_values_are_not_applied():
+    assert diff(example_policies(), IN_PLACE) == []
+    # Key and value names are compared case-insensitively
+    export = IN_PLACE.replace('\\Policies\\Example\\Updates]', '\\POLICIES\\example\\updates]')
+    assert diff(example_policies(), export.replace('"NoAutoUpdate"', '"noautoupdate"')) == []
+
+
+def test_changed_dword_and_string_values():
+    export = (IN_PLACE.replace('"NoAutoUpdate"=dword:00000001', '"NoAutoUpdate"=dword:00000000')
+              .replace('"https://updates.example"', '"https://other.example"'))
+    assert diff(example_policies(), export) == [('NoAutoUpdate', 1), ('Server', 'https://updates.example')]
+
+    # A string value of the right name but not a string is changed too
+    export = IN_PLACE.replace('"Server"="https://updates.example"', '"Server"=hex(2):00,00')
+    assert diff(example_policies(), export) == [('Server', 'https://updates.example')]
+
+
+def test_other_values_and_types_in_the_export_are_ignored():
+    export = IN_PLACE.replace('"AllowTelemetry"=dword:00000000',
+                              '"AllowTelemetry"=dword:00000000\n"Resources"=hex(8):01,02,\\\n  03,04')
+    assert diff(example_policies(), export) == []
+
+
+TELEMETRY = 'HKLM\\Software\\Policies\\Example\\Telemetry'
+WITHOUT_TELEMETRY = IN_PLACE.split('\nWindows Registry Editor Version 5.00\n')[0]
+
+
+def test_missing_key_is_applied():
+    # The host found no Telemetry key
+    assert diff(example_policies(), WITHOUT_TELEMETRY, [TELEMETRY]) == [('AllowTelemetry', 0)]
+    assert diff(example_policies(), '', example_policies().keys) == [
+        ('NoAutoUpdate', 1), ('Server', 'https://updates.example'), ('AllowTelemetry', 0)]
+
+
+DELETIONS = """\
+Computer
+Software\\Policies\\Example\\Telemetry
+AllowTelemetry
+DELETE
+
+Computer
+Software\\Policies\\Example\\Telemetry\\Upload
+*
+DELETEALLVALUES
+"""
+
+
+def test_failed_export_keeps_every_entry_under_the_key():
+    policies = PolicySet()
+    policies.add(parse_lgpo(DELETIONS, 'deletions.txt'))
+    # Neither exported nor found missing (access denied, say): nothing is
+    # known to be deleted already
+    assert diff(policies, WITHOUT_TELEMETRY) == [('AllowTelemetry', None), ('*', None)]
+    # Found missing, both deletions are in place
+    assert diff(policies, WITHOUT_TELEMETRY, [TELEMETRY, TELEMETRY + '\\Upload']) == []
+    # A key missing from an exported parent's subtree does not exist either
+    export = IN_PLACE.replace('"AllowTelemetry"=dword:00000000\n', '')
+    assert diff(policies, export) == []
+
+
+def test_failed_export_keeps_set_values_under_the_key():
+    assert diff(example_policies(), WITHOUT_TELEMETRY) == [('AllowTelemetry', 0)]
+
+
+def test_key_deletion_is_judged_with_its_rebuild():
+    policies = PolicySet()
+    policies.add([PolicyEntry('HKLM', 'SOFTWARE\\Example', '*', 'DELETEKEY', None, 'example.reg:3'),
+                  PolicyEntry('HKLM', 'SOFTWARE\\Example\\Sub', 'Enabled', 'DWORD', 0, 'example.reg:6')], reg=True)
+    rebuilt, missing = host_export(policies.entries, policies.keys)
+    assert missing == []
+    assert diff(policies, rebuilt) == []
+    # Anything else under the deleted key has to go, so the rebuild is applied again
+    extra = rebuilt.replace('"Enabled"=dword:00000000', '"Enabled"=dword:00000000\r\n"Other"=dword:00000001')
+    assert diff(policies, extra) == [('*', None), ('Enabled', 0)]
+    # Without the key, it is deleted already and only the rebuild is applied
+    assert diff(policies, '', policies.keys) == [('Enabled', 0)]
+    # Unless the export failed
+    assert diff(policies, '') == [('*', None), ('Enabled', 0)]
+
+
+def test_utf16_export_file(tmp_path):
+    export = tmp_path / 'host.reg'
+    export.write_text(IN_PLACE.replace('"NoAutoUpdate"=dword:00000001', '"NoAutoUpdate"=dword:00000000'),
+                      encoding='utf-16')
+    assert export.read_bytes()[:2] in (b'\xff\xfe', b'\xfe\xff')
+    policies = example_policies()
+    delta = policies.changed(read_export(str(export), policies.keys))
+    assert [(entry.name, entry.data) for entry in delta.entries] == [('NoAutoUpdate', 1)]
+
+
+@pytest.mark.parametrize('hardcore', [False, True])
+@pytest.mark.parametrize('disable_defender', [False, True])
+def test_host_with_the_shipped_policies_applied(hardcore, disable_defender, tmp_path, monkeypatch, capsys):
+    policies = PolicySet.from_files(policy_files(hardcore, disable_defender))
+    export = tmp_path / 'host.reg'
+    text, missing = host_export(policies.entries, policies.keys)
+    export.write_text(text, encoding='utf-16')
+
+    argv = ['tehtris_policies.py', 'diff', str(export)] + [f'--missing={key}' for key in missing]
+    argv += ['--hardcore'] * hardcore + ['--disable-defender'] * disable_defender
+    monkeypatch.setattr(sys, 'argv', argv)
+    tehtris_policies.main()
+    payload = json.loads(capsys.readouterr().out)
+    assert (payload['lgpo_entries'], payload['reg_entries']) == (0, 0)
+    assert payload['unchanged'] == len(policies.entries)
+
+    # Without the host's list of missing keys, the deletions under them are kept
+    unknown = {key.lower() for key in missing}
+    kept = policies.changed(RegistryState.from_reg_export(text, policies.keys)).entries
+    assert all(f"{entry.hive}\\{entry.key}".lower() in unknown for entry in kept)
+    assert all(entry in kept for entry in policies.entries
+               if entry.is_delete and f"{entry.hive}\\{entry.key}".lower() in unknown)
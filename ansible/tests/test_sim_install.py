@@ -0,0 +1,81 @@
+import logging
+import sys
+
+import pytest
+
+import tehtris_edr_installer
+import tehtris_edr_installer_minimal
+from tehtris_sim import SimulatedBackend
+from tehtris_ui import UIBackend
+
+INSTALLERS = {
+    'full': tehtris_edr_installer.TehtrisEDRInstaller,
+    'minimal': tehtris_edr_installer_minimal.TehtrisEDRInstaller,
+}
+
+
+def fast_backend() -> SimulatedBackend:
+    return SimulatedBackend(ocr_latency=0.01, launch_latency=0.05, page_latency=0.05, install_seconds=0.2,
+                            agent_latency=0.05)
+
+
+@pytest.mark.parametrize('variant', sorted(INSTALLERS))
+def test_run_installation_against_simulated_wizard(variant, workdir):
+    backend = fast_backend()
+    installer = INSTALLERS[variant]('TEHTRIS_EDR.msi', backend=backend)
+
+    assert installer.run_installation()
+    wizard = backend.wizard
+    assert wizard.installed
+    assert not wizard.cancelled
+    events = [event for _, event in wizard.history]
+    assert 'installed' in events
+    assert events[-1] == 'press finish'
+    assert [name for name, _, ok in installer.timer.steps if not ok] == []
+
+
+def test_print_window_text_names_the_setup_window(workdir, capsys):
+    backend = fast_backend()
+    installer = tehtris_edr_installer.TehtrisEDRInstaller('TEHTRIS_EDR.msi', backend=backend)
+    backend.launch('TEHTRIS_EDR.msi')
+    assert installer.wait_for("setup window", installer.controls.has_window, timeout=2)
+
+    installer.print_window_text()
+    window = installer.controls.windows[0]
+    title = backend.win32.GetWindowText(window)
+    assert 'TEHTRIS' in title
+    assert f"Found window: {title} ({window})" in capsys.readouterr().out
+
+
+def test_minimal_completion_polls_log_no_errors(workdir, caplog):
+    backend = SimulatedBackend(ocr_latency=0.01, launch_latency=0.05, page_latency=0.05, install_seconds=1.5,
+                               agent_latency=0.05)
+    installer = tehtris_edr_installer_minimal.TehtrisEDRInstaller('TEHTRIS_EDR.msi', backend=backend)
+
+    with caplog.at_level(logging.DEBUG, logger='TehtrisEDRInstaller'):
+        assert installer.run_installation()
+    assert [record.getMessage() for record in caplog.records if record.levelno >= logging.ERROR] == []
+    # Missed Finish lookups while the install runs are still recorded, quietly
+    assert any(record.getMessage() == "Button 'Finish' not found" for record in caplog.records)
+
+
+@pytest.mark.parametrize('argv', [['--backend', 'sim', 'TEHTRIS_EDR.msi'], ['TEHTRIS_EDR.msi', '--backend', 'sim']])
+def test_minimal_command_line(argv, workdir, monkeypatch):
+    backends = []
+    monkeypatch.setattr(tehtris_edr_installer_minimal, 'create_backend',
+                        lambda name: backends.append(name) or fast_backend())
+    monkeypatch.setattr(sys, 'argv', ['tehtris_edr_installer_minimal.py'] + argv)
+
+    with pytest.raises(SystemExit) as exit_info:
+        tehtris_edr_installer_minimal.main()
+    assert exit_info.value.code == 0
+    assert backends == ['sim']
+
+
+def test_partial_backend_fails_when_constructed():
+    class PartialBackend(UIBackend):
+        def launch(self, msi_path):
+            pass
+
+    with pytest.raises(TypeError, match='abstract'):
+        PartialBackend()
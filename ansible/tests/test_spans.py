@@ -0,0 +1,100 @@
+import json
+import sys
+
+import pytest
+
+import tehtris_ui
+from tehtris_ui import SpanLog, StepTimer, load_spans
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def record_run(path, host, launch_seconds, completed=True):
+    """Write one installer run's step and locator spans to `path`."""
+    clock = Clock()
+    spans = SpanLog(path, clock=clock)
+    spans.host = host
+    timer = StepTimer(clock, spans)
+    with timer.step('launch_installer'):
+        with spans.attempt('Install', 'win32'):
+            clock.now += 0.1
+        with spans.attempt('Install', 'hotkey') as span:
+            clock.now += 0.2
+            span['outcome'] = 'hit'
+        clock.now += launch_seconds - 0.3
+    with timer.step('wait_for_completion') as result:
+        clock.now += 10
+        result['ok'] = completed
+    spans.close()
+    return spans
+
+
+def test_spans_are_appended_as_json_lines(tmp_path):
+    path = tmp_path / 'host-a.jsonl'
+    spans = record_run(path, 'host-a', 1.0)
+
+    lines = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert lines == spans.spans
+    # Attempts end (and are written) before the step that holds them
+    assert [(span['step'], span['element'], span['strategy'], span['attempt'], span['outcome'])
+            for span in lines] == [
+        ('launch_installer', 'Install', 'win32', 1, 'miss'),
+        ('launch_installer', 'Install', 'hotkey', 2, 'hit'),
+        ('launch_installer', None, None, 1, 'ok'),
+        ('wait_for_completion', None, None, 1, 'ok'),
+    ]
+    assert [span['duration_ms'] for span in lines] == [100.0, 200.0, 1000.0, 10000.0]
+    assert {span['run'] for span in lines} == {spans.run}
+
+
+@pytest.fixture
+def span_dir(tmp_path):
+    """Three runs on two hosts; host-b's last line was cut off mid-write."""
+    directory = tmp_path / 'spans'
+    directory.mkdir()
+    record_run(directory / 'host-a.jsonl', 'host-a', 1.0)
+    record_run(directory / 'host-a.jsonl', 'host-a', 2.0, completed=False)
+    record_run(directory / 'host-b.jsonl', 'host-b', 3.0)
+    with open(directory / 'host-b.jsonl', 'a', encoding='utf-8') as f:
+        f.write('{"run": "partial", "st')
+    (directory / 'notes.txt').write_text('not a span file', encoding='utf-8')
+    return directory
+
+
+def test_load_spans_reads_every_file_of_a_directory(span_dir):
+    spans, skipped = load_spans([str(span_dir)])
+    assert len(spans) == 12
+    assert skipped == 1
+
+
+def report(paths, monkeypatch, capsys, *options):
+    monkeypatch.setattr(sys, 'argv', ['tehtris_ui.py', 'report', *options, *map(str, paths)])
+    tehtris_ui.main()
+    return capsys.readouterr().out
+
+
+def test_report_aggregates_runs_and_hosts(span_dir, monkeypatch, capsys):
+    summary = json.loads(report([span_dir], monkeypatch, capsys, '--json'))
+
+    assert (summary['runs'], summary['hosts']) == (3, 2)
+    assert summary['steps']['launch_installer'] == {'count': 3, 'failures': 0, 'p50_ms': 2000.0, 'p95_ms': 2900.0}
+    assert summary['steps']['wait_for_completion']['failures'] == 1
+    assert summary['strategies'] == {
+        'Install -> hotkey': {'attempts': 3, 'hits': 3, 'win_rate': 1.0, 'share': 1.0},
+        'Install -> win32': {'attempts': 3, 'hits': 0, 'win_rate': 0.0, 'share': 0.0},
+    }
+
+
+def test_report_text_of_several_files(span_dir, monkeypatch, capsys):
+    files = [span_dir / 'host-a.jsonl', span_dir / 'host-b.jsonl']
+    out = report(files, monkeypatch, capsys)
+
+    assert out.splitlines()[0] == "12 spans from 3 runs on 2 hosts (1 unreadable lines skipped)"
+    assert any(line.split()[:3] == ['launch_installer', '3', '0'] for line in out.splitlines())
+    assert any(line.split()[:6] == ['Install', '->', 'hotkey', '3', '3', '100%'] for line in out.splitlines())
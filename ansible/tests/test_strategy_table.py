@@ -0,0 +1,123 @@
+import pytest
+
+import tehtris_edr_installer
+import tehtris_edr_installer_minimal
+from tehtris_sim import SimulatedBackend
+from tehtris_ui import StrategyTable
+
+
+def attempt(strategy, outcome, seconds, element='Install', step='handle_installation'):
+    return {'step': step, 'element': element, 'strategy': strategy, 'outcome': outcome,
+            'duration_ms': seconds * 1000}
+
+
+# win32 finds the button quickly on most runs; OCR always does, slowly
+HISTORY = [attempt('win32', 'hit', 0.05), attempt('win32', 'hit', 0.05), attempt('win32', 'miss', 0.05),
+           attempt('ocr', 'hit', 3.0), attempt('ocr', 'hit', 3.0)]
+
+
+def test_order_by_expected_time_to_success(tmp_path):
+    table = StrategyTable(tmp_path / 'table.json')
+    assert table.order('handle_installation', 'Install', ['ocr', 'win32', 'hotkey']) == ['ocr', 'win32', 'hotkey']
+
+    table.observe(HISTORY + [{'step': 'handle_installation', 'element': None, 'duration_ms': 4000}])
+    # Strategies without history follow in the static order
+    assert table.order('handle_installation', 'Install', ['ocr', 'win32', 'hotkey']) == ['win32', 'ocr', 'hotkey']
+    # History is per step and element
+    assert table.order('handle_installation', 'Next', ['ocr', 'win32']) == ['ocr', 'win32']
+    assert table.order('wait_for_completion', 'Install', ['ocr', 'win32']) == ['ocr', 'win32']
+
+
+def test_repeated_misses_demote_a_strategy_until_it_hits(tmp_path):
+    table = StrategyTable(tmp_path / 'table.json', demote_after=3)
+    table.observe(HISTORY + [attempt('win32', 'miss', 0.05)] * 2)
+    assert table.order('handle_installation', 'Install', ['win32', 'ocr', 'hotkey']) == ['ocr', 'hotkey', 'win32']
+
+    table.observe([attempt('win32', 'hit', 0.05)])
+    assert table.order('handle_installation', 'Install', ['win32', 'ocr', 'hotkey'])[0] == 'win32'
+
+
+def test_saved_table_is_reloaded(tmp_path):
+    path = tmp_path / 'table.json'
+    table = StrategyTable(path)
+    table.observe(HISTORY)
+    table.save()
+    assert not path.with_name(path.name + '.tmp').exists()
+
+    reloaded = StrategyTable(path)
+    assert reloaded.steps == table.steps
+    assert reloaded.order('handle_installation', 'Install', ['ocr', 'win32']) == ['win32', 'ocr']
+
+
+@pytest.mark.parametrize('content', ['{"steps": {"handle_', 'not json', '[]', '{"steps": []}', '{}'])
+def test_corrupt_state_file_falls_back_to_the_static_order(tmp_path, content):
+    path = tmp_path / 'table.json'
+    path.write_text(content, encoding='utf-8')
+    table = StrategyTable(path)
+    assert table.steps == {}
+    assert table.order('handle_installation', 'Install', ['ocr', 'win32']) == ['ocr', 'win32']
+
+    # The next save replaces the corrupt file
+    table.observe(HISTORY)
+    table.save()
+    assert StrategyTable(path).order('handle_installation', 'Install', ['ocr', 'win32']) == ['win32', 'ocr']
+
+
+def full_installer():
+    return tehtris_edr_installer.TehtrisEDRInstaller('TEHTRIS_EDR.msi', backend=SimulatedBackend())
+
+
+def run_strategies(installer, calls, winner):
+    """Locate 'Install' in a step with strategies that take a second each, record
+    their calls and succeed for `winner`."""
+    now = [0.0]
+    installer.spans.clock = lambda: now[0]
+
+    def strategy(name):
+        calls.append(name)
+        now[0] += 1
+        return name == winner
+
+    strategies = {name: (lambda name=name: strategy(name)) for name in ('template', 'ocr')}
+    with installer.spans.step('handle_installation'):
+        return installer.try_strategies('Install', strategies)
+
+
+def test_try_strategies_learns_the_order_across_runs(workdir):
+    installer = full_installer()
+    calls = []
+    assert run_strategies(installer, calls, winner='ocr') == 'ocr'
+    assert calls == ['template', 'ocr']
+    installer.learn_strategy_order()
+    installer.spans.close()
+
+    # The next run on the host tries the winner first
+    installer = full_installer()
+    calls = []
+    assert run_strategies(installer, calls, winner='ocr') == 'ocr'
+    assert calls == ['ocr']
+
+    # Unless it keeps the built-in order
+    installer = full_installer()
+    installer.static_order = True
+    calls = []
+    run_strategies(installer, calls, winner='ocr')
+    assert calls == ['template', 'ocr']
+
+
+@pytest.mark.parametrize('static_order, expected', [(False, ['hotkey', 'win32']), (True, ['win32', 'hotkey'])])
+def test_minimal_install_button_order(workdir, static_order, expected):
+    table = StrategyTable(workdir / 'tehtris_strategy_table.json')
+    table.observe([attempt('win32', 'miss', 1.0)] * 2 + [attempt('hotkey', 'hit', 0.1)])
+    table.save()
+
+    installer = tehtris_edr_installer_minimal.TehtrisEDRInstaller('TEHTRIS_EDR.msi', backend=SimulatedBackend(),
+                                                                 static_order=static_order)
+    installer.backend.screen_available = True
+    calls = []
+    installer.wait_for_button = lambda text, timeout=None, enabled=True: True
+    installer.click_with_win32gui = lambda text, missing_level=None: calls.append('win32') and False
+    installer.press_install_hotkey = lambda: calls.append('hotkey') and False
+    with installer.spans.step('handle_installation'):
+        assert not installer.handle_installation()
+    assert calls == expected
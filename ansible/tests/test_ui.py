@@ -0,0 +1,182 @@
+import time
+
+from tehtris_ui import AgentProcess, AgentWatcher, ControlTreeSnapshot, FakeWin32, SETUP_WINDOW_TITLE
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_wizard():
+    """A desktop with an unrelated window and the setup window on its welcome page."""
+    api = FakeWin32()
+    other = api.add_window("Notepad", 'Notepad')
+    api.add_window("Save", 'Button', parent=other)
+    setup = api.add_window(SETUP_WINDOW_TITLE)
+    page = {
+        'setup': setup,
+        'title': api.add_window("Welcome", 'Static', parent=setup),
+        'back': api.add_window("< &Back", 'Button', parent=setup, enabled=False),
+        'next': api.add_window("&Next >", 'Button', parent=setup),
+        'cancel': api.add_window("Cancel", 'Button', parent=setup),
+    }
+    return api, page
+
+
+def test_enumerates_once_per_page():
+    api, page = make_wizard()
+    clock = Clock()
+    snapshot = ControlTreeSnapshot(api=api, clock=clock)
+
+    for _ in range(5):
+        assert snapshot.find_button("Next").hwnd == page['next']
+        assert snapshot.find_button("Cancel").hwnd == page['cancel']
+        clock.now += 1
+    assert snapshot.enumerations == 1
+    assert api.calls['EnumWindows'] == 1
+
+    # The next page replaces the controls
+    for name in ('title', 'back', 'next', 'cancel'):
+        api.remove_window(page[name])
+    api.add_window("License Agreement", 'Static', parent=page['setup'])
+    accept = api.add_window("I &accept the terms", 'Button', parent=page['setup'])
+    clock.now += 1
+    for _ in range(3):
+        assert snapshot.find_button("accept").hwnd == accept
+        clock.now += 1
+    assert snapshot.enumerations == 2
+
+
+def test_expire_after_click_revalidates():
+    api, page = make_wizard()
+    clock = Clock()
+    snapshot = ControlTreeSnapshot(api=api, clock=clock, trust_for=5)
+    assert snapshot.find_button("Next")
+
+    # Within trust_for, lookups skip validation and miss the new page
+    api.remove_window(page['next'])
+    finish = api.add_window("&Finish", 'Button', parent=page['setup'])
+    assert snapshot.find_button("Finish") is None
+    assert snapshot.validations == 0
+
+    snapshot.expire()
+    assert snapshot.find_button("Finish").hwnd == finish
+    assert snapshot.validations == 1
+    assert snapshot.enumerations == 2
+
+
+def test_find_button_ignores_accelerators_and_checks_enabled():
+    api, page = make_wizard()
+    snapshot = ControlTreeSnapshot(api=api, clock=Clock())
+
+    assert snapshot.find_button("next").hwnd == page['next']
+    assert snapshot.find_button("Back").hwnd == page['back']
+    assert snapshot.find_button("Back", enabled=True) is None
+
+    # Enabled state is read live, without re-enumerating
+    api.set_enabled(page['back'], True)
+    assert snapshot.find_button("Back", enabled=True).hwnd == page['back']
+    assert snapshot.enumerations == 1
+
+
+def test_find_button_exclude():
+    api = FakeWin32()
+    setup = api.add_window(SETUP_WINDOW_TITLE)
+    api.add_window("I &do not accept the terms", 'Button', parent=setup)
+    accept = api.add_window("I &accept the terms", 'Button', parent=setup)
+    snapshot = ControlTreeSnapshot(api=api, clock=Clock())
+
+    assert snapshot.find_button("accept", exclude='not').hwnd == accept
+
+
+def test_of_class_keeps_tab_order():
+    api = FakeWin32()
+    setup = api.add_window(SETUP_WINDOW_TITLE)
+    server = api.add_window("", 'Edit', parent=setup)
+    api.add_window("Tag:", 'Static', parent=setup)
+    tag = api.add_window("", 'RichEdit20W', parent=setup)
+    api.add_window("", 'Edit', parent=setup, visible=False)
+    license_key = api.add_window("", 'Edit', parent=setup)
+    snapshot = ControlTreeSnapshot(api=api, clock=Clock())
+
+    edits = snapshot.of_class(['Edit', 'RichEdit20W'])
+    assert [control.hwnd for control in edits] == [server, tag, license_key]
+    assert [control.tab_index for control in edits] == sorted(control.tab_index for control in edits)
+
+
+def test_has_window_notices_new_window_before_max_age():
+    api = FakeWin32()
+    clock = Clock()
+    snapshot = ControlTreeSnapshot(api=api, clock=clock, max_age=10)
+    assert not snapshot.has_window()
+
+    setup = api.add_window(SETUP_WINDOW_TITLE)
+    next_button = api.add_window("&Next >", 'Button', parent=setup)
+    clock.now += 1
+    assert snapshot.has_window()
+    assert snapshot.find_button("Next").hwnd == next_button
+
+    api.remove_window(setup)
+    clock.now += 1
+    assert not snapshot.has_window()
+
+
+def test_has_window_picks_up_a_second_setup_window():
+    api, page = make_wizard()
+    clock = Clock()
+    snapshot = ControlTreeSnapshot(api=api, clock=clock, max_age=10)
+    assert snapshot.has_window()
+
+    # An error dialog of the same setup opens next to the wizard
+    dialog = api.add_window(SETUP_WINDOW_TITLE)
+    ok = api.add_window("OK", 'Button', parent=dialog)
+    clock.now += 1
+    assert snapshot.has_window()
+    assert snapshot.windows == [page['setup'], dialog]
+    assert snapshot.find_button("OK").hwnd == ok
+
+
+AGENT = AgentProcess(42, 'TehtrisAgent.exe', 'C:\\Program Files\\TEHTRIS\\EDR\\TehtrisAgent.exe', 'TEHTRIS EDR Agent')
+
+
+def watcher_with_scans(*scans):
+    """An AgentWatcher whose scans return (or raise) `scans` in turn, then the last one."""
+    watcher = AgentWatcher(backend=None, interval=0.01, max_interval=0.02)
+    results = list(scans)
+
+    def scan():
+        result = results.pop(0) if len(results) > 1 else results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    watcher.scan = scan
+    return watcher
+
+
+def test_agent_watcher_finds_agent_in_background():
+    watcher = watcher_with_scans([], [], [AGENT])
+    watcher.start()
+    assert watcher.result(timeout=5) == [AGENT]
+    assert watcher.error is None
+    assert watcher.found_after is not None
+
+
+def test_agent_watcher_polls_in_place_without_start():
+    watcher = watcher_with_scans([], [AGENT])
+    assert watcher.result(timeout=5) == [AGENT]
+
+
+def test_agent_watcher_records_scan_errors():
+    error = PermissionError('access denied')
+    watcher = watcher_with_scans([], error)
+    watcher.start()
+    started = time.monotonic()
+    assert watcher.result(timeout=5) == []
+    # The error ends the wait instead of the timeout
+    assert time.monotonic() - started < 1
+    assert watcher.error is error